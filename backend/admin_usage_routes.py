@@ -8,8 +8,9 @@ from flask import Blueprint, jsonify, request, g
 from sqlalchemy import func, desc
 from datetime import datetime, timedelta
 from typing import Dict, List
+import orjson
 
-from quota_management import QuotaUsage, QuotaTracker, get_quota_tracker
+from quota_management import QuotaUsage, QuotaEndpointUsage, QuotaTracker, NANOS_PER_DOLLAR, get_quota_tracker, init_quota_request_cache
 from structured_logging import get_logger
 
 logger = get_logger(__name__)
@@ -17,6 +18,9 @@ logger = get_logger(__name__)
 # Create blueprint
 admin_usage_bp = Blueprint('admin_usage', __name__, url_prefix='/api/admin/usage')
 
+# Release the quota tracker's per-thread sessions after every request
+admin_usage_bp.record_once(lambda state: init_quota_request_cache(state.app))
+
 
 def require_admin():
     """Decorator to require admin role"""
@@ -86,7 +90,7 @@ def get_usage_overview():
         if sort_by == 'tokens':
             query = query.order_by(desc(QuotaUsage.total_tokens))
         elif sort_by == 'cost':
-            query = query.order_by(desc(QuotaUsage.total_cost))
+            query = query.order_by(desc(QuotaUsage.total_cost_nanos))
         elif sort_by == 'requests':
             query = query.order_by(desc(QuotaUsage.total_requests))
         
@@ -97,7 +101,7 @@ def get_usage_overview():
         total_query = db_session.query(
             func.sum(QuotaUsage.total_requests).label('total_requests'),
             func.sum(QuotaUsage.total_tokens).label('total_tokens'),
-            func.sum(QuotaUsage.total_cost).label('total_cost'),
+            func.sum(QuotaUsage.total_cost_nanos).label('total_cost_nanos'),
             func.count(QuotaUsage.id).label('total_users')
         ).filter(
             QuotaUsage.period_type == period,
@@ -111,7 +115,7 @@ def get_usage_overview():
                 'users': total_query.total_users or 0,
                 'requests': total_query.total_requests or 0,
                 'tokens': total_query.total_tokens or 0,
-                'cost': float(total_query.total_cost or 0)
+                'cost': (total_query.total_cost_nanos or 0) / NANOS_PER_DOLLAR
             },
             'top_users': [record.to_dict() for record in usage_records],
             'sort_by': sort_by,
@@ -139,7 +143,11 @@ def get_user_usage(user_id: str):
         if not db_session:
             return jsonify({'error': 'Database session not configured'}), 500
         
-        tracker = get_quota_tracker(db_session)
+        tracker = get_quota_tracker(
+            db_session,
+            redis_client=current_app.config.get('quota_redis_client'),
+            read_session=current_app.config.get('db_read_session')
+        )
         
         # Get daily and monthly usage
         daily_usage = tracker.get_usage(user_id, 'daily')
@@ -191,41 +199,33 @@ def get_endpoint_breakdown():
         else:
             period_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         
-        # Get all usage records for the period
-        usage_records = db_session.query(QuotaUsage).filter(
-            QuotaUsage.period_type == period,
-            QuotaUsage.period_start == period_start
+        # Aggregate endpoint data (indexed GROUP BY over per-endpoint rows)
+        rows = db_session.query(
+            QuotaEndpointUsage.endpoint,
+            func.sum(QuotaEndpointUsage.requests).label('requests'),
+            func.sum(QuotaEndpointUsage.input_tokens).label('input_tokens'),
+            func.sum(QuotaEndpointUsage.output_tokens).label('output_tokens'),
+            func.sum(QuotaEndpointUsage.total_tokens).label('total_tokens'),
+            func.sum(QuotaEndpointUsage.cost_nanos).label('cost_nanos')
+        ).filter(
+            QuotaEndpointUsage.period_type == period,
+            QuotaEndpointUsage.period_start == period_start
+        ).group_by(
+            QuotaEndpointUsage.endpoint
+        ).order_by(
+            desc('total_tokens')
         ).all()
         
-        # Aggregate endpoint data
-        import json
-        endpoint_totals = {}
-        
-        for record in usage_records:
-            if record.endpoint_usage:
-                endpoint_data = json.loads(record.endpoint_usage)
-                for endpoint, stats in endpoint_data.items():
-                    if endpoint not in endpoint_totals:
-                        endpoint_totals[endpoint] = {
-                            'requests': 0,
-                            'input_tokens': 0,
-                            'output_tokens': 0,
-                            'total_tokens': 0,
-                            'cost': 0.0
-                        }
-                    
-                    endpoint_totals[endpoint]['requests'] += stats.get('requests', 0)
-                    endpoint_totals[endpoint]['input_tokens'] += stats.get('input_tokens', 0)
-                    endpoint_totals[endpoint]['output_tokens'] += stats.get('output_tokens', 0)
-                    endpoint_totals[endpoint]['total_tokens'] += stats.get('total_tokens', 0)
-                    endpoint_totals[endpoint]['cost'] += stats.get('cost', 0.0)
-        
-        # Sort by total tokens
-        sorted_endpoints = sorted(
-            endpoint_totals.items(),
-            key=lambda x: x[1]['total_tokens'],
-            reverse=True
-        )
+        sorted_endpoints = [
+            (row.endpoint, {
+                'requests': int(row.requests or 0),
+                'input_tokens': int(row.input_tokens or 0),
+                'output_tokens': int(row.output_tokens or 0),
+                'total_tokens': int(row.total_tokens or 0),
+                'cost': (row.cost_nanos or 0) / NANOS_PER_DOLLAR
+            })
+            for row in rows
+        ]
         
         return jsonify({
             'period': period,
@@ -284,11 +284,14 @@ def export_usage_data():
         ).all()
         
         if format_type == 'json':
-            return jsonify({
+            payload = {
                 'period': period,
                 'period_start': period_start.isoformat(),
                 'records': [record.to_dict() for record in usage_records]
-            }), 200
+            }
+            # Export can hold every user's row; orjson serializes it far faster
+            from flask import Response
+            return Response(orjson.dumps(payload), mimetype='application/json'), 200
         
         else:  # CSV
             import io
@@ -313,7 +316,7 @@ def export_usage_data():
                     record.total_input_tokens,
                     record.total_output_tokens,
                     record.total_tokens,
-                    float(record.total_cost)
+                    record.total_cost_nanos / NANOS_PER_DOLLAR
                 ])
             
             output.seek(0)
@@ -365,7 +368,7 @@ def get_usage_trends():
             QuotaUsage.period_start,
             func.sum(QuotaUsage.total_requests).label('requests'),
             func.sum(QuotaUsage.total_tokens).label('tokens'),
-            func.sum(QuotaUsage.total_cost).label('cost'),
+            func.sum(QuotaUsage.total_cost_nanos).label('cost_nanos'),
             func.count(QuotaUsage.id).label('users')
         ).filter(
             QuotaUsage.period_type == 'daily',
@@ -382,7 +385,7 @@ def get_usage_trends():
                     'date': day.period_start.isoformat(),
                     'requests': day.requests or 0,
                     'tokens': day.tokens or 0,
-                    'cost': float(day.cost or 0),
+                    'cost': (day.cost_nanos or 0) / NANOS_PER_DOLLAR,
                     'users': day.users or 0
                 }
                 for day in usage_by_day
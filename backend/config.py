@@ -33,6 +33,8 @@ class RedisConfig:
     socket_timeout: int = 5
     socket_connect_timeout: int = 5
     max_connections: int = 50
+    pool_timeout: int = 5  # Seconds to wait for a free pooled connection
+    health_check_interval: int = 30  # Ping idle connections before reuse
     
     def __post_init__(self):
         """✅ SECURITY: Validate Redis configuration"""
@@ -86,7 +86,7 @@ from learning_analytics_routes import learning_analytics_bp
 from integration_routes import integration_bp
 
 # Import prompt templates
-from prompt_templates import get_prompt_registry
+from prompt_templates import get_prompt_registry, get_response_cache
 
 # Import advanced modules
 from content_validator import get_content_validator
@@ -171,6 +171,7 @@ initialize_circuit_breakers(config)
 
 # Initialize prompt registry
 prompt_registry = get_prompt_registry()
+response_cache = get_response_cache()
 
 # Initialize content validator
 content_validator = get_content_validator()
@@ -2128,7 +2129,8 @@ def generate_quiz():
         if cached:
             return jsonify(cached)
             
-        prompt = prompt_registry.format(
+        # Static instructions go first as their own part so the prefix is cacheable
+        prompt_parts = prompt_registry.format_parts(
             "quiz_generation",
             count=count,
             subtopic=subtopic,
@@ -2137,7 +2139,7 @@ def generate_quiz():
         )
         
         model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt)
+        response = model.generate_content(list(prompt_parts))
         quiz_data = parse_json_response(response.text)
         
         # Cache result
@@ -2210,17 +2212,26 @@ def get_recommendations():
     # Get completed subtopics
     progress = analytics_db.get_user_progress(user_id, topic)
     completed = [p['subtopic'] for p in progress if p['mastery_level'] >= 2]
+    prompt_kwargs = {
+        'topic': topic,
+        'completed_subtopics': ", ".join(completed) if completed else "None"
+    }
     
-    prompt = prompt_registry.format(
-        "recommendation",
-        topic=topic,
-        completed_subtopics=", ".join(completed) if completed else "None"
-    )
+    # Identical inputs skip both prompt formatting and the model call
+    response_key = prompt_registry.response_key("recommendation", **prompt_kwargs)
+    cached = response_cache.lookup(response_key)
+    if cached is not None:
+        return jsonify(cached)
+    
+    prompt = prompt_registry.format("recommendation", **prompt_kwargs)
     
     try:
+        temperature = config.gemini.temperature
         model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt)
+        response = model.generate_content(prompt, generation_config={'temperature': temperature})
         recommendations = parse_json_response(response.text)
+        # Sampled completions (temperature > 0) are not shared between users
+        response_cache.update(response_key, recommendations, temperature=temperature)
         return jsonify(recommendations)
     except Exception as e:
         logger.error(f"Recommendation failed: {e}")
@@ -0,0 +1,188 @@
+"""
+Migration 003: Move per-endpoint quota usage into its own table
+
+Creates quota_endpoint_usage, copies the per-endpoint breakdown out of the
+JSON quota_usage.endpoint_usage column and only then drops that column.
+Duplicate quota_usage rows for the same user and period are merged so
+idx_quota_user_period can become the unique upsert conflict target.
+"""
+
+import json
+from collections import defaultdict
+
+from sqlalchemy import create_engine, inspect, text
+
+
+ENDPOINT_COUNTERS = ('requests', 'input_tokens', 'output_tokens', 'total_tokens', 'cost')
+
+
+def create_endpoint_table(conn):
+    """Create quota_endpoint_usage and its index"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS quota_endpoint_usage (
+            user_id VARCHAR(36) NOT NULL,
+            period_type VARCHAR(10) NOT NULL,
+            period_start TIMESTAMP NOT NULL,
+            endpoint VARCHAR(255) NOT NULL,
+            requests INTEGER NOT NULL DEFAULT 0,
+            input_tokens BIGINT NOT NULL DEFAULT 0,
+            output_tokens BIGINT NOT NULL DEFAULT 0,
+            total_tokens BIGINT NOT NULL DEFAULT 0,
+            cost NUMERIC(10, 4) NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, period_type, period_start, endpoint)
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_quota_endpoint_user_period "
+        "ON quota_endpoint_usage (user_id, period_start)"
+    ))
+
+
+def copy_endpoint_usage(conn) -> int:
+    """
+    Copy the JSON breakdown into quota_endpoint_usage
+    
+    Counters from duplicate quota_usage rows for the same period are summed.
+    
+    Returns:
+        Number of endpoint rows written
+    """
+    totals = defaultdict(lambda: dict.fromkeys(ENDPOINT_COUNTERS, 0))
+    rows = conn.execute(text(
+        "SELECT user_id, period_type, period_start, endpoint_usage FROM quota_usage "
+        "WHERE endpoint_usage IS NOT NULL AND endpoint_usage <> '' AND endpoint_usage <> '{}'"
+    ))
+    for row in rows:
+        try:
+            endpoints = json.loads(row.endpoint_usage)
+        except ValueError:
+            print(f"  ⚠️  Skipping unreadable endpoint_usage for user {row.user_id}")
+            continue
+        for endpoint, usage in endpoints.items():
+            counters = totals[(row.user_id, row.period_type, row.period_start, endpoint)]
+            for name in ENDPOINT_COUNTERS:
+                counters[name] += usage.get(name) or 0
+    
+    if totals:
+        conn.execute(
+            text("""
+                INSERT INTO quota_endpoint_usage
+                    (user_id, period_type, period_start, endpoint,
+                     requests, input_tokens, output_tokens, total_tokens, cost)
+                VALUES
+                    (:user_id, :period_type, :period_start, :endpoint,
+                     :requests, :input_tokens, :output_tokens, :total_tokens, :cost)
+            """),
+            [
+                {
+                    'user_id': user_id,
+                    'period_type': period_type,
+                    'period_start': period_start,
+                    'endpoint': endpoint,
+                    **counters
+                }
+                for (user_id, period_type, period_start, endpoint), counters in totals.items()
+            ]
+        )
+    return len(totals)
+
+
+def merge_duplicate_periods(conn) -> int:
+    """
+    Fold duplicate (user_id, period_type, period_start) rows into one
+    
+    The old check-then-insert path could create several rows for a period
+    under concurrency; the unique index cannot be built until they are merged.
+    
+    Returns:
+        Number of rows removed
+    """
+    conn.execute(text("""
+        UPDATE quota_usage
+        SET total_requests = merged.total_requests,
+            total_input_tokens = merged.total_input_tokens,
+            total_output_tokens = merged.total_output_tokens,
+            total_tokens = merged.total_tokens,
+            total_cost = merged.total_cost
+        FROM (
+            SELECT MIN(id) AS keep_id,
+                   SUM(total_requests) AS total_requests,
+                   SUM(total_input_tokens) AS total_input_tokens,
+                   SUM(total_output_tokens) AS total_output_tokens,
+                   SUM(total_tokens) AS total_tokens,
+                   SUM(total_cost) AS total_cost
+            FROM quota_usage
+            GROUP BY user_id, period_type, period_start
+            HAVING COUNT(*) > 1
+        ) AS merged
+        WHERE quota_usage.id = merged.keep_id
+    """))
+    return conn.execute(text("""
+        DELETE FROM quota_usage
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM quota_usage GROUP BY user_id, period_type, period_start
+        )
+    """)).rowcount
+
+
+def upgrade(conn):
+    """Apply migration"""
+    create_endpoint_table(conn)
+    
+    if not inspect(conn).has_table('quota_usage'):
+        # Fresh database; the tables are created from the models
+        return
+    
+    columns = {column['name'] for column in inspect(conn).get_columns('quota_usage')}
+    if 'endpoint_usage' in columns:
+        copied = copy_endpoint_usage(conn)
+        print(f"  ✅ Copied {copied} endpoint usage rows")
+    
+    removed = merge_duplicate_periods(conn)
+    if removed:
+        print(f"  ✅ Merged {removed} duplicate quota_usage rows")
+    
+    # Unique so the upsert in QuotaTracker can use it as the conflict target
+    conn.execute(text("DROP INDEX IF EXISTS idx_quota_user_period"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX idx_quota_user_period "
+        "ON quota_usage (user_id, period_type, period_start)"
+    ))
+    
+    if 'endpoint_usage' in columns:
+        conn.execute(text("ALTER TABLE quota_usage DROP COLUMN endpoint_usage"))
+        print("  ✅ Dropped quota_usage.endpoint_usage")
+
+
+def run_migration(database_url):
+    """Run the migration in a single transaction"""
+    print("=" * 60)
+    print("Running migration: Quota endpoint usage table")
+    print("=" * 60)
+    
+    engine = create_engine(database_url)
+    try:
+        with engine.begin() as conn:
+            upgrade(conn)
+        print("\n" + "=" * 60)
+        print("Migration completed successfully!")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    import os
+    from dotenv import load_dotenv
+    
+    load_dotenv()
+    database_url = os.getenv("DATABASE_URL")
+    
+    if not database_url:
+        print("❌ DATABASE_URL not found in environment")
+        exit(1)
+    
+    run_migration(database_url)
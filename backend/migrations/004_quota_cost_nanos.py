@@ -0,0 +1,77 @@
+"""
+Migration 004: Store quota costs as integer nano-dollars
+
+Replaces quota_usage.total_cost and quota_endpoint_usage.cost (NUMERIC
+dollars) with BIGINT nano-dollar columns, backfilled as
+round(cost * 1e9), then drops the old columns.
+"""
+
+from sqlalchemy import create_engine, inspect, text
+
+
+# (table, old dollar column, new nano-dollar column)
+COST_COLUMNS = (
+    ('quota_usage', 'total_cost', 'total_cost_nanos'),
+    ('quota_endpoint_usage', 'cost', 'cost_nanos'),
+)
+
+
+def convert_cost_column(conn, table, old_column, new_column):
+    """Add the nano-dollar column, backfill it and drop the dollar column"""
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        print(f"  ⏭️  Table {table} does not exist")
+        return
+    
+    columns = {column['name'] for column in inspector.get_columns(table)}
+    if old_column not in columns:
+        print(f"  ⏭️  {table}.{old_column} already converted")
+        return
+    
+    if new_column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {new_column} BIGINT NOT NULL DEFAULT 0"))
+    conn.execute(text(
+        f"UPDATE {table} SET {new_column} = CAST(ROUND({old_column} * 1000000000) AS BIGINT)"
+    ))
+    conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {old_column}"))
+    print(f"  ✅ Converted {table}.{old_column} to {new_column}")
+
+
+def upgrade(conn):
+    """Apply migration"""
+    for table, old_column, new_column in COST_COLUMNS:
+        convert_cost_column(conn, table, old_column, new_column)
+
+
+def run_migration(database_url):
+    """Run the migration in a single transaction"""
+    print("=" * 60)
+    print("Running migration: Quota costs in nano-dollars")
+    print("=" * 60)
+    
+    engine = create_engine(database_url)
+    try:
+        with engine.begin() as conn:
+            upgrade(conn)
+        print("\n" + "=" * 60)
+        print("Migration completed successfully!")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    import os
+    from dotenv import load_dotenv
+    
+    load_dotenv()
+    database_url = os.getenv("DATABASE_URL")
+    
+    if not database_url:
+        print("❌ DATABASE_URL not found in environment")
+        exit(1)
+    
+    run_migration(database_url)
@@ -0,0 +1,179 @@
+"""
+Migration 005: Range-partition quota_usage by month (PostgreSQL)
+
+create_all() skips a quota_usage table that already exists, so older
+deployments keep an unpartitioned table keyed on id alone. This migration
+builds the partitioned table with the (id, period_start) primary key,
+creates a partition for every month that has rows (plus the coming months
+and a DEFAULT partition), copies the rows across and swaps it in.
+
+Requires migration 004 (total_cost_nanos). No-op on other databases.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, text
+
+
+MONTHS_AHEAD = 2
+
+USAGE_COLUMNS = (
+    'id', 'user_id', 'period_start', 'period_end', 'period_type',
+    'total_requests', 'total_input_tokens', 'total_output_tokens', 'total_tokens',
+    'total_cost_nanos', 'created_at', 'updated_at'
+)
+
+
+def next_month(month: datetime) -> datetime:
+    """First day of the month after month"""
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def is_partitioned(conn) -> bool:
+    """Whether quota_usage is already a partitioned table"""
+    return conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'quota_usage' AND pg_table_is_visible(c.oid)
+    """)).first() is not None
+
+
+def create_partitioned_table(conn):
+    """Create quota_usage as a range-partitioned table with its indexes"""
+    conn.execute(text("""
+        CREATE TABLE quota_usage (
+            id VARCHAR(36) NOT NULL,
+            user_id VARCHAR(36) NOT NULL,
+            period_start TIMESTAMP NOT NULL,
+            period_end TIMESTAMP NOT NULL,
+            period_type VARCHAR(10) NOT NULL,
+            total_requests INTEGER NOT NULL DEFAULT 0,
+            total_input_tokens BIGINT NOT NULL DEFAULT 0,
+            total_output_tokens BIGINT NOT NULL DEFAULT 0,
+            total_tokens BIGINT NOT NULL DEFAULT 0,
+            total_cost_nanos BIGINT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (id, period_start)
+        ) PARTITION BY RANGE (period_start)
+    """))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX idx_quota_user_period ON quota_usage (user_id, period_type, period_start) "
+        "INCLUDE (total_tokens, total_cost_nanos)"
+    ))
+    conn.execute(text("CREATE INDEX idx_quota_period_start ON quota_usage (period_start)"))
+    conn.execute(text("CREATE INDEX ix_quota_usage_user_id ON quota_usage (user_id)"))
+    conn.execute(text("CREATE INDEX ix_quota_usage_period_start ON quota_usage (period_start)"))
+
+
+def create_partitions(conn, first_month: datetime) -> int:
+    """
+    Create monthly partitions from first_month through MONTHS_AHEAD months ahead
+    
+    Every month holding rows gets its own partition, so the DEFAULT
+    partition stays empty and later months can still be attached.
+    
+    Returns:
+        Number of monthly partitions
+    """
+    current = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month = current
+    for _ in range(MONTHS_AHEAD):
+        last_month = next_month(last_month)
+    
+    month = min(first_month.replace(day=1, hour=0, minute=0, second=0, microsecond=0), current)
+    count = 0
+    while month <= last_month:
+        following = next_month(month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS quota_usage_{month:%Y_%m} PARTITION OF quota_usage "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+        ))
+        month = following
+        count += 1
+    conn.execute(text("CREATE TABLE IF NOT EXISTS quota_usage_default PARTITION OF quota_usage DEFAULT"))
+    return count
+
+
+def upgrade(conn):
+    """Apply migration"""
+    if conn.dialect.name != 'postgresql':
+        print("  ⏭️  Partitioning only applies to PostgreSQL")
+        return
+    
+    if not inspect(conn).has_table('quota_usage'):
+        print("  ⏭️  Table quota_usage does not exist; create_all() builds it partitioned")
+        return
+    
+    if is_partitioned(conn):
+        print("  ⏭️  quota_usage is already partitioned")
+        return
+    
+    columns = {column['name'] for column in inspect(conn).get_columns('quota_usage')}
+    if 'total_cost_nanos' not in columns:
+        raise RuntimeError("quota_usage.total_cost_nanos is missing; run migration 004 first")
+    
+    # Writers wait until the new table is in place
+    conn.execute(text("LOCK TABLE quota_usage IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("ALTER TABLE quota_usage RENAME TO quota_usage_unpartitioned"))
+    
+    # Index names are schema-wide, so free them for the new table
+    old_indexes = conn.execute(text("""
+        SELECT indexname FROM pg_indexes
+        WHERE tablename = 'quota_usage_unpartitioned' AND schemaname = current_schema()
+    """)).scalars().all()
+    for index_name in old_indexes:
+        conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:46]}_unpartitioned"'))
+    
+    create_partitioned_table(conn)
+    
+    first_month = conn.execute(text(
+        "SELECT date_trunc('month', MIN(period_start)) FROM quota_usage_unpartitioned"
+    )).scalar()
+    partitions = create_partitions(conn, first_month or datetime.utcnow())
+    print(f"  ✅ Created {partitions} monthly partitions")
+    
+    column_list = ', '.join(USAGE_COLUMNS)
+    copied = conn.execute(text(
+        f"INSERT INTO quota_usage ({column_list}) SELECT {column_list} FROM quota_usage_unpartitioned"
+    )).rowcount
+    print(f"  ✅ Copied {copied} quota_usage rows")
+    
+    conn.execute(text("DROP TABLE quota_usage_unpartitioned"))
+    conn.execute(text("ANALYZE quota_usage"))
+
+
+def run_migration(database_url):
+    """Run the migration in a single transaction"""
+    print("=" * 60)
+    print("Running migration: Partition quota_usage")
+    print("=" * 60)
+    
+    engine = create_engine(database_url)
+    try:
+        with engine.begin() as conn:
+            upgrade(conn)
+        print("\n" + "=" * 60)
+        print("Migration completed successfully!")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    import os
+    from dotenv import load_dotenv
+    
+    load_dotenv()
+    database_url = os.getenv("DATABASE_URL")
+    
+    if not database_url:
+        print("❌ DATABASE_URL not found in environment")
+        exit(1)
+    
+    run_migration(database_url)
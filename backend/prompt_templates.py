@@ -3,9 +3,27 @@ AI Prompt Templates with Versioning
 Centralized prompt management for consistency and optimization
 """
 
-from dataclasses import dataclass
-from typing import Optional
+import functools
+import hashlib
+import json
+import os
+import string
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, Optional, Tuple
 from datetime import datetime
+from types import MappingProxyType
+
+# Optional path to a prebuilt registry snapshot (see --build-cache)
+SNAPSHOT_PATH_ENV = 'PROMPT_REGISTRY_SNAPSHOT'
+
+
+def _source_fingerprint() -> str:
+    """Hash of this module's source, used to reject stale snapshots"""
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
 
 @dataclass
@@ -18,14 +36,66 @@ class PromptTemplate:
     description: str
     few_shot_examples: Optional[list] = None
     max_tokens: int = 200
+    # Fully static instructions sent ahead of the formatted template so the
+    # leading bytes are identical across requests (provider prefix caching)
+    prefix: str = ""
+    
+    def __post_init__(self):
+        # Templates without replacement fields are rendered once here so
+        # format() can skip str.format entirely
+        has_fields = any(
+            field_name is not None
+            for _, field_name, _, _ in string.Formatter().parse(self.template)
+        )
+        self._static_text: Optional[str] = None if has_fields else self.template.format()
+    
+    def specialize(self, **partial_kwargs) -> 'PromptTemplate':
+        """
+        Return a copy with some replacement fields substituted in advance
+        
+        Fields not named in partial_kwargs are left in place for format().
+        """
+        parts = []
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(self.template):
+            parts.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field_name is None:
+                continue
+            if field_name in partial_kwargs:
+                value = partial_kwargs[field_name]
+                if conversion:
+                    value = {'r': repr, 's': str, 'a': ascii}[conversion](value)
+                rendered = format(value, format_spec or '')
+                parts.append(rendered.replace('{', '{{').replace('}', '}}'))
+            else:
+                conversion_part = f"!{conversion}" if conversion else ""
+                spec_part = f":{format_spec}" if format_spec else ""
+                parts.append(f"{{{field_name}{conversion_part}{spec_part}}}")
+        return replace(self, template=''.join(parts))
+    
+    def render(self, **kwargs) -> str:
+        """Render the variable part of the template"""
+        if self._static_text is not None:
+            return self._static_text
+        return self.template.format(**kwargs)
 
 
 class PromptRegistry:
     """Registry for managing prompt templates"""
     
-    def __init__(self):
-        self.templates = {}
-        self._register_default_templates()
+    def __init__(self, register_defaults: bool = True):
+        # name -> version -> template
+        self.templates: Dict[str, Dict[str, PromptTemplate]] = defaultdict(dict)
+        # name -> latest version template
+        self._latest: Dict[str, PromptTemplate] = {}
+        # Memoized list_templates() output, reset on register
+        self._list_cache: Optional[list] = None
+        # name -> (field, {value: pre-specialized latest template})
+        self._variants: Dict[str, Tuple[str, Dict[Any, PromptTemplate]]] = {}
+        self._frozen = False
+        if register_defaults:
+            self._register_default_templates()
+            self._register_default_variants()
+            self.freeze()
     
     def _register_default_templates(self):
         """Register all default prompt templates"""
@@ -36,25 +106,32 @@ class PromptRegistry:
             "at various education levels. Generate clear, accurate, and engaging content."
         )
         
-        # Explanation generation template (optimized - removed redundant system context)
-        self.register(PromptTemplate(
+        # Explanation generation template (static instructions first for prefix caching)
+        self._register(PromptTemplate(
             name="explanation_v2",
-            version="2.0",
-            template=(
-                "Generate a {detail} explanation of '{subtopic}' for a {education} level audience. "
-                "This is part of learning about '{topic}'. "
-                "Learning Style: {learning_style}. "
+            version="2.1",
+            prefix=(
+                "Generate an explanation of the subtopic described below for the given audience. "
+                "Match the requested level of detail, education level and learning style. "
                 "Include a real-world application example and a recommended YouTube video search query. "
-                "Return JSON format: {{\"explanation\": \"...\", \"real_world_application\": \"...\", \"youtube_search_query\": \"...\"}}. "
-                "Limit explanation to {max_words} words."
+                "Return JSON format: {\"explanation\": \"...\", \"real_world_application\": \"...\", \"youtube_search_query\": \"...\"}. "
+                "Limit the explanation to MaxWords words.\n\n"
             ),
-            created_at="2025-01-15",
+            template=(
+                "MaxWords: {max_words}\n"
+                "Topic: {topic}\n"
+                "Subtopic: {subtopic}\n"
+                "Level: {education}\n"
+                "Detail: {detail}\n"
+                "Style: {learning_style}"
+            ),
+            created_at="2026-10-18",
             description="Optimized explanation generator with structured output",
             max_tokens=400
         ))
         
         # Legacy template (for backward compatibility)
-        self.register(PromptTemplate(
+        self._register(PromptTemplate(
             name="explanation_v1",
             version="1.0",
             template=(
@@ -69,7 +146,7 @@ class PromptRegistry:
         ))
         
         # Subtopic generation template
-        self.register(PromptTemplate(
+        self._register(PromptTemplate(
             name="subtopics_v1",
             version="1.0",
             template=(
@@ -83,7 +160,7 @@ class PromptRegistry:
         ))
         
         # Image topic extraction (optimized)
-        self.register(PromptTemplate(
+        self._register(PromptTemplate(
             name="image_topic_v1",
             version="1.0",
             template=(
@@ -95,41 +172,53 @@ class PromptRegistry:
             max_tokens=20
         ))
 
-        # Quiz generation template
-        self.register(PromptTemplate(
+        # Quiz generation template (static instructions first for prefix caching)
+        self._register(PromptTemplate(
             name="quiz_generation",
-            version="1.0",
+            version="1.1",
+            prefix=(
+                "Generate multiple-choice questions about the subtopic described below for a student "
+                "at the given education level. "
+                "Return JSON array format: [{\"question\": \"...\", \"options\": [\"...\", \"...\", \"...\", \"...\"], \"correct_answer\": \"...\", \"explanation\": \"...\"}]. "
+                "Ensure questions test understanding, not just memorization.\n\n"
+            ),
             template=(
-                "Generate {count} multiple-choice questions about '{subtopic}' (part of '{topic}') "
-                "for a {education} level student. "
-                "Return JSON array format: [{{\"question\": \"...\", \"options\": [\"...\", \"...\", \"...\", \"...\"], \"correct_answer\": \"...\", \"explanation\": \"...\"}}]. "
-                "Ensure questions test understanding, not just memorization."
+                "Topic: {topic}\n"
+                "Subtopic: {subtopic}\n"
+                "Level: {education}\n"
+                "Questions: {count}"
             ),
-            created_at="2025-01-20",
+            created_at="2026-10-18",
             description="Quiz generator with structured output",
             max_tokens=1000
         ))
 
-        # Adaptive explanation template
-        self.register(PromptTemplate(
+        # Adaptive explanation template (static instructions first for prefix caching)
+        self._register(PromptTemplate(
             name="adaptive_explanation",
-            version="1.0",
-            template=(
-                "Explain '{subtopic}' (part of '{topic}') for a learner with {mastery_level} mastery. "
-                "Current context: {context}. "
-                "Learning Style: {learning_style}. "
+            version="1.1",
+            prefix=(
+                "Explain the subtopic described below for a learner with the given mastery level. "
+                "Adjust depth and complexity accordingly and match the requested learning style. "
                 "Include a real-world application example and a recommended YouTube video search query. "
-                "Adjust depth and complexity accordingly. "
-                "Return JSON format: {{\"explanation\": \"...\", \"real_world_application\": \"...\", \"youtube_search_query\": \"...\"}}. "
-                "Limit explanation to {max_words} words."
+                "Return JSON format: {\"explanation\": \"...\", \"real_world_application\": \"...\", \"youtube_search_query\": \"...\"}. "
+                "Limit the explanation to MaxWords words.\n\n"
             ),
-            created_at="2025-01-20",
+            template=(
+                "MaxWords: {max_words}\n"
+                "Topic: {topic}\n"
+                "Subtopic: {subtopic}\n"
+                "Mastery: {mastery_level}\n"
+                "Context: {context}\n"
+                "Style: {learning_style}"
+            ),
+            created_at="2026-10-18",
             description="Adaptive explanation generator based on mastery",
             max_tokens=400
         ))
         
         # Recommendation template
-        self.register(PromptTemplate(
+        self._register(PromptTemplate(
             name="recommendation",
             version="1.0",
             template=(
@@ -142,53 +231,293 @@ class PromptRegistry:
             max_tokens=300
         ))
     
+    def _register_default_variants(self):
+        """Pre-specialize templates for the max_words values main.py uses (brief/normal/detailed)"""
+        for name in ("explanation_v2", "adaptive_explanation"):
+            self._register_variants(name, "max_words", (100, 150, 300))
+    
+    def freeze(self):
+        """
+        Make the registry read-only so it can be shared across threads without locks
+        
+        Dynamic registration is not supported on production request paths;
+        call unfreeze() first if a template really must be added at runtime.
+        """
+        self.templates = MappingProxyType({
+            name: MappingProxyType(dict(versions)) for name, versions in self.templates.items()
+        })
+        self._latest = MappingProxyType(dict(self._latest))
+        self._variants = MappingProxyType(dict(self._variants))
+        self._frozen = True
+    
+    def unfreeze(self):
+        """Restore mutable storage so templates can be registered again"""
+        self.templates = defaultdict(dict, {
+            name: dict(versions) for name, versions in self.templates.items()
+        })
+        self._latest = dict(self._latest)
+        self._variants = dict(self._variants)
+        self._frozen = False
+    
+    def _check_not_frozen(self):
+        if self._frozen:
+            raise RuntimeError("Prompt registry is frozen; call unfreeze() before registering")
+    
     def register(self, template: PromptTemplate):
         """Register a new template"""
-        key = f"{template.name}:{template.version}"
-        self.templates[key] = template
+        self._check_not_frozen()
+        self._register(template)
+    
+    def _register(self, template: PromptTemplate):
+        self.templates[template.name][template.version] = template
+        self._list_cache = None
+        # Variants were specialized from the previous latest version
+        self._variants.pop(template.name, None)
+        latest = self._latest.get(template.name)
+        if latest is None or template.version >= latest.version:
+            self._latest[template.name] = template
     
     def get(self, name: str, version: Optional[str] = None) -> PromptTemplate:
         """Get template by name and version"""
         if version:
-            key = f"{name}:{version}"
-            if key not in self.templates:
-                raise ValueError(f"Template {key} not found")
-            return self.templates[key]
+            template = self.templates.get(name, {}).get(version)
+            if template is None:
+                raise ValueError(f"Template {name}:{version} not found")
+            return template
         else:
             # Get latest version
-            matching = [k for k in self.templates.keys() if k.startswith(f"{name}:")]
-            if not matching:
+            template = self._latest.get(name)
+            if template is None:
                 raise ValueError(f"No templates found for {name}")
-            latest_key = sorted(matching)[-1]  # Get latest version
-            return self.templates[latest_key]
+            return template
+    
+    def register_variants(self, name: str, field_name: str, values) -> None:
+        """
+        Pre-specialize the latest version of a template for common field values
+        
+        format() uses the matching variant when called without an explicit
+        version, and falls back to the generic template for other values.
+        """
+        self._check_not_frozen()
+        self._register_variants(name, field_name, values)
+    
+    def _register_variants(self, name: str, field_name: str, values) -> None:
+        template = self.get(name)
+        self._variants[name] = (
+            field_name,
+            {value: template.specialize(**{field_name: value}) for value in values}
+        )
     
     def format(self, name: str, version: Optional[str] = None, **kwargs) -> str:
-        """Format template with provided values"""
+        """Format template with provided values (static prefix first)"""
+        prefix, suffix = self.format_parts(name, version, **kwargs)
+        return prefix + suffix
+    
+    def format_parts(self, name: str, version: Optional[str] = None, **kwargs) -> Tuple[str, str]:
+        """
+        Format template as (static_prefix, variable_suffix)
+        
+        The prefix never changes between requests, so callers can send it as
+        a separate leading content part that providers cache by prefix.
+        """
+        template = None
+        if version is None and name in self._variants:
+            field_name, variants = self._variants[name]
+            try:
+                template = variants.get(kwargs.get(field_name))
+            except TypeError:
+                # Unhashable value (list, dict): no variant, render generically
+                template = None
+        if template is None:
+            template = self.get(name, version)
+        return template.prefix, template.render(**kwargs)
+    
+    def response_key(self, name: str, version: Optional[str] = None, **kwargs) -> bytes:
+        """Get ResponseCache key for a template and its inputs"""
         template = self.get(name, version)
-        return template.template.format(**kwargs)
+        return ResponseCache.make_key(template.name, template.version, **kwargs)
     
     def get_system_context(self) -> str:
         """Get system context for model initialization"""
         return self.system_context
     
+    def dump(self, path: str):
+        """
+        Write a snapshot of the registry for fast worker startup
+        
+        Args:
+            path: Destination file
+        """
+        snapshot = {
+            'fingerprint': _source_fingerprint(),
+            'system_context': self.system_context,
+            'templates': [
+                asdict(t) for versions in self.templates.values() for t in versions.values()
+            ]
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+    
+    @classmethod
+    def load(cls, path: str) -> Optional['PromptRegistry']:
+        """
+        Load a registry snapshot written by dump()
+        
+        Snapshots are plain JSON, so a file swapped in through the
+        environment variable can at worst supply bad templates, never run
+        code. Snapshots built from a different version of this module are
+        ignored.
+        
+        Returns:
+            PromptRegistry, or None if the snapshot is missing, stale or malformed
+        """
+        try:
+            with open(path, 'rb') as f:
+                snapshot = json.loads(f.read())
+            if snapshot.get('fingerprint') != _source_fingerprint():
+                return None
+            
+            registry = cls(register_defaults=False)
+            registry.system_context = snapshot['system_context']
+            for fields in snapshot['templates']:
+                registry._register(PromptTemplate(**fields))
+            registry._register_default_variants()
+            registry.freeze()
+            return registry
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            return None
+    
     def list_templates(self) -> list:
         """List all available templates"""
-        return [
-            {
-                "name": t.name,
-                "version": t.version,
-                "description": t.description,
-                "max_tokens": t.max_tokens,
-                "created_at": t.created_at
-            }
-            for t in self.templates.values()
-        ]
+        if self._list_cache is None:
+            self._list_cache = [
+                {
+                    "name": t.name,
+                    "version": t.version,
+                    "description": t.description,
+                    "max_tokens": t.max_tokens,
+                    "created_at": t.created_at
+                }
+                for versions in self.templates.values()
+                for t in versions.values()
+            ]
+        # Shallow copy so callers can't reorder or extend the cached list
+        return list(self._list_cache)
 
 
-# Global registry instance
-prompt_registry = PromptRegistry()
+class ResponseCache:
+    """
+    In-process LRU cache for model responses keyed by prompt inputs
+    
+    Keys are derived from (template name, version, kwargs) so a hit skips
+    both prompt formatting and the model round-trip.
+    """
+    
+    def __init__(self, max_size: int = 512, default_ttl: int = 600):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[bytes, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(name: str, version: str, **kwargs) -> bytes:
+        """Build SHA-256 cache key from template identity and inputs"""
+        payload = f"{name}:{version}:{json.dumps(kwargs, sort_keys=True, default=str)}"
+        return hashlib.sha256(payload.encode('utf-8')).digest()
+    
+    def lookup(self, key: bytes) -> Optional[Any]:
+        """Get cached response, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def update(
+        self,
+        key: bytes,
+        value: Any,
+        ttl: Optional[int] = None,
+        temperature: Optional[float] = None
+    ) -> bool:
+        """
+        Store response for key
+        
+        Responses sampled with a non-zero temperature are not cached since
+        repeating them would hide intended variation.
+        
+        Args:
+            temperature: Generation temperature the response was sampled with
+        
+        Returns:
+            True if the value was cached
+        """
+        if temperature is not None and temperature > 0:
+            return False
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return True
+    
+    def invalidate(self, key: bytes) -> bool:
+        """Remove a single entry"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
 
 
+# Global response cache instance
+response_cache = ResponseCache()
+
+
+@functools.cache
 def get_prompt_registry() -> PromptRegistry:
-    """Get global prompt registry"""
-    return prompt_registry
+    """Get global prompt registry (built on first use)"""
+    snapshot_path = os.getenv(SNAPSHOT_PATH_ENV)
+    if snapshot_path:
+        registry = PromptRegistry.load(snapshot_path)
+        if registry is not None:
+            return registry
+    return PromptRegistry()
+
+
+def __getattr__(name: str):
+    """Keep `from prompt_templates import prompt_registry` working lazily"""
+    if name == 'prompt_registry':
+        return get_prompt_registry()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_response_cache() -> ResponseCache:
+    """Get global prompt response cache"""
+    return response_cache
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Prompt template registry tools")
+    parser.add_argument('--build-cache', metavar='PATH', help="Write registry snapshot to PATH")
+    args = parser.parse_args()
+    
+    if args.build_cache:
+        PromptRegistry().dump(args.build_cache)
+        print(f"✅ Prompt registry snapshot written to {args.build_cache}")
+        print(f"   Set {SNAPSHOT_PATH_ENV}={args.build_cache} to load it at startup")
+    else:
+        parser.print_help()
@@ -1,50 +1,146 @@
-﻿"""
+"""
 Quick API Test
+
+Run directly against a local backend:
+    python quick_test.py
 """
-import requests
-
-print("Testing KNOWALLEDGE API...\n")
-
-# Test 1: Generate Subtopics
-print("1. Generating subtopics for 'Web Development'...")
-response = requests.post(
-    "http://127.0.0.1:5000/api/create_subtopics",
-    json={"topic": "Web Development"}
-)
-if response.status_code == 200:
-    data = response.json()
-    print(f"✅ Success! Generated {data['count']} subtopics:")
-    for i, sub in enumerate(data['subtopics'][:5], 1):
-        print(f"   {i}. {sub}")
-    print(f"   ... and {data['count'] - 5} more\n")
-else:
-    print(f"❌ Failed: {response.status_code}\n")
-
-# Test 2: Generate Presentation
-print("2. Generating presentation for 2 subtopics...")
-response = requests.post(
-    "http://127.0.0.1:5000/api/create_presentation",
-    json={
-        "topic": "Artificial Intelligence",
-        "educationLevel": "beginner",
-        "levelOfDetail": "brief",
-        "focus": ["Machine Learning", "Neural Networks"]
-    }
-)
-if response.status_code == 200:
-    data = response.json()
-    print(f"✅ Success! Generated {data['success_count']} explanations")
-    if data['explanations'] and len(data['explanations']) > 0:
-        exp = data['explanations'][0]
-        if isinstance(exp, dict):
-            print(f"\n📚 {exp['subtopic']}:")
-            print(f"   {exp['explanation'][:200]}...\n")
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://127.0.0.1:5000"
+JSON_HEADERS = {'content-type': 'application/json'}
+
+
+def post_subtopics(client):
+    """Generate subtopics for a sample topic"""
+    import orjson
+
+    return client.post(
+        "/api/create_subtopics",
+        content=orjson.dumps({"topic": "Web Development"}),
+        headers=JSON_HEADERS
+    )
+
+
+def post_presentation(client):
+    """Generate a presentation for two subtopics (body is streamed)"""
+    import orjson
+
+    request = client.build_request(
+        "POST",
+        "/api/create_presentation",
+        content=orjson.dumps({
+            "topic": "Artificial Intelligence",
+            "educationLevel": "beginner",
+            "levelOfDetail": "brief",
+            "focus": ["Machine Learning", "Neural Networks"]
+        }),
+        headers=JSON_HEADERS
+    )
+    return client.send(request, stream=True)
+
+
+def read_presentation(response):
+    """
+    Extract success_count and the first explanation from a presentation response
+
+    With ijson the body is parsed incrementally and only the first
+    explanation is materialized, so memory stays bounded however many
+    explanations the server returns.
+
+    Returns:
+        Tuple of (success_count, first_explanation)
+    """
+    try:
+        import ijson
+    except ImportError:
+        import orjson
+
+        data = orjson.loads(response.read())
+        explanations = data.get('explanations') or []
+        return data['success_count'], explanations[0] if explanations else None
+
+    state = {'success_count': None, 'first': None, 'builder': None}
+
+    def handle(prefix, event, value):
+        if prefix == 'success_count':
+            state['success_count'] = value
+        elif state['first'] is None and prefix.startswith('explanations.item'):
+            if state['builder'] is None:
+                state['builder'] = ijson.ObjectBuilder()
+            state['builder'].event(event, value)
+            # The item is complete once its own container closes (or it is a scalar)
+            if prefix == 'explanations.item' and event not in ('start_map', 'start_array', 'map_key'):
+                state['first'] = state['builder'].value
+
+    # Push-based parser fed from the streamed body chunks
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events)
+    for chunk in response.iter_bytes():
+        parser.send(chunk)
+        for parsed in events:
+            handle(*parsed)
+        del events[:]
+    parser.close()
+    for parsed in events:
+        handle(*parsed)
+
+    return state['success_count'], state['first']
+
+
+def main():
+    """Run the smoke test against BASE_URL"""
+    import httpx
+    import orjson
+
+    print("Testing KNOWALLEDGE API...\n")
+
+    # Shared client keeps connections alive between requests
+    client = httpx.Client(
+        base_url=BASE_URL,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+    )
+
+    # Both endpoints are independent and I/O-bound, so dispatch them concurrently
+    with client, ThreadPoolExecutor(max_workers=2) as executor:
+        subtopics_future = executor.submit(post_subtopics, client)
+        presentation_future = executor.submit(post_presentation, client)
+
+        # Test 1: Generate Subtopics
+        print("1. Generating subtopics for 'Web Development'...")
+        response = subtopics_future.result()
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            print(f"✅ Success! Generated {data['count']} subtopics:")
+            for i, sub in enumerate(data['subtopics'][:5], 1):
+                print(f"   {i}. {sub}")
+            print(f"   ... and {data['count'] - 5} more\n")
         else:
-            print(f"\n📚 First explanation:")
-            print(f"   {str(exp)[:200]}...\n")
-else:
-    print(f"❌ Failed: {response.status_code}\n")
-
-print("=" * 60)
-print("🎉 Your backend is working with Google AI!")
-print("=" * 60)
+            print(f"❌ Failed: {response.status_code}\n")
+
+        # Test 2: Generate Presentation
+        print("2. Generating presentation for 2 subtopics...")
+        response = presentation_future.result()
+        try:
+            if response.status_code == 200:
+                success_count, exp = read_presentation(response)
+                print(f"✅ Success! Generated {success_count} explanations")
+                if exp is not None:
+                    if isinstance(exp, dict):
+                        print(f"\n📚 {exp['subtopic']}:")
+                        print(f"   {exp['explanation'][:200]}...\n")
+                    else:
+                        print(f"\n📚 First explanation:")
+                        print(f"   {str(exp)[:200]}...\n")
+            else:
+                print(f"❌ Failed: {response.status_code}\n")
+        finally:
+            response.close()
+
+    print("=" * 60)
+    print("🎉 Your backend is working with Google AI!")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,59 @@ Tracks daily and monthly token usage with cost calculation
 Complies with Requirements 9.3, 9.6
 """
 
+import atexit
+import os
+import threading
 import time
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
-from dataclasses import dataclass
-from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Numeric, Index, create_engine
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from dataclasses import dataclass, field
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Index, bindparam, create_engine, func, select, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session as DBSession
-from flask import g
+from sqlalchemy.orm import scoped_session, sessionmaker, Session as DBSession
+from flask import g, has_app_context, has_request_context
+
+try:
+    from cachetools import TTLCache
+    CACHETOOLS_AVAILABLE = True
+except ImportError:
+    CACHETOOLS_AVAILABLE = False
 
 from structured_logging import get_logger
 
 logger = get_logger(__name__)
 
+# Redis keys for counters not yet flushed to the database
+PENDING_KEY_PREFIX = 'quota:pending'
+PENDING_SET_KEY = 'quota:pending:keys'
+PENDING_TTL_SECONDS = 2 * 86400
+PENDING_COUNTERS = ('requests', 'input_tokens', 'output_tokens', 'cost_nanos')
+
+# Flushed database totals cached in Redis so quota checks need no query.
+# A baseline is only valid while its epoch matches the user's epoch key,
+# which every flush of that user's counters increments.
+BASELINE_KEY_PREFIX = 'quota:baseline'
+EPOCH_KEY_PREFIX = 'quota:epoch'
+BASELINE_TTL_SECONDS = 60
+
+# Claim held by the worker flushing a pending hash
+FLUSH_LOCK_PREFIX = 'quota:flushing'
+FLUSH_LOCK_SECONDS = 60
+
+# Seconds between flushes of buffered counters to the database
+FLUSH_INTERVAL_SECONDS = 5.0
+
+# Process-local cache of recent totals used to skip enforcement queries
+# for users far below their limits
+ENFORCEMENT_CACHE_SIZE = 10_000
+ENFORCEMENT_CACHE_TTL = 2  # seconds
+ENFORCEMENT_FAST_PATH_RATIO = 0.5
+
+# Costs are stored as integer nano-dollars and converted at the API boundary
+NANOS_PER_DOLLAR = 1_000_000_000
+
 Base = declarative_base()
 
 
@@ -38,9 +78,26 @@ class CostConfig:
         Returns:
             Cost in USD
         """
-        input_cost = (input_tokens / 1_000_000) * self.input_token_cost
-        output_cost = (output_tokens / 1_000_000) * self.output_token_cost
-        return input_cost + output_cost
+        return self.calculate_cost_nanos(input_tokens, output_tokens) / NANOS_PER_DOLLAR
+    
+    def calculate_cost_nanos(self, input_tokens: int, output_tokens: int) -> int:
+        """
+        Calculate cost for token usage in nano-dollars
+        
+        Pure integer arithmetic; exact for per-1M prices quoted to a tenth
+        of a cent, otherwise rounded to the nearest nano-dollar.
+        
+        Args:
+            input_tokens: Number of input tokens
+            output_tokens: Number of output tokens
+        
+        Returns:
+            Cost in billionths of a USD
+        """
+        # Prices per 1M tokens, in nano-dollars
+        input_nanos = round(self.input_token_cost * NANOS_PER_DOLLAR)
+        output_nanos = round(self.output_token_cost * NANOS_PER_DOLLAR)
+        return (input_tokens * input_nanos + output_tokens * output_nanos + 500_000) // 1_000_000
 
 
 class QuotaUsage(Base):
@@ -57,8 +114,8 @@ class QuotaUsage(Base):
     # User identification
     user_id = Column(String(36), nullable=False, index=True)
     
-    # Time period
-    period_start = Column(DateTime, nullable=False, index=True)
+    # Time period (part of the primary key because Postgres partitions on it)
+    period_start = Column(DateTime, primary_key=True, index=True)
     period_end = Column(DateTime, nullable=False)
     period_type = Column(String(10), nullable=False)  # 'daily' or 'monthly'
     
@@ -68,28 +125,41 @@ class QuotaUsage(Base):
     total_output_tokens = Column(BigInteger, default=0, nullable=False)
     total_tokens = Column(BigInteger, default=0, nullable=False)
     
-    # Cost tracking (Requirement 9.6)
-    total_cost = Column(Numeric(10, 4), default=0, nullable=False)
-    
-    # Per-endpoint breakdown (stored as JSON string)
-    endpoint_usage = Column(String, nullable=True)  # JSON string
+    # Cost tracking (Requirement 9.6); migrations/004_quota_cost_nanos.py
+    # converts the older NUMERIC total_cost column
+    total_cost_nanos = Column(BigInteger, default=0, nullable=False)  # nano-dollars
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     # Indexes for performance
+    # idx_quota_user_period is unique so it can serve as the upsert conflict target,
+    # and covers the totals so quota checks are index-only scans on Postgres
     __table_args__ = (
-        Index('idx_quota_user_period', 'user_id', 'period_type', 'period_start'),
+        Index(
+            'idx_quota_user_period', 'user_id', 'period_type', 'period_start',
+            unique=True,
+            postgresql_include=['total_tokens', 'total_cost_nanos']
+        ),
         Index('idx_quota_period_start', 'period_start'),
+        # Monthly range partitions on Postgres; see ensure_quota_partitions()
+        {'postgresql_partition_by': 'RANGE (period_start)'},
     )
     
     def __repr__(self):
         return f"<QuotaUsage(user_id={self.user_id}, period={self.period_type}, tokens={self.total_tokens})>"
     
-    def to_dict(self):
-        """Convert to dictionary"""
-        return {
+    def to_dict(self, endpoint_usage: Optional[Dict] = None):
+        """
+        Convert to dictionary
+        
+        Args:
+            endpoint_usage: Per-endpoint breakdown to include (optional).
+                Endpoint rows live in QuotaEndpointUsage and are only
+                loaded when the caller asks for them.
+        """
+        data = {
             'id': self.id,
             'user_id': self.user_id,
             'period_start': self.period_start.isoformat() if self.period_start else None,
@@ -99,9 +169,166 @@ class QuotaUsage(Base):
             'total_input_tokens': self.total_input_tokens,
             'total_output_tokens': self.total_output_tokens,
             'total_tokens': self.total_tokens,
-            'total_cost': float(self.total_cost) if self.total_cost else 0.0,
-            'endpoint_usage': self.endpoint_usage
+            'total_cost': (self.total_cost_nanos or 0) / NANOS_PER_DOLLAR
         }
+        if endpoint_usage is not None:
+            data['endpoint_usage'] = endpoint_usage
+        return data
+
+
+class QuotaEndpointUsage(Base):
+    """
+    Per-endpoint usage for a user and period
+    
+    One row per (user, period, endpoint) so tracking a request only touches
+    that endpoint's counters instead of rewriting a JSON blob. Databases
+    created before this table are moved over by
+    migrations/003_quota_endpoint_usage.py.
+    """
+    __tablename__ = 'quota_endpoint_usage'
+    
+    user_id = Column(String(36), primary_key=True)
+    period_type = Column(String(10), primary_key=True)
+    period_start = Column(DateTime, primary_key=True)
+    endpoint = Column(String(255), primary_key=True)
+    
+    requests = Column(Integer, default=0, nullable=False)
+    input_tokens = Column(BigInteger, default=0, nullable=False)
+    output_tokens = Column(BigInteger, default=0, nullable=False)
+    total_tokens = Column(BigInteger, default=0, nullable=False)
+    cost_nanos = Column(BigInteger, default=0, nullable=False)  # nano-dollars
+    
+    __table_args__ = (
+        Index('idx_quota_endpoint_user_period', 'user_id', 'period_start'),
+    )
+    
+    def __repr__(self):
+        return f"<QuotaEndpointUsage(user_id={self.user_id}, endpoint={self.endpoint}, tokens={self.total_tokens})>"
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'requests': self.requests,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'total_tokens': self.total_tokens,
+            'cost': (self.cost_nanos or 0) / NANOS_PER_DOLLAR
+        }
+
+
+# Hot-path statements built once with bind parameters so each call reuses
+# the compiled form from the engine's statement cache
+_USAGE_ROW_WHERE = (
+    QuotaUsage.user_id == bindparam('p_user_id'),
+    QuotaUsage.period_type == bindparam('p_period_type'),
+    QuotaUsage.period_start == bindparam('p_period_start')
+)
+
+_SELECT_USAGE = select(QuotaUsage).where(*_USAGE_ROW_WHERE)
+
+_SELECT_USAGE_TOTALS = select(QuotaUsage.total_tokens, QuotaUsage.total_cost_nanos).where(*_USAGE_ROW_WHERE)
+
+_SELECT_USAGE_BOTH = select(
+    QuotaUsage.period_type, QuotaUsage.total_tokens, QuotaUsage.total_cost_nanos
+).where(
+    QuotaUsage.user_id == bindparam('p_user_id'),
+    tuple_(QuotaUsage.period_type, QuotaUsage.period_start).in_(bindparam('p_keys', expanding=True))
+)
+
+_INCREMENT_USAGE = (
+    update(QuotaUsage)
+    .where(*_USAGE_ROW_WHERE)
+    .values(
+        total_requests=QuotaUsage.total_requests + bindparam('p_requests'),
+        total_input_tokens=QuotaUsage.total_input_tokens + bindparam('p_input_tokens'),
+        total_output_tokens=QuotaUsage.total_output_tokens + bindparam('p_output_tokens'),
+        total_tokens=QuotaUsage.total_tokens + bindparam('p_total_tokens'),
+        total_cost_nanos=QuotaUsage.total_cost_nanos + bindparam('p_cost_nanos')
+    )
+    .execution_options(synchronize_session=False)
+)
+
+_INCREMENT_USAGE_RETURNING = _INCREMENT_USAGE.returning(QuotaUsage.total_tokens, QuotaUsage.total_cost_nanos)
+
+# Quota counters can lose the last few ticks on a crash, so their
+# transactions skip the WAL flush wait; scoped to the transaction only
+_ASYNC_COMMIT = text("SET LOCAL synchronous_commit = off")
+
+
+def _period_tokens(period_type: str, start_param: str):
+    """Scalar subquery for a user's token total in one period (0 when no row)"""
+    return func.coalesce(
+        select(QuotaUsage.total_tokens).where(
+            QuotaUsage.user_id == bindparam('p_user_id'),
+            QuotaUsage.period_type == period_type,
+            QuotaUsage.period_start == bindparam(start_param)
+        ).scalar_subquery(),
+        0
+    )
+
+
+_ENFORCEMENT_USAGE = select(
+    _period_tokens('daily', 'p_daily_start').label('daily_tokens'),
+    _period_tokens('monthly', 'p_monthly_start').label('monthly_tokens')
+).subquery()
+
+# Allow/deny computed by the database: a period is over when its tokens
+# exceed the remaining budget (limit minus the estimated request)
+_ENFORCEMENT_DECISION = select(
+    _ENFORCEMENT_USAGE.c.daily_tokens,
+    _ENFORCEMENT_USAGE.c.monthly_tokens,
+    (_ENFORCEMENT_USAGE.c.daily_tokens > bindparam('p_daily_budget')).label('daily_over'),
+    (_ENFORCEMENT_USAGE.c.monthly_tokens > bindparam('p_monthly_budget')).label('monthly_over')
+)
+
+
+def _usage_params(user_id: str, period_type: str, period_start: datetime) -> Dict:
+    """Bind parameters for _USAGE_ROW_WHERE"""
+    return {'p_user_id': user_id, 'p_period_type': period_type, 'p_period_start': period_start}
+
+
+@dataclass
+class UsageEvent:
+    """A single API call to record with QuotaTracker.track_usage_batch"""
+    user_id: str
+    endpoint: str
+    input_tokens: int
+    output_tokens: int
+
+
+class _UsageTotals(NamedTuple):
+    """Projected usage totals used by quota checks"""
+    total_tokens: int
+    total_cost: float
+
+
+def _decode(value) -> str:
+    """Redis returns bytes unless the client decodes responses"""
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _parse_pending(fields: Dict) -> Dict:
+    """
+    Parse a pending Redis hash into totals and a per-endpoint breakdown
+    
+    Endpoint counters are stored as 'ep:<counter>:<endpoint>' fields.
+    """
+    totals = {name: 0 for name in PENDING_COUNTERS}
+    endpoints: Dict[str, Dict] = {}
+    
+    for field, value in fields.items():
+        field = _decode(field)
+        if field.startswith('ep:'):
+            _, name, endpoint = field.split(':', 2)
+            target = endpoints.setdefault(endpoint, {counter: 0 for counter in PENDING_COUNTERS})
+        else:
+            name, target = field, totals
+        target[name] = int(value)
+    
+    for counters in [totals, *endpoints.values()]:
+        counters['total_tokens'] = counters['input_tokens'] + counters['output_tokens']
+    totals['endpoints'] = endpoints
+    return totals
 
 
 @dataclass
@@ -111,6 +338,19 @@ class QuotaLimits:
     daily_tokens: int
     monthly_tokens: int
     
+    # Token counts at which warnings start (75%) and turn critical (90%)
+    daily_warn: int = field(init=False, repr=False)
+    daily_crit: int = field(init=False, repr=False)
+    monthly_warn: int = field(init=False, repr=False)
+    monthly_crit: int = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        # Ceiling division so tokens >= threshold matches percentage >= 75/90 exactly
+        self.daily_warn = -(-self.daily_tokens * 75 // 100)
+        self.daily_crit = -(-self.daily_tokens * 90 // 100)
+        self.monthly_warn = -(-self.monthly_tokens * 75 // 100)
+        self.monthly_crit = -(-self.monthly_tokens * 90 // 100)
+    
     def __repr__(self):
         return f"<QuotaLimits {self.tier}: {self.daily_tokens} daily, {self.monthly_tokens} monthly>"
 
@@ -140,16 +380,46 @@ class QuotaTracker:
     Validates: Requirements 9.3, 9.4, 9.5, 9.6
     """
     
-    def __init__(self, db_session: DBSession, cost_config: Optional[CostConfig] = None):
+    def __init__(
+        self,
+        db_session: Union[DBSession, scoped_session],
+        cost_config: Optional[CostConfig] = None,
+        redis_client=None,
+        read_session: Optional[Union[DBSession, scoped_session]] = None
+    ):
         """
         Initialize quota tracker
         
         Args:
-            db_session: SQLAlchemy database session
+            db_session: SQLAlchemy session, or a scoped_session so each
+                thread uses its own session
             cost_config: Cost configuration (optional)
+            redis_client: Redis client for buffering counters (optional).
+                When set, track_usage only increments Redis hashes,
+                flush_pending() moves them into the database and quota
+                checks read their totals from Redis.
+            read_session: Session bound to a read replica (optional).
+                get_usage and the quota checks read through it so the
+                primary only takes increments; defaults to db_session.
+                Replica lag can hide the newest usage, which the recent
+                totals kept by track_usage partly cover.
         """
         self.db_session = db_session
+        self.read_session = read_session if read_session is not None else db_session
         self.cost_config = cost_config or CostConfig()
+        self.redis_client = redis_client
+        
+        self._flush_writer: Optional['QuotaTracker'] = None
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_stop = threading.Event()
+        self._flush_interval = FLUSH_INTERVAL_SECONDS
+        
+        # user_id -> (daily_tokens, monthly_tokens); TTLCache is not thread-safe
+        self._totals_cache = (
+            TTLCache(maxsize=ENFORCEMENT_CACHE_SIZE, ttl=ENFORCEMENT_CACHE_TTL)
+            if CACHETOOLS_AVAILABLE else None
+        )
+        self._totals_cache_lock = threading.Lock()
         
         logger.info("Quota tracker initialized")
     
@@ -166,6 +436,20 @@ class QuotaTracker:
         
         return None
     
+    def _request_cache(self) -> Optional[Dict]:
+        """
+        Per-request usage cache stored on flask.g
+        
+        Returns:
+            Cache dict keyed by (user_id, period_type), or None outside an app context
+        """
+        if not has_app_context():
+            return None
+        cache = g.get('_quota_cache')
+        if cache is None:
+            cache = g._quota_cache = {}
+        return cache
+    
     def _get_period_bounds(self, period_type: str) -> Tuple[datetime, datetime]:
         """
         Get start and end datetime for period
@@ -176,70 +460,222 @@ class QuotaTracker:
         Returns:
             Tuple of (period_start, period_end)
         """
-        now = datetime.utcnow()
+        # Bounds are fixed for the lifetime of a request
+        if has_request_context():
+            bounds = g.get('_period_bounds')
+            if bounds is None:
+                bounds = g._period_bounds = {}
+            if period_type not in bounds:
+                bounds[period_type] = self._compute_period_bounds(period_type)
+            return bounds[period_type]
+        
+        return self._compute_period_bounds(period_type)
+    
+    def _compute_period_bounds(self, period_type: str) -> Tuple[datetime, datetime]:
+        """Compute start and end datetime for period from the current time"""
+        # Build the start directly from the UTC calendar fields: one datetime,
+        # no utcnow() + replace() round trip
+        year, month, day = time.gmtime()[:3]
         
         if period_type == 'daily':
             # Start of current day
-            period_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            # End of current day
-            period_end = period_start + timedelta(days=1)
+            period_start = datetime(year, month, day)
         elif period_type == 'monthly':
             # Start of current month
-            period_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            # Start of next month
-            if now.month == 12:
-                period_end = period_start.replace(year=now.year + 1, month=1)
-            else:
-                period_end = period_start.replace(month=now.month + 1)
+            period_start = datetime(year, month, 1)
         else:
             raise ValueError(f"Invalid period_type: {period_type}")
         
-        return period_start, period_end
+        return period_start, self._period_end(period_type, period_start)
     
-    def _get_or_create_usage_record(
+    @staticmethod
+    def _period_end(period_type: str, period_start: datetime) -> datetime:
+        """End of the period starting at period_start"""
+        if period_type == 'daily':
+            # End of current day
+            return period_start + timedelta(days=1)
+        # Start of next month
+        if period_start.month == 12:
+            return period_start.replace(year=period_start.year + 1, month=1)
+        return period_start.replace(month=period_start.month + 1)
+    
+    def _begin_quota_transaction(self):
+        """
+        Relax commit durability for the current transaction on Postgres
+        
+        SET LOCAL lasts until the next commit or rollback, so other
+        transactions keep the server's synchronous_commit setting.
+        """
+        if self.db_session.get_bind().dialect.name == 'postgresql':
+            self.db_session.execute(_ASYNC_COMMIT)
+    
+    def _ensure_usage_row(
         self,
         user_id: str,
-        period_type: str
-    ) -> QuotaUsage:
+        period_type: str,
+        period_start: datetime,
+        period_end: datetime
+    ):
         """
-        Get or create usage record for user and period
+        Insert an empty usage row for user and period unless one already exists
         
-        Args:
-            user_id: User ID
-            period_type: 'daily' or 'monthly'
+        Uses INSERT ... ON CONFLICT DO NOTHING where supported so concurrent
+        workers creating the same row do not fail.
+        """
+        import uuid
+        values = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'period_start': period_start,
+            'period_end': period_end,
+            'period_type': period_type,
+            'total_requests': 0,
+            'total_input_tokens': 0,
+            'total_output_tokens': 0,
+            'total_tokens': 0,
+            'total_cost_nanos': 0
+        }
+        conflict_columns = ['user_id', 'period_type', 'period_start']
+        dialect = self.db_session.get_bind().dialect.name
+        
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            self.db_session.execute(
+                insert(QuotaUsage).values(**values).on_conflict_do_nothing(index_elements=conflict_columns)
+            )
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            self.db_session.execute(
+                insert(QuotaUsage).values(**values).on_conflict_do_nothing(index_elements=conflict_columns)
+            )
+        else:
+            from sqlalchemy import insert
+            try:
+                with self.db_session.begin_nested():
+                    self.db_session.execute(insert(QuotaUsage).values(**values))
+            except IntegrityError:
+                pass  # Created concurrently by another worker
+    
+    def _increment_usage(
+        self,
+        user_id: str,
+        period_type: str,
+        input_tokens: int,
+        output_tokens: int,
+        cost_nanos: int,
+        requests: int = 1,
+        period_start: Optional[datetime] = None,
+        fetch_totals: bool = False
+    ):
+        """
+        Atomically add usage to the user's row for the period
+        
+        A single UPDATE ... SET col = col + :n avoids the read-modify-write
+        race between workers. The row is created on first use.
         
         Returns:
-            QuotaUsage record
+            With fetch_totals, the row's (total_tokens, total_cost_nanos)
+            after the increment, taken from UPDATE ... RETURNING where the
+            database supports it; otherwise None
         """
-        period_start, period_end = self._get_period_bounds(period_type)
+        if period_start is None:
+            period_start, period_end = self._get_period_bounds(period_type)
+        else:
+            period_end = self._period_end(period_type, period_start)
+        params = _usage_params(user_id, period_type, period_start)
+        params.update(
+            p_requests=requests,
+            p_input_tokens=input_tokens,
+            p_output_tokens=output_tokens,
+            p_total_tokens=input_tokens + output_tokens,
+            p_cost_nanos=cost_nanos
+        )
         
-        # Try to find existing record
-        usage = self.db_session.query(QuotaUsage).filter(
-            QuotaUsage.user_id == user_id,
-            QuotaUsage.period_type == period_type,
-            QuotaUsage.period_start == period_start
-        ).first()
-        
-        if not usage:
-            # Create new record
-            import uuid
-            usage = QuotaUsage(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                period_start=period_start,
-                period_end=period_end,
-                period_type=period_type,
-                total_requests=0,
-                total_input_tokens=0,
-                total_output_tokens=0,
-                total_tokens=0,
-                total_cost=0,
-                endpoint_usage='{}'
+        if fetch_totals and self.db_session.get_bind().dialect.update_returning:
+            totals = self.db_session.execute(_INCREMENT_USAGE_RETURNING, params).one_or_none()
+            if totals is None:
+                self._ensure_usage_row(user_id, period_type, period_start, period_end)
+                totals = self.db_session.execute(_INCREMENT_USAGE_RETURNING, params).one()
+            return totals
+        
+        if self.db_session.execute(_INCREMENT_USAGE, params).rowcount == 0:
+            self._ensure_usage_row(user_id, period_type, period_start, period_end)
+            self.db_session.execute(_INCREMENT_USAGE, params)
+        
+        if fetch_totals:
+            return self.db_session.execute(_SELECT_USAGE_TOTALS, params).one()
+        return None
+    
+    def _increment_endpoint_usage(
+        self,
+        user_id: str,
+        period_type: str,
+        period_start: datetime,
+        endpoint: str,
+        input_tokens: int,
+        output_tokens: int,
+        cost_nanos: int,
+        requests: int = 1
+    ):
+        """
+        Add usage to the endpoint's row for the period
+        
+        Uses INSERT ... ON CONFLICT DO UPDATE where supported, otherwise an
+        UPDATE followed by an INSERT when no row exists yet.
+        """
+        values = {
+            'user_id': user_id,
+            'period_type': period_type,
+            'period_start': period_start,
+            'endpoint': endpoint,
+            'requests': requests,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens,
+            'cost_nanos': cost_nanos
+        }
+        counters = ('requests', 'input_tokens', 'output_tokens', 'total_tokens', 'cost_nanos')
+        dialect = self.db_session.get_bind().dialect.name
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(QuotaEndpointUsage).values(**values)
+            self.db_session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=['user_id', 'period_type', 'period_start', 'endpoint'],
+                    set_={
+                        name: getattr(QuotaEndpointUsage, name) + getattr(stmt.excluded, name)
+                        for name in counters
+                    }
+                )
             )
-            self.db_session.add(usage)
-            self.db_session.flush()
+            return
         
-        return usage
+        from sqlalchemy import insert
+        stmt = (
+            update(QuotaEndpointUsage)
+            .where(
+                QuotaEndpointUsage.user_id == user_id,
+                QuotaEndpointUsage.period_type == period_type,
+                QuotaEndpointUsage.period_start == period_start,
+                QuotaEndpointUsage.endpoint == endpoint
+            )
+            .values({
+                name: getattr(QuotaEndpointUsage, name) + values[name]
+                for name in counters
+            })
+            .execution_options(synchronize_session=False)
+        )
+        if self.db_session.execute(stmt).rowcount == 0:
+            try:
+                with self.db_session.begin_nested():
+                    self.db_session.execute(insert(QuotaEndpointUsage).values(**values))
+            except IntegrityError:
+                # Created concurrently by another worker
+                self.db_session.execute(stmt)
     
     def track_usage(
         self,
@@ -274,50 +710,43 @@ class QuotaTracker:
             }
         
         # Calculate cost (Requirement 9.6)
-        cost = self.cost_config.calculate_cost(input_tokens, output_tokens)
+        cost_nanos = self.cost_config.calculate_cost_nanos(input_tokens, output_tokens)
+        cost = cost_nanos / NANOS_PER_DOLLAR
         total_tokens = input_tokens + output_tokens
         
+        # Buffer counters in Redis; flush_pending() writes them to the database
+        if self.redis_client is not None:
+            try:
+                return self._track_usage_pending(user_id, endpoint, input_tokens, output_tokens, cost_nanos)
+            except Exception as e:
+                logger.warning(f"Redis quota counters unavailable, writing to database: {e}")
+        
         try:
-            # Update daily usage
-            daily_usage = self._get_or_create_usage_record(user_id, 'daily')
-            daily_usage.total_requests += 1
-            daily_usage.total_input_tokens += input_tokens
-            daily_usage.total_output_tokens += output_tokens
-            daily_usage.total_tokens += total_tokens
-            daily_usage.total_cost = float(daily_usage.total_cost) + cost
+            # All daily/monthly and endpoint increments share one transaction
+            self._begin_quota_transaction()
             
-            # Update monthly usage
-            monthly_usage = self._get_or_create_usage_record(user_id, 'monthly')
-            monthly_usage.total_requests += 1
-            monthly_usage.total_input_tokens += input_tokens
-            monthly_usage.total_output_tokens += output_tokens
-            monthly_usage.total_tokens += total_tokens
-            monthly_usage.total_cost = float(monthly_usage.total_cost) + cost
+            # Atomic increments that also return the fresh totals
+            totals = {}
+            for period_type in ('daily', 'monthly'):
+                totals[period_type] = self._increment_usage(
+                    user_id, period_type, input_tokens, output_tokens, cost_nanos, fetch_totals=True
+                )
             
-            # Update per-endpoint breakdown
-            import json
-            for usage_record in [daily_usage, monthly_usage]:
-                endpoint_data = json.loads(usage_record.endpoint_usage or '{}')
-                if endpoint not in endpoint_data:
-                    endpoint_data[endpoint] = {
-                        'requests': 0,
-                        'input_tokens': 0,
-                        'output_tokens': 0,
-                        'total_tokens': 0,
-                        'cost': 0.0
-                    }
-                
-                endpoint_data[endpoint]['requests'] += 1
-                endpoint_data[endpoint]['input_tokens'] += input_tokens
-                endpoint_data[endpoint]['output_tokens'] += output_tokens
-                endpoint_data[endpoint]['total_tokens'] += total_tokens
-                endpoint_data[endpoint]['cost'] += cost
-                
-                usage_record.endpoint_usage = json.dumps(endpoint_data)
+            # Per-endpoint counters
+            for period_type in ('daily', 'monthly'):
+                period_start, _ = self._get_period_bounds(period_type)
+                self._increment_endpoint_usage(
+                    user_id, period_type, period_start, endpoint, input_tokens, output_tokens, cost_nanos
+                )
             
             # Commit changes
             self.db_session.commit()
             
+            # Usage cached earlier in this request is now stale
+            self._invalidate_request_cache(user_id)
+            self._invalidate_baseline([user_id])
+            self._remember_totals(user_id, totals['daily'].total_tokens, totals['monthly'].total_tokens)
+            
             logger.info(
                 "Usage tracked",
                 extra={
@@ -336,10 +765,10 @@ class QuotaTracker:
                 'output_tokens': output_tokens,
                 'total_tokens': total_tokens,
                 'cost': cost,
-                'daily_total': daily_usage.total_tokens,
-                'monthly_total': monthly_usage.total_tokens,
-                'daily_cost': float(daily_usage.total_cost),
-                'monthly_cost': float(monthly_usage.total_cost)
+                'daily_total': totals['daily'].total_tokens,
+                'monthly_total': totals['monthly'].total_tokens,
+                'daily_cost': totals['daily'].total_cost_nanos / NANOS_PER_DOLLAR,
+                'monthly_cost': totals['monthly'].total_cost_nanos / NANOS_PER_DOLLAR
             }
             
         except Exception as e:
@@ -351,10 +780,473 @@ class QuotaTracker:
                 'error': str(e)
             }
     
+    def track_usage_batch(self, events: List[UsageEvent]) -> Dict:
+        """
+        Track a burst of API calls in one transaction
+        
+        Events are folded per user and period (and per endpoint) before
+        writing, so the database sees one UPDATE per group, issued as a
+        single executemany, and one commit for the whole batch.
+        
+        Args:
+            events: Usage events to record
+        
+        Returns:
+            Dictionary with batch totals
+        """
+        if not events:
+            return {'tracked': True, 'events': 0, 'total_tokens': 0, 'cost': 0.0}
+        
+        usage_groups = defaultdict(lambda: [0, 0, 0, 0])  # requests, input, output, cost_nanos
+        endpoint_groups = defaultdict(lambda: [0, 0, 0, 0])
+        period_starts = {
+            period_type: self._get_period_bounds(period_type)[0]
+            for period_type in ('daily', 'monthly')
+        }
+        
+        for event in events:
+            cost_nanos = self.cost_config.calculate_cost_nanos(event.input_tokens, event.output_tokens)
+            for period_type in ('daily', 'monthly'):
+                for totals in (
+                    usage_groups[(event.user_id, period_type)],
+                    endpoint_groups[(event.user_id, period_type, event.endpoint)]
+                ):
+                    totals[0] += 1
+                    totals[1] += event.input_tokens
+                    totals[2] += event.output_tokens
+                    totals[3] += cost_nanos
+        
+        try:
+            self._begin_quota_transaction()
+            params = []
+            for (user_id, period_type), (requests, input_tokens, output_tokens, cost_nanos) in usage_groups.items():
+                period_start = period_starts[period_type]
+                self._ensure_usage_row(
+                    user_id, period_type, period_start, self._period_end(period_type, period_start)
+                )
+                group_params = _usage_params(user_id, period_type, period_start)
+                group_params.update(
+                    p_requests=requests,
+                    p_input_tokens=input_tokens,
+                    p_output_tokens=output_tokens,
+                    p_total_tokens=input_tokens + output_tokens,
+                    p_cost_nanos=cost_nanos
+                )
+                params.append(group_params)
+            # Core executemany on the session's connection (Session.execute with a
+            # list would switch to ORM bulk-by-primary-key mode)
+            self.db_session.connection().execute(_INCREMENT_USAGE, params)
+            
+            for (user_id, period_type, endpoint), (requests, input_tokens, output_tokens, cost_nanos) in endpoint_groups.items():
+                self._increment_endpoint_usage(
+                    user_id, period_type, period_starts[period_type], endpoint,
+                    input_tokens, output_tokens, cost_nanos,
+                    requests=requests
+                )
+            
+            self.db_session.commit()
+        except Exception as e:
+            logger.error(f"Error tracking usage batch: {e}", exc_info=True)
+            self.db_session.rollback()
+            return {
+                'tracked': False,
+                'reason': 'database_error',
+                'error': str(e)
+            }
+        
+        for user_id, _ in usage_groups:
+            self._invalidate_request_cache(user_id)
+            if self._totals_cache is not None:
+                with self._totals_cache_lock:
+                    self._totals_cache.pop(user_id, None)
+        self._invalidate_baseline({user_id for user_id, _ in usage_groups})
+        
+        total_tokens = sum(totals[1] + totals[2] for (_, period_type), totals in usage_groups.items() if period_type == 'daily')
+        cost_nanos = sum(totals[3] for (_, period_type), totals in usage_groups.items() if period_type == 'daily')
+        
+        logger.info(
+            "Usage batch tracked",
+            extra={
+                'events': len(events),
+                'users': len(usage_groups) // 2,
+                'tokens': total_tokens
+            }
+        )
+        
+        return {
+            'tracked': True,
+            'events': len(events),
+            'total_tokens': total_tokens,
+            'cost': cost_nanos / NANOS_PER_DOLLAR
+        }
+    
+    def _remember_totals(self, user_id: str, daily_tokens: int, monthly_tokens: int):
+        """Store recent token totals for the enforcement fast path"""
+        if self._totals_cache is not None:
+            with self._totals_cache_lock:
+                self._totals_cache[user_id] = (daily_tokens, monthly_tokens)
+    
+    def _recent_totals(self, user_id: str) -> Optional[Tuple[int, int]]:
+        """Recent (daily_tokens, monthly_tokens) for user, if still fresh"""
+        if self._totals_cache is None:
+            return None
+        with self._totals_cache_lock:
+            return self._totals_cache.get(user_id)
+    
+    def _invalidate_request_cache(self, user_id: str):
+        """Drop usage cached for user during this request"""
+        cache = self._request_cache()
+        if cache is not None:
+            for period_type in ('daily', 'monthly'):
+                cache.pop((user_id, period_type), None)
+                cache.pop((user_id, period_type, 'totals'), None)
+    
+    def _pending_key(self, user_id: str, period_type: str, period_start: datetime) -> str:
+        """Redis hash holding unflushed counters for user and period"""
+        return f"{PENDING_KEY_PREFIX}:{period_type}:{period_start:%Y-%m-%d}:{user_id}"
+    
+    def _parse_pending_key(self, key: str) -> Tuple[str, str, datetime]:
+        """Split a pending key into (user_id, period_type, period_start)"""
+        period_type, day, user_id = key[len(PENDING_KEY_PREFIX) + 1:].split(':', 2)
+        return user_id, period_type, datetime.strptime(day, '%Y-%m-%d')
+    
+    def _track_usage_pending(
+        self,
+        user_id: str,
+        endpoint: str,
+        input_tokens: int,
+        output_tokens: int,
+        cost_nanos: int
+    ) -> Dict:
+        """
+        Track usage by incrementing Redis counters instead of the database
+        
+        Both periods and the endpoint breakdown are updated in one
+        pipelined transaction; no database write happens on this path.
+        """
+        pipe = self.redis_client.pipeline()
+        for period_type in ('daily', 'monthly'):
+            period_start, _ = self._get_period_bounds(period_type)
+            key = self._pending_key(user_id, period_type, period_start)
+            for field, amount in (
+                ('requests', 1),
+                ('input_tokens', input_tokens),
+                ('output_tokens', output_tokens),
+                ('cost_nanos', cost_nanos)
+            ):
+                pipe.hincrby(key, field, amount)
+                pipe.hincrby(key, f"ep:{field}:{endpoint}", amount)
+            pipe.expire(key, PENDING_TTL_SECONDS)
+            pipe.sadd(PENDING_SET_KEY, key)
+        pipe.execute()
+        
+        self._invalidate_request_cache(user_id)
+        totals = self._get_usage_both(user_id)
+        total_tokens = input_tokens + output_tokens
+        cost = cost_nanos / NANOS_PER_DOLLAR
+        self._remember_totals(
+            user_id,
+            totals['daily'].total_tokens if totals['daily'] else total_tokens,
+            totals['monthly'].total_tokens if totals['monthly'] else total_tokens
+        )
+        
+        logger.info(
+            "Usage tracked",
+            extra={
+                'user_id': user_id,
+                'endpoint': endpoint,
+                'tokens': total_tokens,
+                'cost': f"${cost:.4f}",
+                'buffered': True
+            }
+        )
+        
+        return {
+            'tracked': True,
+            'user_id': user_id,
+            'endpoint': endpoint,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': total_tokens,
+            'cost': cost,
+            'daily_total': totals['daily'].total_tokens if totals['daily'] else total_tokens,
+            'monthly_total': totals['monthly'].total_tokens if totals['monthly'] else total_tokens,
+            'daily_cost': totals['daily'].total_cost if totals['daily'] else cost,
+            'monthly_cost': totals['monthly'].total_cost if totals['monthly'] else cost
+        }
+    
+    def _get_pending(self, user_id: str, period_types: Tuple[str, ...]) -> Dict[str, Dict]:
+        """
+        Read unflushed Redis counters for user
+        
+        Returns:
+            Dictionary mapping period_type to parsed counters (periods with
+            nothing pending are omitted)
+        """
+        if self.redis_client is None:
+            return {}
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for period_type in period_types:
+                period_start, _ = self._get_period_bounds(period_type)
+                pipe.hgetall(self._pending_key(user_id, period_type, period_start))
+            results = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not read pending quota counters: {e}")
+            return {}
+        
+        return {
+            period_type: _parse_pending(fields)
+            for period_type, fields in zip(period_types, results)
+            if fields
+        }
+    
+    def _baseline_key(self, user_id: str, daily_start: datetime, monthly_start: datetime) -> str:
+        """Redis hash caching the flushed database totals for user"""
+        return f"{BASELINE_KEY_PREFIX}:{daily_start:%Y-%m-%d}:{monthly_start:%Y-%m-%d}:{user_id}"
+    
+    def _epoch_key(self, user_id: str) -> str:
+        """Redis counter bumped whenever user's database totals change"""
+        return f"{EPOCH_KEY_PREFIX}:{user_id}"
+    
+    def _get_buffered_totals(self, user_id: str) -> Optional[Dict[str, '_UsageTotals']]:
+        """
+        Get daily and monthly totals from Redis without touching the database
+        
+        Totals are the cached database baseline plus the unflushed counters,
+        read together in one MULTI so a concurrent flush is seen either
+        entirely or not at all. The database is only queried when the
+        baseline is missing or older than the user's last flush.
+        
+        Returns:
+            Dictionary mapping 'daily'/'monthly' to totals, or None if Redis
+            is unavailable
+        """
+        if self.redis_client is None:
+            return None
+        
+        daily_start, _ = self._get_period_bounds('daily')
+        monthly_start, _ = self._get_period_bounds('monthly')
+        baseline_key = self._baseline_key(user_id, daily_start, monthly_start)
+        
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.hgetall(baseline_key)
+            pipe.get(self._epoch_key(user_id))
+            pipe.hgetall(self._pending_key(user_id, 'daily', daily_start))
+            pipe.hgetall(self._pending_key(user_id, 'monthly', monthly_start))
+            baseline, epoch, daily_fields, monthly_fields = pipe.execute()
+            
+            baseline = {_decode(field): int(value) for field, value in baseline.items()}
+            epoch = int(epoch or 0)
+            if baseline.get('epoch') != epoch:
+                baseline = self._load_baseline(user_id, daily_start, monthly_start, baseline_key, epoch)
+        except Exception as e:
+            logger.warning(f"Could not read quota totals from Redis: {e}")
+            return None
+        
+        totals = {}
+        for period_type, fields in (('daily', daily_fields), ('monthly', monthly_fields)):
+            pending = _parse_pending(fields)
+            totals[period_type] = _UsageTotals(
+                baseline[f'{period_type}_tokens'] + pending['total_tokens'],
+                (baseline[f'{period_type}_cost_nanos'] + pending['cost_nanos']) / NANOS_PER_DOLLAR
+            )
+        return totals
+    
+    def _load_baseline(
+        self,
+        user_id: str,
+        daily_start: datetime,
+        monthly_start: datetime,
+        baseline_key: str,
+        epoch: int
+    ) -> Dict[str, int]:
+        """
+        Read user's database totals and cache them in Redis
+        
+        The baseline is tagged with the epoch read before the query, so if
+        a flush commits meanwhile the cached copy is already stale and the
+        next check reloads it.
+        """
+        baseline = {
+            'epoch': epoch,
+            'daily_tokens': 0,
+            'daily_cost_nanos': 0,
+            'monthly_tokens': 0,
+            'monthly_cost_nanos': 0
+        }
+        rows = self.read_session.execute(_SELECT_USAGE_BOTH, {
+            'p_user_id': user_id,
+            'p_keys': [('daily', daily_start), ('monthly', monthly_start)]
+        })
+        for row in rows:
+            baseline[f'{row.period_type}_tokens'] = row.total_tokens
+            baseline[f'{row.period_type}_cost_nanos'] = row.total_cost_nanos
+        
+        pipe = self.redis_client.pipeline()
+        pipe.hset(baseline_key, mapping=baseline)
+        pipe.expire(baseline_key, BASELINE_TTL_SECONDS)
+        pipe.execute()
+        return baseline
+    
+    def _invalidate_baseline(self, user_ids):
+        """Force the next Redis totals read for users to reload from the database"""
+        if self.redis_client is None:
+            return
+        try:
+            pipe = self.redis_client.pipeline()
+            for user_id in user_ids:
+                pipe.incr(self._epoch_key(user_id))
+                pipe.expire(self._epoch_key(user_id), PENDING_TTL_SECONDS)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not invalidate cached quota totals: {e}")
+    
+    def flush_pending(self) -> int:
+        """
+        Move buffered Redis counters into the database
+        
+        Each pending hash is claimed with a short lock so only one worker
+        flushes it, written with the same atomic UPDATE used by the direct
+        path, and only after the commit are the flushed amounts subtracted
+        from Redis. If the database write fails the counters simply stay
+        pending for the next flush.
+        
+        Returns:
+            Number of pending hashes flushed
+        """
+        if self.redis_client is None:
+            return 0
+        
+        if self._flush_writer is None:
+            # Own session so flushing never shares state with request handling
+            self._flush_writer = QuotaTracker(DBSession(bind=self.db_session.get_bind()), self.cost_config)
+        writer = self._flush_writer
+        
+        flushed = 0
+        for key in self.redis_client.smembers(PENDING_SET_KEY):
+            key = _decode(key)
+            lock_key = f"{FLUSH_LOCK_PREFIX}:{key}"
+            if not self.redis_client.set(lock_key, 1, nx=True, ex=FLUSH_LOCK_SECONDS):
+                # Another worker is flushing this hash
+                continue
+            
+            try:
+                fields = {
+                    _decode(field): int(value)
+                    for field, value in self.redis_client.hgetall(key).items()
+                    if int(value)
+                }
+                if not fields:
+                    self._drop_if_empty(key)
+                    continue
+                
+                pending = _parse_pending(fields)
+                user_id, period_type, period_start = self._parse_pending_key(key)
+                try:
+                    writer._begin_quota_transaction()
+                    writer._increment_usage(
+                        user_id, period_type,
+                        pending['input_tokens'], pending['output_tokens'], pending['cost_nanos'],
+                        requests=pending['requests'],
+                        period_start=period_start
+                    )
+                    for endpoint, usage in pending['endpoints'].items():
+                        writer._increment_endpoint_usage(
+                            user_id, period_type, period_start, endpoint,
+                            usage['input_tokens'], usage['output_tokens'], usage['cost_nanos'],
+                            requests=usage['requests']
+                        )
+                    writer.db_session.commit()
+                except Exception as e:
+                    logger.error(f"Error flushing quota counters for {key}: {e}", exc_info=True)
+                    writer.db_session.rollback()
+                    continue
+                
+                self._settle_pending(key, user_id, fields)
+                flushed += 1
+            finally:
+                self.redis_client.delete(lock_key)
+        
+        return flushed
+    
+    def _settle_pending(self, key: str, user_id: str, fields: Dict[str, int]):
+        """
+        Subtract counters now in the database from the pending hash
+        
+        The subtraction and the epoch bump share one MULTI, so readers see
+        either the old baseline with the full pending counts or a stale
+        baseline that they reload. Increments made while flushing survive.
+        """
+        pipe = self.redis_client.pipeline()
+        for field, value in fields.items():
+            pipe.hincrby(key, field, -value)
+        pipe.incr(self._epoch_key(user_id))
+        pipe.expire(self._epoch_key(user_id), PENDING_TTL_SECONDS)
+        pipe.execute()
+        self._drop_if_empty(key)
+    
+    def _drop_if_empty(self, key: str):
+        """Delete a pending hash whose counters are all zero"""
+        from redis.exceptions import WatchError
+        
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if any(int(value) for value in pipe.hvals(key)):
+                    # Counted again while flushing; the next flush takes it
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.srem(PENDING_SET_KEY, key)
+                pipe.execute()
+            except WatchError:
+                # Incremented concurrently, so it stays pending
+                pass
+    
+    def start_flush_thread(self, interval: float = FLUSH_INTERVAL_SECONDS):
+        """
+        Flush buffered counters to the database every interval seconds
+        
+        get_quota_tracker starts this for a tracker given a Redis client;
+        without it buffered counters would only expire from Redis.
+        
+        Args:
+            interval: Seconds between flushes
+        """
+        if self.redis_client is None or self._flush_thread is not None:
+            return
+        
+        self._flush_interval = interval
+        
+        def run():
+            while not self._flush_stop.wait(interval):
+                try:
+                    self.flush_pending()
+                except Exception as e:
+                    logger.error(f"Quota flush failed: {e}", exc_info=True)
+        
+        self._flush_stop.clear()
+        self._flush_thread = threading.Thread(target=run, name='quota-flush', daemon=True)
+        self._flush_thread.start()
+        logger.info(f"Quota flush thread started (interval: {interval}s)")
+    
+    def stop_flush_thread(self):
+        """Stop the flush thread and write out anything still pending"""
+        if self._flush_thread is None:
+            return
+        self._flush_stop.set()
+        self._flush_thread.join()
+        self._flush_thread = None
+        self.flush_pending()
+    
     def get_usage(
         self,
         user_id: Optional[str] = None,
-        period_type: str = 'daily'
+        period_type: str = 'daily',
+        include_endpoints: bool = False
     ) -> Optional[Dict]:
         """
         Get current usage for user
@@ -362,6 +1254,7 @@ class QuotaTracker:
         Args:
             user_id: User ID (optional, will try to get from context)
             period_type: 'daily' or 'monthly'
+            include_endpoints: Also load the per-endpoint breakdown
         
         Returns:
             Usage dictionary or None if not found
@@ -373,24 +1266,158 @@ class QuotaTracker:
         if user_id is None:
             return None
         
+        # Reuse a lookup already made during this request
+        cache = None if include_endpoints else self._request_cache()
+        if cache is not None and (user_id, period_type) in cache:
+            return cache[(user_id, period_type)]
+        
         try:
             period_start, period_end = self._get_period_bounds(period_type)
             
-            usage = self.db_session.query(QuotaUsage).filter(
-                QuotaUsage.user_id == user_id,
-                QuotaUsage.period_type == period_type,
-                QuotaUsage.period_start == period_start
-            ).first()
+            usage = self.read_session.execute(
+                _SELECT_USAGE, _usage_params(user_id, period_type, period_start)
+            ).scalars().first()
             
             if usage:
-                return usage.to_dict()
+                if include_endpoints:
+                    result = usage.to_dict(self.get_endpoint_usage(user_id, period_type))
+                else:
+                    result = usage.to_dict()
+            else:
+                result = None
             
-            return None
+            pending = self._get_pending(user_id, (period_type,)).get(period_type)
+            if pending:
+                if result is None:
+                    result = {
+                        'id': None,
+                        'user_id': user_id,
+                        'period_start': period_start.isoformat(),
+                        'period_end': period_end.isoformat(),
+                        'period_type': period_type,
+                        'total_requests': 0,
+                        'total_input_tokens': 0,
+                        'total_output_tokens': 0,
+                        'total_tokens': 0,
+                        'total_cost': 0.0
+                    }
+                    if include_endpoints:
+                        result['endpoint_usage'] = self.get_endpoint_usage(user_id, period_type)
+                result['total_requests'] += pending['requests']
+                result['total_input_tokens'] += pending['input_tokens']
+                result['total_output_tokens'] += pending['output_tokens']
+                result['total_tokens'] += pending['total_tokens']
+                result['total_cost'] += pending['cost_nanos'] / NANOS_PER_DOLLAR
+            
+            if cache is not None:
+                cache[(user_id, period_type)] = result
+            return result
             
         except Exception as e:
             logger.error(f"Error getting usage: {e}", exc_info=True)
             return None
     
+    def _get_usage_both(self, user_id: str) -> Dict[str, Optional['_UsageTotals']]:
+        """
+        Get total_tokens and total_cost for both daily and monthly periods
+        
+        Projected query for the quota check paths, so no ORM object is
+        built and Postgres can answer from idx_quota_user_period alone.
+        Both periods are fetched in a single round-trip. When counters are
+        buffered in Redis the totals come from there instead.
+        
+        Returns:
+            Dictionary mapping 'daily'/'monthly' to totals, or None if no usage yet
+        """
+        cache = self._request_cache()
+        result = {}
+        missing = []
+        for period_type in ('daily', 'monthly'):
+            if cache is not None:
+                # A full row already loaded by get_usage serves just as well
+                if (user_id, period_type) in cache:
+                    usage = cache[(user_id, period_type)]
+                    result[period_type] = _UsageTotals(usage['total_tokens'], usage['total_cost']) if usage else None
+                    continue
+                if (user_id, period_type, 'totals') in cache:
+                    result[period_type] = cache[(user_id, period_type, 'totals')]
+                    continue
+            missing.append(period_type)
+        
+        if missing:
+            found = self._get_buffered_totals(user_id)
+            if found is None:
+                found = self._get_usage_both_from_db(user_id, missing)
+            for period_type in missing:
+                result[period_type] = found.get(period_type)
+                if cache is not None:
+                    cache[(user_id, period_type, 'totals')] = result[period_type]
+        
+        return result
+    
+    def _get_usage_both_from_db(self, user_id: str, period_types: List[str]) -> Dict[str, '_UsageTotals']:
+        """Totals for period_types from the database plus unflushed counters"""
+        keys = [(period_type, self._get_period_bounds(period_type)[0]) for period_type in period_types]
+        rows = self.read_session.execute(_SELECT_USAGE_BOTH, {'p_user_id': user_id, 'p_keys': keys})
+        found = {
+            row.period_type: _UsageTotals(row.total_tokens, row.total_cost_nanos / NANOS_PER_DOLLAR)
+            for row in rows
+        }
+        for period_type, pending in self._get_pending(user_id, tuple(period_types)).items():
+            totals = found.get(period_type) or _UsageTotals(0, 0.0)
+            found[period_type] = _UsageTotals(
+                totals.total_tokens + pending['total_tokens'],
+                totals.total_cost + pending['cost_nanos'] / NANOS_PER_DOLLAR
+            )
+        return found
+    
+    def get_endpoint_usage(
+        self,
+        user_id: Optional[str] = None,
+        period_type: str = 'daily'
+    ) -> Dict[str, Dict]:
+        """
+        Get per-endpoint usage for user
+        
+        Args:
+            user_id: User ID (optional, will try to get from context)
+            period_type: 'daily' or 'monthly'
+        
+        Returns:
+            Dictionary mapping endpoint name to its usage
+        """
+        if user_id is None:
+            user_id = self._get_user_id()
+        
+        if user_id is None:
+            return {}
+        
+        period_start, _ = self._get_period_bounds(period_type)
+        rows = self.read_session.execute(
+            select(QuotaEndpointUsage).where(
+                QuotaEndpointUsage.user_id == user_id,
+                QuotaEndpointUsage.period_type == period_type,
+                QuotaEndpointUsage.period_start == period_start
+            )
+        ).scalars()
+        usage = {row.endpoint: row.to_dict() for row in rows}
+        
+        pending = self._get_pending(user_id, (period_type,)).get(period_type)
+        if pending:
+            for endpoint, counters in pending['endpoints'].items():
+                totals = usage.setdefault(endpoint, {
+                    'requests': 0,
+                    'input_tokens': 0,
+                    'output_tokens': 0,
+                    'total_tokens': 0,
+                    'cost': 0.0
+                })
+                for name in ('requests', 'input_tokens', 'output_tokens', 'total_tokens'):
+                    totals[name] += counters[name]
+                totals['cost'] += counters['cost_nanos'] / NANOS_PER_DOLLAR
+        
+        return usage
+    
     def get_all_usage(self, user_id: Optional[str] = None) -> Dict:
         """
         Get both daily and monthly usage for user
@@ -406,6 +1433,28 @@ class QuotaTracker:
             'monthly': self.get_usage(user_id, 'monthly')
         }
     
+    def stream_all_usage(self, period_type: str = 'daily', batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Stream usage for every user for admin reports
+        
+        Rows are fetched batch_size at a time, so memory stays flat however
+        many users there are.
+        
+        Args:
+            period_type: 'daily' or 'monthly'
+            batch_size: Rows fetched per round-trip
+        
+        Yields:
+            Usage dictionaries
+        """
+        stmt = (
+            select(QuotaUsage)
+            .where(QuotaUsage.period_type == period_type)
+            .execution_options(yield_per=batch_size)
+        )
+        for usage in self.read_session.execute(stmt).scalars():
+            yield usage.to_dict()
+    
     def _get_user_tier(self) -> str:
         """
         Get user's quota tier from request context
@@ -449,58 +1498,37 @@ class QuotaTracker:
         limits = QUOTA_LIMITS.get(tier, QUOTA_LIMITS['limited'])
         
         # Get current usage
-        daily_usage = self.get_usage(user_id, 'daily')
-        monthly_usage = self.get_usage(user_id, 'monthly')
+        usage = self._get_usage_both(user_id)
+        daily_usage = usage['daily']
+        monthly_usage = usage['monthly']
         
         warnings = []
         
-        # Check daily quota
-        if daily_usage:
-            daily_tokens = daily_usage['total_tokens']
+        # Check daily quota (integer threshold compare; percentage only when warning)
+        if daily_usage and daily_usage.total_tokens >= limits.daily_warn:
+            daily_tokens = daily_usage.total_tokens
             daily_percentage = (daily_tokens / limits.daily_tokens) * 100
-            
-            if daily_percentage >= 90:
-                warnings.append({
-                    'level': 'critical',
-                    'period': 'daily',
-                    'usage': daily_tokens,
-                    'limit': limits.daily_tokens,
-                    'percentage': round(daily_percentage, 2),
-                    'message': f'Daily quota at {daily_percentage:.1f}% ({daily_tokens}/{limits.daily_tokens} tokens)'
-                })
-            elif daily_percentage >= 75:
-                warnings.append({
-                    'level': 'warning',
-                    'period': 'daily',
-                    'usage': daily_tokens,
-                    'limit': limits.daily_tokens,
-                    'percentage': round(daily_percentage, 2),
-                    'message': f'Daily quota at {daily_percentage:.1f}% ({daily_tokens}/{limits.daily_tokens} tokens)'
-                })
+            warnings.append({
+                'level': 'critical' if daily_tokens >= limits.daily_crit else 'warning',
+                'period': 'daily',
+                'usage': daily_tokens,
+                'limit': limits.daily_tokens,
+                'percentage': round(daily_percentage, 2),
+                'message': f'Daily quota at {daily_percentage:.1f}% ({daily_tokens}/{limits.daily_tokens} tokens)'
+            })
         
         # Check monthly quota
-        if monthly_usage:
-            monthly_tokens = monthly_usage['total_tokens']
+        if monthly_usage and monthly_usage.total_tokens >= limits.monthly_warn:
+            monthly_tokens = monthly_usage.total_tokens
             monthly_percentage = (monthly_tokens / limits.monthly_tokens) * 100
-            
-            if monthly_percentage >= 90:
-                warnings.append({
-                    'level': 'critical',
-                    'period': 'monthly',
-                    'usage': monthly_tokens,
-                    'limit': limits.monthly_tokens,
-                    'percentage': round(monthly_percentage, 2),
-                    'message': f'Monthly quota at {monthly_percentage:.1f}% ({monthly_tokens}/{limits.monthly_tokens} tokens)'
-                })
-            elif monthly_percentage >= 75:
-                warnings.append({
-                    'level': 'warning',
-                    'period': 'monthly',
-                    'usage': monthly_tokens,
-                    'limit': limits.monthly_tokens,
-                    'percentage': round(monthly_percentage, 2),
-                    'message': f'Monthly quota at {monthly_percentage:.1f}% ({monthly_tokens}/{limits.monthly_tokens} tokens)'
-                })
+            warnings.append({
+                'level': 'critical' if monthly_tokens >= limits.monthly_crit else 'warning',
+                'period': 'monthly',
+                'usage': monthly_tokens,
+                'limit': limits.monthly_tokens,
+                'percentage': round(monthly_percentage, 2),
+                'message': f'Monthly quota at {monthly_percentage:.1f}% ({monthly_tokens}/{limits.monthly_tokens} tokens)'
+            })
         
         if warnings:
             logger.warning(
@@ -518,6 +1546,56 @@ class QuotaTracker:
             'warnings': warnings
         }
     
+    def _check_limits(
+        self,
+        user_id: str,
+        estimated_tokens: int,
+        limits: QuotaLimits
+    ) -> Tuple[int, int, bool, bool]:
+        """
+        Compare usage plus estimated tokens against the tier limits
+        
+        Usage already loaded during this request, or read from Redis when
+        counters are buffered there, is compared in Python; otherwise one
+        query returns both totals and the over-limit flags.
+        
+        Returns:
+            Tuple of (daily_tokens, monthly_tokens, daily_over, monthly_over)
+        """
+        cache = self._request_cache()
+        if self.redis_client is not None or cache is not None and all(
+            (user_id, period_type) in cache or (user_id, period_type, 'totals') in cache
+            for period_type in ('daily', 'monthly')
+        ):
+            usage = self._get_usage_both(user_id)
+            daily_tokens = usage['daily'].total_tokens if usage['daily'] else 0
+            monthly_tokens = usage['monthly'].total_tokens if usage['monthly'] else 0
+            return (
+                daily_tokens,
+                monthly_tokens,
+                daily_tokens + estimated_tokens > limits.daily_tokens,
+                monthly_tokens + estimated_tokens > limits.monthly_tokens
+            )
+        
+        pending = self._get_pending(user_id, ('daily', 'monthly'))
+        daily_pending = pending['daily']['total_tokens'] if 'daily' in pending else 0
+        monthly_pending = pending['monthly']['total_tokens'] if 'monthly' in pending else 0
+        
+        row = self.read_session.execute(_ENFORCEMENT_DECISION, {
+            'p_user_id': user_id,
+            'p_daily_start': self._get_period_bounds('daily')[0],
+            'p_monthly_start': self._get_period_bounds('monthly')[0],
+            'p_daily_budget': limits.daily_tokens - estimated_tokens - daily_pending,
+            'p_monthly_budget': limits.monthly_tokens - estimated_tokens - monthly_pending
+        }).one()
+        
+        return (
+            row.daily_tokens + daily_pending,
+            row.monthly_tokens + monthly_pending,
+            bool(row.daily_over),
+            bool(row.monthly_over)
+        )
+    
     def check_quota_enforcement(
         self,
         estimated_tokens: int,
@@ -549,15 +1627,22 @@ class QuotaTracker:
         
         limits = QUOTA_LIMITS.get(tier, QUOTA_LIMITS['limited'])
         
-        # Get current usage
-        daily_usage = self.get_usage(user_id, 'daily')
-        monthly_usage = self.get_usage(user_id, 'monthly')
+        # Users well below both limits can be allowed from recent totals
+        # without a query; a few seconds of staleness cannot push them over
+        recent = self._recent_totals(user_id)
+        if recent is not None:
+            daily_tokens, monthly_tokens = recent
+            if (daily_tokens + estimated_tokens < limits.daily_tokens * ENFORCEMENT_FAST_PATH_RATIO and
+                    monthly_tokens + estimated_tokens < limits.monthly_tokens * ENFORCEMENT_FAST_PATH_RATIO):
+                return True, None
         
-        daily_tokens = daily_usage['total_tokens'] if daily_usage else 0
-        monthly_tokens = monthly_usage['total_tokens'] if monthly_usage else 0
+        # Get current usage and whether the request would exceed limits
+        daily_tokens, monthly_tokens, daily_over, monthly_over = self._check_limits(
+            user_id, estimated_tokens, limits
+        )
+        self._remember_totals(user_id, daily_tokens, monthly_tokens)
         
-        # Check if adding estimated tokens would exceed limits
-        if daily_tokens + estimated_tokens > limits.daily_tokens:
+        if daily_over:
             # Calculate reset time (start of next day)
             from datetime import datetime, timedelta
             now = datetime.utcnow()
@@ -584,7 +1669,7 @@ class QuotaTracker:
                 'reset_in_seconds': reset_seconds
             }
         
-        if monthly_tokens + estimated_tokens > limits.monthly_tokens:
+        if monthly_over:
             # Calculate reset time (start of next month)
             from datetime import datetime
             now = datetime.utcnow()
@@ -619,33 +1704,161 @@ class QuotaTracker:
 
 # Global quota tracker instance
 _quota_tracker_instance: Optional[QuotaTracker] = None
+_quota_tracker_lock = threading.Lock()
+
 
+def _scoped(session: Union[DBSession, scoped_session]) -> scoped_session:
+    """Wrap a plain Session's engine in a scoped_session"""
+    if isinstance(session, scoped_session):
+        return session
+    return scoped_session(sessionmaker(bind=session.get_bind()))
 
-def get_quota_tracker(db_session: DBSession) -> QuotaTracker:
+
+def get_quota_tracker(
+    db_session: Union[DBSession, scoped_session],
+    redis_client=None,
+    read_session: Optional[Union[DBSession, scoped_session]] = None
+) -> QuotaTracker:
     """
     Get or create global quota tracker instance
     
+    The tracker never keeps the caller's session: a plain Session is only
+    used for its engine, and the tracker works through a scoped_session so
+    each thread (and, with init_quota_request_cache, each request) gets
+    its own session instead of sharing the first caller's.
+    
     Args:
-        db_session: SQLAlchemy database session
+        db_session: SQLAlchemy session or scoped_session for the primary
+        redis_client: Redis client for buffered counters (optional);
+            when given, the flush thread is started and stopped at exit
+        read_session: Session or scoped_session for a read replica (optional)
     
     Returns:
         QuotaTracker instance
     """
     global _quota_tracker_instance
     if _quota_tracker_instance is None:
-        _quota_tracker_instance = QuotaTracker(db_session)
+        with _quota_tracker_lock:
+            if _quota_tracker_instance is None:
+                tracker = QuotaTracker(
+                    _scoped(db_session),
+                    redis_client=redis_client,
+                    read_session=_scoped(read_session) if read_session is not None else None
+                )
+                if redis_client is not None:
+                    # Buffered counters reach the database only through this thread
+                    tracker.start_flush_thread()
+                    atexit.register(tracker.stop_flush_thread)
+                _quota_tracker_instance = tracker
     return _quota_tracker_instance
 
 
+def _restart_flush_thread_after_fork():
+    """Threads don't survive fork(); give a preloaded worker its own flusher"""
+    tracker = _quota_tracker_instance
+    if tracker is None or tracker._flush_thread is None:
+        return
+    tracker._flush_thread = None
+    tracker._flush_stop = threading.Event()
+    # The parent's flush session holds the parent's connection
+    tracker._flush_writer = None
+    tracker.start_flush_thread(tracker._flush_interval)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_flush_thread_after_fork)
+
+
+def _clear_request_cache(exc=None):
+    """Drop the per-request usage cache and release the tracker's sessions"""
+    g.pop('_quota_cache', None)
+    g.pop('_period_bounds', None)
+    
+    tracker = _quota_tracker_instance
+    if tracker is None:
+        return
+    sessions = [tracker.db_session]
+    if tracker.read_session is not tracker.db_session:
+        sessions.append(tracker.read_session)
+    for session in sessions:
+        if isinstance(session, scoped_session):
+            session.remove()
+
+
+def init_quota_request_cache(app):
+    """
+    Register teardown that clears the per-request usage cache and
+    returns the global tracker's sessions to the pool
+    
+    Without it each request thread keeps its scoped session, pooled
+    connection and open transaction, and replica reads keep serving the
+    stale identity map. Safe to call more than once per app.
+    
+    Args:
+        app: Flask application
+    """
+    if app.extensions.get('quota_request_cache'):
+        return
+    app.extensions['quota_request_cache'] = True
+    app.teardown_appcontext(_clear_request_cache)
+
+
+def ensure_quota_partitions(engine, months_ahead: int = 2):
+    """
+    Create monthly quota_usage partitions on Postgres
+    
+    Creates partitions for the current month and the next months_ahead
+    months, plus a DEFAULT partition as a safety net. Run monthly (e.g.
+    from cron) so the partition for a month exists before rows arrive;
+    old months can then be detached and archived without a bulk DELETE.
+    No-op on other databases, and on a quota_usage table created before
+    partitioning until migrations/005_partition_quota_usage.py has run.
+    
+    Args:
+        engine: SQLAlchemy engine
+        months_ahead: Number of future months to pre-create
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+    
+    with engine.connect() as conn:
+        partitioned = conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = 'quota_usage' AND pg_table_is_visible(c.oid)"
+        )).first() is not None
+    if not partitioned:
+        # create_all() leaves an existing unpartitioned table alone
+        logger.error("quota_usage is not partitioned; run migrations/005_partition_quota_usage.py")
+        return
+    
+    month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    
+    with engine.begin() as conn:
+        for _ in range(months_ahead + 1):
+            next_month = QuotaTracker._period_end('monthly', month)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS quota_usage_{month:%Y_%m} PARTITION OF quota_usage "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+            ))
+            month = next_month
+        conn.execute(text("CREATE TABLE IF NOT EXISTS quota_usage_default PARTITION OF quota_usage DEFAULT"))
+    
+    logger.info(f"Quota partitions ensured through {month:%Y-%m}")
+
+
 def init_quota_database(database_url: str = 'sqlite:///quota.db'):
     """
     Initialize quota database tables
     
+    On Postgres quota_usage is range-partitioned by month and the
+    upcoming partitions are created.
+    
     Args:
         database_url: Database connection string
     """
     engine = create_engine(database_url)
     Base.metadata.create_all(engine)
+    ensure_quota_partitions(engine)
     logger.info(f"Quota database initialized: {database_url}")
     return engine
 
@@ -3,18 +3,32 @@ Google Gemini API Quota Tracker
 Tracks API usage against quotas with fallback mechanisms and request prioritization
 """
 
+import hashlib
+import heapq
+import logging
+import math
+import pickle
 import time
-from typing import Dict, Optional, List, Tuple
+from typing import Any, Callable, Dict, Optional, List, Tuple
 from dataclasses import dataclass, field
-from collections import deque
+from collections import OrderedDict
 from enum import Enum
 from functools import wraps
-from flask import request, jsonify
 import threading
 from structured_logging import get_logger
 
 logger = get_logger(__name__)
 
+# Seconds between sweeps of expired fallback responses
+FALLBACK_SWEEP_INTERVAL = 60
+
+# Clock for windows and cache ages: monotonic, so wall-clock (NTP)
+# adjustments cannot expire or resurrect entries
+_now = time.monotonic
+
+# Usage is kept in a ring of per-minute buckets covering the day window
+DAY_BUCKET_COUNT = 1440
+
 
 class RequestPriority(Enum):
     """Request priority levels"""
@@ -26,14 +40,14 @@ class RequestPriority(Enum):
 
 @dataclass
 class QuotaConfig:
-    """Configuration for Gemini API quotas"""
+    """Configuration for Gemini API quotas (a limit of None is not enforced)"""
     # Google Gemini API free tier limits
-    requests_per_minute: int = 15  # RPM limit
-    requests_per_day: int = 1500   # RPD limit
+    requests_per_minute: Optional[int] = 15  # RPM limit
+    requests_per_day: Optional[int] = 1500   # RPD limit
     
     # Token limits (Gemini 2.0 Flash)
-    tokens_per_minute: int = 1_000_000  # TPM
-    tokens_per_day: int = 50_000_000    # TPD
+    tokens_per_minute: Optional[int] = 1_000_000  # TPM
+    tokens_per_day: Optional[int] = 50_000_000    # TPD
     
     # Safety margins (use 80% of quota to prevent hitting limits)
     rpm_safety_margin: float = 0.8
@@ -44,26 +58,87 @@ class QuotaConfig:
     # Fallback configuration
     enable_fallback: bool = True
     fallback_cache_ttl: int = 3600  # 1 hour cache for fallback responses
+    fallback_cache_max_entries: int = 10_000  # least recently used evicted beyond this
     
     # Queue configuration
     max_queue_size: int = 100
     queue_timeout: int = 30  # seconds
     
-    def get_safe_rpm(self) -> int:
+    # Limits with safety margins applied, computed once
+    _safe_rpm: Optional[int] = field(init=False, repr=False)
+    _safe_rpd: Optional[int] = field(init=False, repr=False)
+    _safe_tpm: Optional[int] = field(init=False, repr=False)
+    _safe_tpd: Optional[int] = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        self._safe_rpm = _apply_margin(self.requests_per_minute, self.rpm_safety_margin)
+        self._safe_rpd = _apply_margin(self.requests_per_day, self.rpd_safety_margin)
+        self._safe_tpm = _apply_margin(self.tokens_per_minute, self.tpm_safety_margin)
+        self._safe_tpd = _apply_margin(self.tokens_per_day, self.tpd_safety_margin)
+    
+    def get_safe_rpm(self) -> Optional[int]:
         """Get safe RPM limit with margin"""
-        return int(self.requests_per_minute * self.rpm_safety_margin)
+        return self._safe_rpm
     
-    def get_safe_rpd(self) -> int:
+    def get_safe_rpd(self) -> Optional[int]:
         """Get safe RPD limit with margin"""
-        return int(self.requests_per_day * self.rpd_safety_margin)
+        return self._safe_rpd
     
-    def get_safe_tpm(self) -> int:
+    def get_safe_tpm(self) -> Optional[int]:
         """Get safe TPM limit with margin"""
-        return int(self.tokens_per_minute * self.tpm_safety_margin)
+        return self._safe_tpm
     
-    def get_safe_tpd(self) -> int:
+    def get_safe_tpd(self) -> Optional[int]:
         """Get safe TPD limit with margin"""
-        return int(self.tokens_per_day * self.tpd_safety_margin)
+        return self._safe_tpd
+
+
+def _apply_margin(limit: Optional[int], margin: float) -> Optional[int]:
+    """Limit scaled by its safety margin (None stays unlimited)"""
+    return None if limit is None else int(limit * margin)
+
+
+def _fast_path_bound(limit: Optional[int]) -> float:
+    """Half of a limit for the can_make_request fast path (unbounded when disabled)"""
+    return float('inf') if limit is None else limit >> 1
+
+
+def _usage_stats(current: int, limit: Optional[int]) -> Dict:
+    """Current usage against a limit for get_stats (no percentage when unlimited)"""
+    return {
+        'current': current,
+        'limit': limit,
+        'percentage': round((current / limit) * 100, 2) if limit else None
+    }
+
+
+def _request_limit_check(name: str, index: int, limit: int) -> Callable[[Tuple[int, ...], int], Optional[str]]:
+    """Check denying once the request count at usage[index] reaches limit"""
+    def check(usage: Tuple[int, ...], estimated_tokens: int) -> Optional[str]:
+        count = usage[index]
+        if count < limit:
+            return None
+        logger.warning(f"{name} limit reached", extra={
+            'current': count,
+            'limit': limit
+        })
+        return f"{name} limit reached ({count}/{limit})"
+    return check
+
+
+def _token_limit_check(name: str, index: int, limit: int) -> Callable[[Tuple[int, ...], int], Optional[str]]:
+    """Check denying when the token count at usage[index] plus the estimate exceeds limit"""
+    def check(usage: Tuple[int, ...], estimated_tokens: int) -> Optional[str]:
+        count = usage[index]
+        if count + estimated_tokens <= limit:
+            return None
+        logger.warning(f"{name} limit reached", extra={
+            'current': count,
+            'estimated': estimated_tokens,
+            'limit': limit
+        })
+        return f"{name} limit reached ({count}/{limit})"
+    return check
 
 
 @dataclass
@@ -85,24 +160,28 @@ class QuotaTracker:
     def __init__(self, config: Optional[QuotaConfig] = None):
         self.config = config or QuotaConfig()
         
-        # Request tracking (sliding window)
-        self.requests_minute: deque = deque(maxlen=200)  # Last minute
-        self.requests_day: deque = deque(maxlen=10000)   # Last 24 hours
+        # [request_count, token_sum] per clock minute, indexed by minute
+        # modulo DAY_BUCKET_COUNT, with _day_head_min the current minute.
+        # The day window is the sum of all buckets; the minute window is
+        # the sliding-window estimate from the current and previous bucket.
+        self._day_buckets: List[List[int]] = [[0, 0] for _ in range(DAY_BUCKET_COUNT)]
+        self._day_head_min = int(_now() // 60)
         
-        # Token tracking
-        self.tokens_minute: deque = deque(maxlen=200)
-        self.tokens_day: deque = deque(maxlen=10000)
+        # Running day totals
+        self._rpd_sum = 0
+        self._tpd_sum = 0
         
-        # Priority queue (separate queue per priority level)
-        self.queues: Dict[RequestPriority, deque] = {
-            RequestPriority.CRITICAL: deque(),
-            RequestPriority.HIGH: deque(),
-            RequestPriority.MEDIUM: deque(),
-            RequestPriority.LOW: deque(),
-        }
+        # Priority queue: heap of (priority value, sequence, request), so
+        # requests pop highest priority first and FIFO within a priority
+        self._pq: List[Tuple[int, int, QuotaRequest]] = []
+        self._pq_seq = 0
+        # Queued requests per priority, indexed by priority value - 1
+        self._queue_counts: List[int] = [0] * len(RequestPriority)
         
-        # Fallback cache
-        self.fallback_cache: Dict[str, Tuple[any, float]] = {}  # key -> (response, timestamp)
+        # Fallback cache, least recently used first
+        self.fallback_cache: 'OrderedDict[str, Tuple[any, float]]' = OrderedDict()  # key -> (response, timestamp)
+        self.fallback_lock = threading.Lock()
+        self._next_fallback_sweep = _now() + FALLBACK_SWEEP_INTERVAL
         
         # Statistics
         self.total_requests = 0
@@ -110,8 +189,24 @@ class QuotaTracker:
         self.fallback_used_count = 0
         self.queued_requests = 0
         
-        # Thread safety
+        # Only the configured limits are checked; half limits for the fast path
+        self._limit_checks = self._build_limit_checks()
+        self._fast_path_bounds = tuple(
+            _fast_path_bound(limit) for limit in (
+                self.config._safe_rpm, self.config._safe_rpd, self.config._safe_tpm, self.config._safe_tpd
+            )
+        )
+        
+        # Config values read on every call, bound once
+        self._max_q = self.config.max_queue_size
+        self._fallback_ttl = self.config.fallback_cache_ttl
+        self._fallback_enabled = self.config.enable_fallback
+        self._fallback_max_entries = self.config.fallback_cache_max_entries
+        
+        # Thread safety: lock guards the usage windows, queue_lock the
+        # priority queues, so queueing never waits on quota bookkeeping
         self.lock = threading.Lock()
+        self.queue_lock = threading.Lock()
         
         logger.info("Quota tracker initialized", extra={
             'rpm_limit': self.config.requests_per_minute,
@@ -120,111 +215,172 @@ class QuotaTracker:
             'safe_rpd': self.config.get_safe_rpd()
         })
     
-    def _clean_old_records(self):
-        """Remove records outside sliding windows"""
-        current_time = time.time()
+    def _clean_old_records(self, current_time: Optional[float] = None):
+        """Move the windows up to current_time (call with lock held)"""
+        if current_time is None:
+            current_time = _now()
+        self._advance_day_window(int(current_time // 60))
+    
+    def _minute_usage(self, current_time: float) -> Tuple[int, int]:
+        """
+        Sliding-window estimate of (requests, tokens) over the last 60 seconds
+        
+        The previous minute's counts are weighted by the share of it still
+        inside the window and added to the current minute's; rounded up so
+        the estimate never undercounts the previous minute's share.
+        """
+        head = self._day_head_min
+        current = self._day_buckets[head % DAY_BUCKET_COUNT]
+        previous = self._day_buckets[(head - 1) % DAY_BUCKET_COUNT]
+        weight = max(0.0, 1.0 - (current_time - head * 60) / 60)
+        return (
+            current[0] + math.ceil(previous[0] * weight),
+            current[1] + math.ceil(previous[1] * weight)
+        )
+    
+    def _usage(self, current_time: float) -> Tuple[int, int, int, int]:
+        """Current (rpm, rpd, tpm, tpd); the windows must be up to date"""
+        rpm, tpm = self._minute_usage(current_time)
+        return rpm, self._rpd_sum, tpm, self._tpd_sum
+    
+    def _advance_day_window(self, current_minute: int):
+        """Zero the day buckets of minutes that left the window since the last call"""
+        elapsed = current_minute - self._day_head_min
+        if elapsed <= 0:
+            return
         
-        # Clean minute window (60 seconds)
-        minute_ago = current_time - 60
-        while self.requests_minute and self.requests_minute[0] < minute_ago:
-            self.requests_minute.popleft()
-        while self.tokens_minute and self.tokens_minute[0][0] < minute_ago:
-            self.tokens_minute.popleft()
+        if elapsed >= DAY_BUCKET_COUNT:
+            for bucket in self._day_buckets:
+                bucket[0] = bucket[1] = 0
+            self._rpd_sum = self._tpd_sum = 0
+        else:
+            for minute in range(self._day_head_min + 1, current_minute + 1):
+                bucket = self._day_buckets[minute % DAY_BUCKET_COUNT]
+                self._rpd_sum -= bucket[0]
+                self._tpd_sum -= bucket[1]
+                bucket[0] = bucket[1] = 0
+        self._day_head_min = current_minute
+    
+    def _build_limit_checks(self) -> Tuple[Callable[[Tuple[int, ...], int], Optional[str]], ...]:
+        """
+        Build the checks for the enabled limits, in RPM, RPD, TPM, TPD order
         
-        # Clean day window (24 hours)
-        day_ago = current_time - 86400
-        while self.requests_day and self.requests_day[0] < day_ago:
-            self.requests_day.popleft()
-        while self.tokens_day and self.tokens_day[0][0] < day_ago:
-            self.tokens_day.popleft()
+        Each check takes the usage tuple from _usage() and the estimated
+        tokens and returns the denial reason, or None when the request
+        fits. Disabled limits get no check, so can_make_request does no
+        work for them.
+        """
+        config = self.config
+        checks = []
+        if config._safe_rpm is not None:
+            checks.append(_request_limit_check('RPM', 0, config._safe_rpm))
+        if config._safe_rpd is not None:
+            checks.append(_request_limit_check('RPD', 1, config._safe_rpd))
+        if config._safe_tpm is not None:
+            checks.append(_token_limit_check('TPM', 2, config._safe_tpm))
+        if config._safe_tpd is not None:
+            checks.append(_token_limit_check('TPD', 3, config._safe_tpd))
+        return tuple(checks)
     
     def can_make_request(self, estimated_tokens: int = 1000) -> Tuple[bool, Optional[str]]:
         """
         Check if request can be made without exceeding quota
+        
+        The lock is only taken when the minute rolls over; otherwise the
+        counters are read directly and may lag a concurrent
+        record_request by one call.
+        
         Returns: (can_proceed, reason_if_denied)
         """
-        with self.lock:
-            self._clean_old_records()
-            
-            # Check RPM
-            rpm_count = len(self.requests_minute)
-            if rpm_count >= self.config.get_safe_rpm():
-                logger.warning("RPM limit reached", extra={
-                    'current': rpm_count,
-                    'limit': self.config.get_safe_rpm()
-                })
-                return False, f"RPM limit reached ({rpm_count}/{self.config.get_safe_rpm()})"
-            
-            # Check RPD
-            rpd_count = len(self.requests_day)
-            if rpd_count >= self.config.get_safe_rpd():
-                logger.warning("RPD limit reached", extra={
-                    'current': rpd_count,
-                    'limit': self.config.get_safe_rpd()
-                })
-                return False, f"RPD limit reached ({rpd_count}/{self.config.get_safe_rpd()})"
-            
-            # Check TPM
-            tpm_count = sum(tokens for _, tokens in self.tokens_minute)
-            if tpm_count + estimated_tokens > self.config.get_safe_tpm():
-                logger.warning("TPM limit reached", extra={
-                    'current': tpm_count,
-                    'estimated': estimated_tokens,
-                    'limit': self.config.get_safe_tpm()
-                })
-                return False, f"TPM limit reached ({tpm_count}/{self.config.get_safe_tpm()})"
-            
-            # Check TPD
-            tpd_count = sum(tokens for _, tokens in self.tokens_day)
-            if tpd_count + estimated_tokens > self.config.get_safe_tpd():
-                logger.warning("TPD limit reached", extra={
-                    'current': tpd_count,
-                    'estimated': estimated_tokens,
-                    'limit': self.config.get_safe_tpd()
-                })
-                return False, f"TPD limit reached ({tpd_count}/{self.config.get_safe_tpd()})"
-            
+        current_time = _now()
+        if int(current_time // 60) != self._day_head_min:
+            with self.lock:
+                self._clean_old_records(current_time)
+        
+        usage = self._usage(current_time)
+        rpm, rpd, tpm, tpd = usage
+        
+        # Well under every limit: the margin absorbs concurrent record_request calls
+        half_rpm, half_rpd, half_tpm, half_tpd = self._fast_path_bounds
+        if (rpm < half_rpm and rpd < half_rpd and
+                tpm + estimated_tokens < half_tpm and tpd + estimated_tokens < half_tpd):
             return True, None
+        
+        for check in self._limit_checks:
+            reason = check(usage, estimated_tokens)
+            if reason is not None:
+                return False, reason
+        
+        return True, None
     
     def record_request(self, actual_tokens: int):
         """Record a successful API request"""
         with self.lock:
-            current_time = time.time()
-            self.requests_minute.append(current_time)
-            self.requests_day.append(current_time)
-            self.tokens_minute.append((current_time, actual_tokens))
-            self.tokens_day.append((current_time, actual_tokens))
+            current_time = _now()
+            current_minute = int(current_time // 60)
+            if current_minute != self._day_head_min:
+                self._advance_day_window(current_minute)
+            
+            bucket = self._day_buckets[current_minute % DAY_BUCKET_COUNT]
+            bucket[0] += 1
+            bucket[1] += actual_tokens
+            self._rpd_sum += 1
+            self._tpd_sum += actual_tokens
             self.total_requests += 1
             
-            logger.debug("Request recorded", extra={
-                'tokens': actual_tokens,
-                'rpm': len(self.requests_minute),
-                'rpd': len(self.requests_day)
-            })
+            if logger.isEnabledFor(logging.DEBUG):
+                rpm, _ = self._minute_usage(current_time)
+                logger.debug("Request recorded", extra={
+                    'tokens': actual_tokens,
+                    'rpm': rpm,
+                    'rpd': self._rpd_sum
+                })
     
     def get_fallback_response(self, cache_key: str) -> Optional[any]:
         """Get cached response as fallback"""
-        if not self.config.enable_fallback:
-            return None
-        
-        if cache_key not in self.fallback_cache:
+        if not self._fallback_enabled:
             return None
         
-        response, timestamp = self.fallback_cache[cache_key]
-        
-        # Check if cache is still valid
-        if time.time() - timestamp > self.config.fallback_cache_ttl:
-            del self.fallback_cache[cache_key]
-            return None
+        with self.fallback_lock:
+            entry = self.fallback_cache.get(cache_key)
+            if entry is None:
+                return None
+            
+            response, timestamp = entry
+            
+            # Check if cache is still valid
+            if _now() - timestamp > self._fallback_ttl:
+                self.fallback_cache.pop(cache_key, None)
+                return None
+            
+            self.fallback_cache.move_to_end(cache_key)
+            self.fallback_used_count += 1
         
-        self.fallback_used_count += 1
         logger.info("Using fallback response", extra={'cache_key': cache_key})
         return response
     
     def cache_response(self, cache_key: str, response: any):
         """Cache response for potential fallback use"""
-        if self.config.enable_fallback:
-            self.fallback_cache[cache_key] = (response, time.time())
+        if not self._fallback_enabled:
+            return
+        
+        current_time = _now()
+        with self.fallback_lock:
+            self.fallback_cache[cache_key] = (response, current_time)
+            self.fallback_cache.move_to_end(cache_key)
+            while len(self.fallback_cache) > self._fallback_max_entries:
+                self.fallback_cache.popitem(last=False)
+            
+            if current_time >= self._next_fallback_sweep:
+                self._sweep_fallback(current_time)
+    
+    def _sweep_fallback(self, current_time: float):
+        """Drop expired fallback responses (call with fallback_lock held)"""
+        cutoff = current_time - self._fallback_ttl
+        expired = [key for key, (_, timestamp) in self.fallback_cache.items() if timestamp < cutoff]
+        for key in expired:
+            del self.fallback_cache[key]
+        self._next_fallback_sweep = current_time + FALLBACK_SWEEP_INTERVAL
     
     def queue_request(self, priority: RequestPriority, endpoint: str, 
                      estimated_tokens: int, user_id: Optional[str] = None) -> bool:
@@ -232,13 +388,13 @@ class QuotaTracker:
         Queue a request when quota is exceeded
         Returns: True if queued successfully, False if queue is full
         """
-        with self.lock:
+        with self.queue_lock:
             # Check total queue size
-            total_queued = sum(len(q) for q in self.queues.values())
-            if total_queued >= self.config.max_queue_size:
+            total_queued = len(self._pq)
+            if total_queued >= self._max_q:
                 logger.warning("Request queue full", extra={
                     'queue_size': total_queued,
-                    'max_size': self.config.max_queue_size
+                    'max_size': self._max_q
                 })
                 return False
             
@@ -251,70 +407,57 @@ class QuotaTracker:
                 user_id=user_id,
                 callback=None
             )
-            self.queues[priority].append(req)
+            slot = priority.value
+            heapq.heappush(self._pq, (slot, self._pq_seq, req))
+            self._pq_seq += 1
+            self._queue_counts[slot - 1] += 1
             self.queued_requests += 1
             
             logger.info("Request queued", extra={
                 'priority': priority.name,
                 'endpoint': endpoint,
-                'queue_size': len(self.queues[priority])
+                'queue_size': self._queue_counts[slot - 1]
             })
             return True
     
     def get_next_request(self) -> Optional[QuotaRequest]:
         """Get next request from queue (highest priority first)"""
-        with self.lock:
-            for priority in [RequestPriority.CRITICAL, RequestPriority.HIGH, 
-                           RequestPriority.MEDIUM, RequestPriority.LOW]:
-                if self.queues[priority]:
-                    return self.queues[priority].popleft()
-            return None
+        with self.queue_lock:
+            if not self._pq:
+                return None
+            slot, _, req = heapq.heappop(self._pq)
+            self._queue_counts[slot - 1] -= 1
+            return req
     
     def get_stats(self) -> Dict:
         """Get current quota usage statistics"""
         with self.lock:
-            self._clean_old_records()
+            current_time = _now()
+            self._clean_old_records(current_time)
+            rpm_count, rpd_count, tpm_count, tpd_count = self._usage(current_time)
             
-            rpm_count = len(self.requests_minute)
-            rpd_count = len(self.requests_day)
-            tpm_count = sum(tokens for _, tokens in self.tokens_minute)
-            tpd_count = sum(tokens for _, tokens in self.tokens_day)
+            config = self.config
+            safe_rpm, safe_rpd, safe_tpm, safe_tpd = config._safe_rpm, config._safe_rpd, config._safe_tpm, config._safe_tpd
             
             return {
                 'requests': {
-                    'per_minute': {
-                        'current': rpm_count,
-                        'limit': self.config.get_safe_rpm(),
-                        'percentage': round((rpm_count / self.config.get_safe_rpm()) * 100, 2)
-                    },
-                    'per_day': {
-                        'current': rpd_count,
-                        'limit': self.config.get_safe_rpd(),
-                        'percentage': round((rpd_count / self.config.get_safe_rpd()) * 100, 2)
-                    }
+                    'per_minute': _usage_stats(rpm_count, safe_rpm),
+                    'per_day': _usage_stats(rpd_count, safe_rpd)
                 },
                 'tokens': {
-                    'per_minute': {
-                        'current': tpm_count,
-                        'limit': self.config.get_safe_tpm(),
-                        'percentage': round((tpm_count / self.config.get_safe_tpm()) * 100, 2)
-                    },
-                    'per_day': {
-                        'current': tpd_count,
-                        'limit': self.config.get_safe_tpd(),
-                        'percentage': round((tpd_count / self.config.get_safe_tpd()) * 100, 2)
-                    }
+                    'per_minute': _usage_stats(tpm_count, safe_tpm),
+                    'per_day': _usage_stats(tpd_count, safe_tpd)
                 },
                 'statistics': {
                     'total_requests': self.total_requests,
                     'quota_exceeded': self.quota_exceeded_count,
                     'fallback_used': self.fallback_used_count,
                     'queued_requests': self.queued_requests,
-                    'current_queue_size': sum(len(q) for q in self.queues.values())
+                    'current_queue_size': len(self._pq)
                 },
                 'queue': {
-                    priority.name: len(queue) 
-                    for priority, queue in self.queues.items()
+                    priority.name: count
+                    for priority, count in zip(RequestPriority, self._queue_counts)
                 }
             }
 
@@ -334,16 +477,50 @@ def get_quota_tracker(config: Optional[QuotaConfig] = None) -> QuotaTracker:
     return _quota_tracker_instance
 
 
+def _make_key(name: str, args: tuple, kwargs: dict) -> str:
+    """
+    Fixed-size fallback cache key for a call
+    
+    Arguments are pickled (repr for anything unpicklable) and hashed, so
+    large payloads do not become large dictionary keys.
+    """
+    try:
+        payload = pickle.dumps((args, kwargs), protocol=5)
+    except Exception:
+        payload = repr((args, kwargs)).encode()
+    return f"{name}:{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
+
+
+def _flask_quota_exceeded(payload: Dict) -> Any:
+    """Default quota-exceeded response: Flask JSON with status 429"""
+    from flask import jsonify
+    return jsonify(payload), 429
+
+
+def _flask_session_id() -> Optional[str]:
+    """Session cookie of the current Flask request, if any"""
+    from flask import has_request_context, request
+    return request.cookies.get('session_id') if has_request_context() else None
+
+
 def with_quota_check(priority: RequestPriority = RequestPriority.HIGH, 
-                     estimated_tokens: int = 1000):
+                     estimated_tokens: int = 1000,
+                     error_factory: Optional[Callable[[Dict], Any]] = None):
     """
     Decorator to check quota before making API request
     Implements fallback and queuing when quota is exceeded
+    
+    error_factory turns the quota-exceeded payload into the return value;
+    by default a Flask JSON response with status 429. Flask is only
+    imported when it is needed, so non-web callers do not load it.
     """
+    respond_error = error_factory or _flask_quota_exceeded
+    
     def with_quota_check_decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             tracker = get_quota_tracker()
+            cache_key = _make_key(f.__name__, args, kwargs)
             
             # Check if request can proceed
             can_proceed, reason = tracker.can_make_request(estimated_tokens)
@@ -362,7 +539,6 @@ def with_quota_check(priority: RequestPriority = RequestPriority.HIGH,
                     tracker.record_request(actual_tokens)
                     
                     # Cache response for potential fallback
-                    cache_key = f"{f.__name__}:{str(args)}:{str(kwargs)}"
                     tracker.cache_response(cache_key, result)
                     
                     return result
@@ -371,7 +547,6 @@ def with_quota_check(priority: RequestPriority = RequestPriority.HIGH,
                     logger.error("API request failed", extra={'error': str(e)}, exc_info=True)
                     
                     # Try fallback
-                    cache_key = f"{f.__name__}:{str(args)}:{str(kwargs)}"
                     fallback = tracker.get_fallback_response(cache_key)
                     if fallback:
                         return fallback
@@ -379,14 +554,13 @@ def with_quota_check(priority: RequestPriority = RequestPriority.HIGH,
             
             else:
                 # Quota exceeded - try fallback first
-                cache_key = f"{f.__name__}:{str(args)}:{str(kwargs)}"
                 fallback = tracker.get_fallback_response(cache_key)
                 if fallback:
                     return fallback
                 
                 # No fallback - queue request
                 tracker.quota_exceeded_count += 1
-                user_id = kwargs.get('user_id') or (hasattr(request, 'cookies') and request.cookies.get('session_id'))
+                user_id = kwargs.get('user_id') or (_flask_session_id() if error_factory is None else None)
                 
                 queued = tracker.queue_request(
                     priority=priority,
@@ -396,18 +570,18 @@ def with_quota_check(priority: RequestPriority = RequestPriority.HIGH,
                 )
                 
                 if queued:
-                    return jsonify({
+                    return respond_error({
                         'error': 'quota_exceeded',
                         'message': f'API quota exceeded: {reason}. Request queued.',
                         'queued': True,
                         'priority': priority.name
-                    }), 429
+                    })
                 else:
-                    return jsonify({
+                    return respond_error({
                         'error': 'quota_exceeded',
                         'message': f'API quota exceeded: {reason}. Queue full.',
                         'queued': False
-                    }), 429
+                    })
         
         return decorated_function
     return with_quota_check_decorator
@@ -1,16 +1,19 @@
 """
 Production Rate Limiter with Redis Backend
-Implements sliding window algorithm with tier-based limits
+Implements token bucket algorithm with tier-based limits
 Complies with Requirements 9.1, 9.2
 """
 
 import time
 import hashlib
-from typing import Dict, Optional, Tuple
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from functools import wraps
-from flask import request, jsonify, g
+from flask import request, jsonify, g, make_response
 import json
+from collections import OrderedDict
 
 try:
     import redis
@@ -18,14 +21,97 @@ try:
 except ImportError:
     REDIS_AVAILABLE = False
 
+try:
+    from cachetools import TTLCache
+    CACHETOOLS_AVAILABLE = True
+except ImportError:
+    CACHETOOLS_AVAILABLE = False
+
 from structured_logging import get_logger
 
 logger = get_logger(__name__)
 
+# Clock for the in-memory store: monotonic, so wall-clock adjustments
+# cannot drain or overfill buckets. Redis buckets are shared between
+# processes and hosts, so they keep using wall-clock time.
+_now = time.monotonic
+
+# Seconds between sweeps of refilled buckets from the in-memory store
+MEMORY_SWEEP_INTERVAL = 60
+# Most buckets kept in memory; least recently used are evicted beyond this
+MEMORY_STORE_MAX_KEYS = 100_000
+
+# Process-local cache of status responses, so clients polling the status
+# endpoint reuse the last answer instead of reading Redis each time
+STATUS_CACHE_SIZE = 10_000
+STATUS_CACHE_TTL = 1  # seconds
+
+
+# Atomic token-bucket check across several windows. Each window is a hash
+# {t = tokens, ts = last refill time}; a bucket holds up to `limit` tokens
+# and refills at limit / window_seconds per second. Every bucket is refilled
+# and checked first, and only if all of them hold a token is one taken from
+# each, in a single round trip. A request denied by one window is not
+# counted against the others.
+# KEYS = one hash per window
+# ARGV = current_time, then capacity, refill rate per key
+# Returns {allowed, window (1-based), tokens left in it}: the window that
+# denied the request, or if allowed the one with the fewest tokens left
+TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local tightest = 1
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', KEYS[i], 't', 'ts')
+    local t = tonumber(state[1])
+    if t == nil then
+        t = capacity
+    else
+        local elapsed = math.max(0, now - tonumber(state[2]))
+        t = math.min(capacity, t + elapsed * tonumber(ARGV[2 * i + 1]))
+    end
+    if t < 1 then
+        return {0, i, tostring(t)}
+    end
+    tokens[i] = t - 1
+    if tokens[i] < tokens[tightest] then
+        tightest = i
+    end
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i])
+    redis.call('HSET', KEYS[i], 't', tostring(tokens[i]), 'ts', ARGV[1])
+    redis.call('EXPIRE', KEYS[i], math.ceil(capacity / tonumber(ARGV[2 * i + 1])) + 10)
+end
+return {1, tightest, tostring(tokens[tightest])}
+"""
+
+# The same check registered as a Redis 7 function. Functions are persisted
+# and replicated with the data, so unlike a SCRIPT LOAD cache entry they
+# survive SCRIPT FLUSH and failover. Redis < 7 falls back to EVALSHA.
+TOKEN_BUCKET_FUNCTION = 'rl_token_bucket'
+TOKEN_BUCKET_LIBRARY = (
+    "#!lua name=rate_limiter\n"
+    f"redis.register_function('{TOKEN_BUCKET_FUNCTION}', function(KEYS, ARGV)\n"
+    f"{TOKEN_BUCKET_LUA}\n"
+    "end)\n"
+)
+
+
+def _refill(tokens: float, last_refill: float, capacity: int, rate: float, now: float) -> float:
+    """Tokens in a bucket at `now`, given its state at `last_refill`"""
+    return min(capacity, tokens + max(0.0, now - last_refill) * rate)
+
+
+def _used(capacity: int, tokens: float) -> int:
+    """Requests currently counted against a bucket holding `tokens`"""
+    return max(0, math.ceil(capacity - tokens))
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class RateLimitTier:
-    """Rate limit configuration for a specific tier"""
+    """Rate limit configuration for a specific tier (immutable: TIER_BUCKETS is derived from it)"""
     name: str
     requests_per_minute: int
     requests_per_hour: int
@@ -44,40 +130,70 @@ RATE_LIMIT_TIERS = {
     'unlimited': RateLimitTier('unlimited', 1000, 50000, 1000000)  # Admin
 }
 
+# Per-tier (window_seconds, limit) pairs in check order, and the matching
+# window names, built once so the request path does no tuple construction
+TIER_BUCKETS: Dict[str, Tuple[Tuple[int, int], ...]] = {
+    name: ((60, tier.requests_per_minute), (3600, tier.requests_per_hour), (86400, tier.requests_per_day))
+    for name, tier in RATE_LIMIT_TIERS.items()
+}
+WINDOW_NAMES = ('minute', 'hour', 'day')
+
 
 class RateLimiter:
     """
     Production-grade rate limiter with Redis backend
     
     Features:
-    - Sliding window algorithm for accurate rate limiting
+    - Token bucket per window (O(1) state per requester and window)
     - Tier-based limits (limited, free, basic, premium, unlimited)
     - Redis backend for distributed rate limiting
     - Fallback to in-memory for development
-    - Automatic cleanup of expired entries
+    - Automatic expiry of idle buckets in Redis
     
     Validates: Requirements 9.1, 9.2
     """
     
-    def __init__(self, redis_client: Optional[redis.Redis] = None):
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        redis_reader: Optional[redis.Redis] = None
+    ):
         """
         Initialize rate limiter
         
         Args:
             redis_client: Redis client instance (optional, will use in-memory if None)
+            redis_reader: Redis client for a read replica, used by status
+                queries (optional, defaults to redis_client)
         """
         self.redis_client = redis_client
-        self.memory_store: Dict[str, list] = {}  # Fallback in-memory store
+        # Fallback in-memory store, least recently used first: key -> [tokens, last_refill, full_at]
+        self.memory_store: 'OrderedDict[str, List[float]]' = OrderedDict()
+        self._next_memory_sweep = _now() + MEMORY_SWEEP_INTERVAL
+        self.memory_lock = threading.Lock()
+        self._script_sha: Optional[str] = None
+        self._use_function = False
         
         if self.redis_client:
             try:
                 self.redis_client.ping()
+                self._load_bucket_script()
                 logger.info("Rate limiter initialized with Redis backend")
             except Exception as e:
                 logger.warning(f"Redis connection failed, using in-memory fallback: {e}")
                 self.redis_client = None
         else:
             logger.info("Rate limiter initialized with in-memory backend")
+        
+        # Status reads may be slightly stale, so they can go to a replica
+        self.redis_reader = (redis_reader or self.redis_client) if self.redis_client else None
+        
+        # (identifier, tier) -> status dict; TTLCache is not thread-safe
+        self._status_cache = (
+            TTLCache(maxsize=STATUS_CACHE_SIZE, ttl=STATUS_CACHE_TTL)
+            if CACHETOOLS_AVAILABLE else None
+        )
+        self._status_cache_lock = threading.Lock()
     
     def _get_redis_key(self, identifier: str, window: str) -> str:
         """
@@ -96,25 +212,32 @@ class RateLimiter:
         """
         Get user's quota tier from request context
         
+        The result is memoized on flask.g for the current user, so repeat
+        calls within a request skip the header checks.
+        
         Returns:
             Tier name ('limited', 'free', 'basic', 'premium', 'unlimited')
         """
-        # Check Flask g object for authenticated user
-        if hasattr(g, 'current_user') and g.current_user:
-            tier = g.current_user.get('quota_tier', 'free')
-            return tier
-        
-        # Check for API key (indicates at least free tier)
-        if request.headers.get('X-API-Key'):
-            return 'free'
-        
-        # Check for JWT token
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Bearer '):
-            return 'free'
-        
-        # Anonymous user
-        return 'limited'
+        current_user = g.get('current_user')
+        cached = g.get('_rl_tier')
+        if cached is not None and cached[0] is current_user:
+            return cached[1]
+        
+        if current_user:
+            # Authenticated user
+            tier = current_user.get('quota_tier', 'free')
+        elif request.headers.get('X-API-Key'):
+            # API key indicates at least free tier
+            tier = 'free'
+        elif request.headers.get('Authorization', '').startswith('Bearer '):
+            # JWT token
+            tier = 'free'
+        else:
+            # Anonymous user
+            tier = 'limited'
+        
+        g._rl_tier = (current_user, tier)
+        return tier
     
     def _get_identifier(self) -> str:
         """
@@ -125,12 +248,26 @@ class RateLimiter:
         2. API key
         3. IP address
         
+        The result is memoized on flask.g for the current user, so the API
+        key is hashed at most once per request.
+        
         Returns:
             Unique identifier string
         """
-        # Try to get user ID from Flask g object
-        if hasattr(g, 'current_user') and g.current_user:
-            user_id = g.current_user.get('user_id')
+        current_user = g.get('current_user')
+        cached = g.get('_rl_ident')
+        if cached is not None and cached[0] is current_user:
+            return cached[1]
+        
+        identifier = self._resolve_identifier(current_user)
+        g._rl_ident = (current_user, identifier)
+        return identifier
+    
+    def _resolve_identifier(self, current_user: Optional[Dict]) -> str:
+        """Compute the rate-limit identifier for the current request"""
+        # Try to get user ID from the authenticated user
+        if current_user:
+            user_id = current_user.get('user_id')
             if user_id:
                 return f"user:{user_id}"
         
@@ -138,101 +275,165 @@ class RateLimiter:
         api_key = request.headers.get('X-API-Key')
         if api_key:
             # Hash API key for privacy
-            key_hash = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+            key_hash = hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
             return f"apikey:{key_hash}"
         
-        # Fall back to IP address
-        ip_address = request.headers.get('X-Forwarded-For', request.remote_addr)
-        if ',' in ip_address:
-            ip_address = ip_address.split(',')[0].strip()
+        # Fall back to IP address (first hop of X-Forwarded-For)
+        forwarded = request.headers.get('X-Forwarded-For') or request.remote_addr or ''
+        ip_address = forwarded.partition(',')[0].strip()
         
         return f"ip:{ip_address}"
     
-    def _sliding_window_check(
+    def _load_bucket_script(self):
+        """Register the token-bucket function, or cache the script on Redis < 7"""
+        try:
+            self.redis_client.function_load(TOKEN_BUCKET_LIBRARY, replace=True)
+            self._use_function = True
+        except redis.exceptions.ResponseError:
+            self._script_sha = self.redis_client.script_load(TOKEN_BUCKET_LUA)
+    
+    def _run_bucket_script(self, keys: List[str], args: List) -> List:
+        """
+        Run the token-bucket check, reloading it if Redis has lost it (a
+        FUNCTION FLUSH or a restart without persistence, or SCRIPT FLUSH
+        for the EVALSHA fallback)
+        
+        Returns:
+            Script reply: [allowed, window_number, tokens_left]
+        """
+        if self._use_function:
+            try:
+                return self.redis_client.fcall(TOKEN_BUCKET_FUNCTION, len(keys), *keys, *args)
+            except redis.exceptions.ResponseError as e:
+                if 'Function not found' not in str(e):
+                    raise
+                self.redis_client.function_load(TOKEN_BUCKET_LIBRARY, replace=True)
+                return self.redis_client.fcall(TOKEN_BUCKET_FUNCTION, len(keys), *keys, *args)
+        
+        try:
+            return self.redis_client.evalsha(self._script_sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            self._script_sha = self.redis_client.script_load(TOKEN_BUCKET_LUA)
+            return self.redis_client.evalsha(self._script_sha, len(keys), *keys, *args)
+    
+    def _token_bucket_check(
         self,
         identifier: str,
-        window_seconds: int,
-        limit: int
-    ) -> Tuple[bool, int, int]:
+        windows: Tuple[Tuple[int, int], ...]
+    ) -> Tuple[bool, int, int, int]:
         """
-        Check rate limit using sliding window algorithm
+        Check rate limits using one token bucket per window
+        
+        A window of `limit` requests per `window_seconds` is a bucket of
+        `limit` tokens refilled at limit / window_seconds per second. A token
+        is taken from every bucket only if all of them allow the request.
         
         Args:
             identifier: Unique identifier for the requester
-            window_seconds: Time window in seconds
-            limit: Maximum requests allowed in window
+            windows: (window_seconds, limit) pairs to check
         
         Returns:
-            Tuple of (is_allowed, current_count, retry_after_seconds)
+            Tuple of (is_allowed, window_index, current_count,
+            retry_after_seconds). window_index is the window that denied the
+            request or, if allowed, the one with the fewest requests left.
         """
-        current_time = time.time()
-        window_start = current_time - window_seconds
-        
         if self.redis_client:
-            # Redis-based sliding window
-            window_name = f"{window_seconds}s"
-            key = self._get_redis_key(identifier, window_name)
+            # Redis-based token buckets
+            current_time = time.time()
+            keys = [
+                self._get_redis_key(identifier, f"bucket:{window_seconds}s")
+                for window_seconds, _ in windows
+            ]
+            args = [current_time]
+            for window_seconds, limit in windows:
+                args.extend((limit, limit / window_seconds))
             
             try:
-                # Remove expired entries
-                self.redis_client.zremrangebyscore(key, 0, window_start)
-                
-                # Count requests in current window
-                current_count = self.redis_client.zcard(key)
-                
-                if current_count >= limit:
-                    # Get oldest request timestamp to calculate retry_after
-                    oldest = self.redis_client.zrange(key, 0, 0, withscores=True)
-                    if oldest:
-                        oldest_timestamp = oldest[0][1]
-                        retry_after = int(oldest_timestamp + window_seconds - current_time) + 1
-                    else:
-                        retry_after = window_seconds
-                    
-                    return False, current_count, retry_after
-                
-                # Add current request
-                request_id = f"{current_time}:{id(request)}"
-                self.redis_client.zadd(key, {request_id: current_time})
+                allowed, window_number, tokens = self._run_bucket_script(keys, args)
+                tokens = float(tokens)
+                index = window_number - 1
+                window_seconds, limit = windows[index]
                 
-                # Set expiration on key
-                self.redis_client.expire(key, window_seconds + 10)
+                if not allowed:
+                    # Time until the bucket refills to one whole token
+                    retry_after = math.ceil((1 - tokens) * window_seconds / limit)
+                    return False, index, _used(limit, tokens), max(1, retry_after)
                 
-                return True, current_count + 1, 0
+                return True, index, _used(limit, tokens), 0
                 
             except Exception as e:
                 logger.error(f"Redis error in rate limiting: {e}")
                 # Fall through to in-memory fallback
         
         # In-memory fallback
-        key = f"{identifier}:{window_seconds}s"
-        
-        if key not in self.memory_store:
-            self.memory_store[key] = []
-        
-        # Remove expired entries
-        self.memory_store[key] = [
-            ts for ts in self.memory_store[key]
-            if ts > window_start
-        ]
-        
-        current_count = len(self.memory_store[key])
-        
-        if current_count >= limit:
-            # Calculate retry_after
-            oldest_timestamp = min(self.memory_store[key])
-            retry_after = int(oldest_timestamp + window_seconds - current_time) + 1
-            return False, current_count, retry_after
-        
-        # Add current request
-        self.memory_store[key].append(current_time)
+        with self.memory_lock:
+            return self._memory_bucket_check(identifier, windows, _now())
+    
+    def _memory_bucket_check(
+        self,
+        identifier: str,
+        windows: Tuple[Tuple[int, int], ...],
+        current_time: float
+    ) -> Tuple[bool, int, int, int]:
+        """In-memory token-bucket check (call with memory_lock held)"""
+        if current_time >= self._next_memory_sweep:
+            self._sweep_memory_store(current_time)
+        
+        buckets = []
+        for index, (window_seconds, limit) in enumerate(windows):
+            key = f"{identifier}:{window_seconds}s"
+            bucket = self.memory_store.get(key)
+            if bucket is None:
+                bucket = self.memory_store[key] = [float(limit), current_time, current_time]
+                if len(self.memory_store) > MEMORY_STORE_MAX_KEYS:
+                    self.memory_store.popitem(last=False)
+            else:
+                self.memory_store.move_to_end(key)
+            
+            tokens = _refill(bucket[0], bucket[1], limit, limit / window_seconds, current_time)
+            
+            if tokens < 1:
+                # Time until the bucket refills to one whole token
+                retry_after = math.ceil((1 - tokens) * window_seconds / limit)
+                return False, index, _used(limit, tokens), max(1, retry_after)
+            
+            buckets.append((bucket, tokens, limit, window_seconds / limit))
+        
+        # Take a token from every bucket
+        tightest = 0
+        for index, (bucket, tokens, capacity, seconds_per_token) in enumerate(buckets):
+            bucket[0] = tokens - 1
+            bucket[1] = current_time
+            bucket[2] = current_time + (capacity - bucket[0]) * seconds_per_token
+            if bucket[0] < buckets[tightest][0][0]:
+                tightest = index
+        
+        if not buckets:
+            return True, -1, 0, 0
+        return True, tightest, _used(windows[tightest][1], buckets[tightest][0][0]), 0
+    
+    def _sweep_memory_store(self, current_time: float):
+        """
+        Drop in-memory buckets that have refilled completely (call with
+        memory_lock held)
         
-        return True, current_count + 1, 0
+        A full bucket behaves exactly like a missing one, so idle requesters
+        are forgotten. Runs at most once per MEMORY_SWEEP_INTERVAL rather
+        than on every request.
+        """
+        self._next_memory_sweep = current_time + MEMORY_SWEEP_INTERVAL
+        full = [key for key, bucket in self.memory_store.items() if bucket[2] <= current_time]
+        for key in full:
+            self.memory_store.pop(key, None)
     
     def check_rate_limit(self) -> Tuple[bool, Optional[Dict]]:
         """
         Check if request should be allowed based on rate limits
         
+        The tightest window's limit, remaining requests and seconds until
+        its bucket is full again are stored on g.rate_limit for the
+        RateLimit-* response headers.
+        
         Returns:
             Tuple of (is_allowed, error_response_dict)
             
@@ -240,77 +441,31 @@ class RateLimiter:
         """
         identifier = self._get_identifier()
         tier_name = self._get_user_tier()
-        tier = RATE_LIMIT_TIERS.get(tier_name, RATE_LIMIT_TIERS['limited'])
+        windows = TIER_BUCKETS.get(tier_name) or TIER_BUCKETS['limited']
         
-        # Check minute limit
-        allowed, count, retry_after = self._sliding_window_check(
-            identifier, 60, tier.requests_per_minute
-        )
-        
-        if not allowed:
-            logger.warning(
-                "Rate limit exceeded (minute)",
-                extra={
-                    'identifier': identifier[:20],
-                    'tier': tier_name,
-                    'count': count,
-                    'limit': tier.requests_per_minute
-                }
-            )
-            return False, {
-                'error': 'rate_limit_exceeded',
-                'message': f'Rate limit exceeded: {count}/{tier.requests_per_minute} requests per minute',
-                'tier': tier_name,
-                'limit': tier.requests_per_minute,
-                'window': 'minute',
-                'retry_after': retry_after
-            }
+        # Minute, hour and day limits are checked in one pass
+        allowed, index, count, retry_after = self._token_bucket_check(identifier, windows)
         
-        # Check hour limit
-        allowed, count, retry_after = self._sliding_window_check(
-            identifier, 3600, tier.requests_per_hour
-        )
+        window_seconds, limit = windows[index]
+        g.rate_limit = (limit, max(0, limit - count), math.ceil(count * window_seconds / limit))
         
         if not allowed:
+            window_name = WINDOW_NAMES[index]
             logger.warning(
-                "Rate limit exceeded (hour)",
+                f"Rate limit exceeded ({window_name})",
                 extra={
                     'identifier': identifier[:20],
                     'tier': tier_name,
                     'count': count,
-                    'limit': tier.requests_per_hour
+                    'limit': limit
                 }
             )
             return False, {
                 'error': 'rate_limit_exceeded',
-                'message': f'Rate limit exceeded: {count}/{tier.requests_per_hour} requests per hour',
+                'message': f'Rate limit exceeded: {count}/{limit} requests per {window_name}',
                 'tier': tier_name,
-                'limit': tier.requests_per_hour,
-                'window': 'hour',
-                'retry_after': retry_after
-            }
-        
-        # Check day limit
-        allowed, count, retry_after = self._sliding_window_check(
-            identifier, 86400, tier.requests_per_day
-        )
-        
-        if not allowed:
-            logger.warning(
-                "Rate limit exceeded (day)",
-                extra={
-                    'identifier': identifier[:20],
-                    'tier': tier_name,
-                    'count': count,
-                    'limit': tier.requests_per_day
-                }
-            )
-            return False, {
-                'error': 'rate_limit_exceeded',
-                'message': f'Rate limit exceeded: {count}/{tier.requests_per_day} requests per day',
-                'tier': tier_name,
-                'limit': tier.requests_per_day,
-                'window': 'day',
+                'limit': limit,
+                'window': window_name,
                 'retry_after': retry_after
             }
         
@@ -320,81 +475,138 @@ class RateLimiter:
         """
         Get current rate limit status for the requester
         
+        Repeat calls for the same requester within STATUS_CACHE_TTL return
+        the cached result. Each caller gets its own copy, so changing it
+        never affects later callers.
+        
         Returns:
             Dictionary with current usage and limits
         """
         identifier = self._get_identifier()
         tier_name = self._get_user_tier()
-        tier = RATE_LIMIT_TIERS.get(tier_name, RATE_LIMIT_TIERS['limited'])
         
-        current_time = time.time()
+        cache_key = (identifier, tier_name)
+        if self._status_cache is not None:
+            with self._status_cache_lock:
+                cached = self._status_cache.get(cache_key)
+            if cached is not None:
+                return _copy_status(cached)
         
-        def get_count(window_seconds: int) -> int:
-            """Get current request count for window"""
-            window_start = current_time - window_seconds
-            
-            if self.redis_client:
-                window_name = f"{window_seconds}s"
-                key = self._get_redis_key(identifier, window_name)
+        status = self._compute_rate_limit_status(identifier, tier_name)
+        
+        if self._status_cache is not None:
+            with self._status_cache_lock:
+                self._status_cache[cache_key] = status
+            return _copy_status(status)
+        return status
+    
+    def _compute_rate_limit_status(self, identifier: str, tier_name: str) -> Dict:
+        """Read current usage for every window of the requester's tier"""
+        tier = RATE_LIMIT_TIERS.get(tier_name, RATE_LIMIT_TIERS['limited'])
+        
+        def get_counts(windows: Tuple[Tuple[int, int], ...]) -> List[int]:
+            """Get current request counts for each window"""
+            if self.redis_reader:
                 try:
-                    self.redis_client.zremrangebyscore(key, 0, window_start)
-                    return self.redis_client.zcard(key)
+                    # Read every bucket in one round trip
+                    current_time = time.time()
+                    pipe = self.redis_reader.pipeline(transaction=False)
+                    for window_seconds, _ in windows:
+                        pipe.hmget(self._get_redis_key(identifier, f"bucket:{window_seconds}s"), 't', 'ts')
+                    states = pipe.execute()
                 except Exception:
-                    pass
+                    states = None
+                
+                if states is not None:
+                    counts = []
+                    for (window_seconds, limit), (tokens, last_refill) in zip(windows, states):
+                        if tokens is None:
+                            counts.append(0)
+                        else:
+                            tokens = _refill(float(tokens), float(last_refill), limit, limit / window_seconds, current_time)
+                            counts.append(_used(limit, tokens))
+                    return counts
             
             # In-memory fallback
-            key = f"{identifier}:{window_seconds}s"
-            if key in self.memory_store:
-                self.memory_store[key] = [
-                    ts for ts in self.memory_store[key]
-                    if ts > window_start
-                ]
-                return len(self.memory_store[key])
-            
-            return 0
+            counts = []
+            current_time = _now()
+            with self.memory_lock:
+                for window_seconds, limit in windows:
+                    bucket = self.memory_store.get(f"{identifier}:{window_seconds}s")
+                    if bucket is not None:
+                        tokens = _refill(bucket[0], bucket[1], limit, limit / window_seconds, current_time)
+                        counts.append(_used(limit, tokens))
+                    else:
+                        counts.append(0)
+            return counts
+        
+        used_minute, used_hour, used_day = get_counts(TIER_BUCKETS.get(tier_name) or TIER_BUCKETS['limited'])
         
         return {
             'tier': tier_name,
             'limits': {
                 'minute': {
                     'limit': tier.requests_per_minute,
-                    'remaining': max(0, tier.requests_per_minute - get_count(60)),
-                    'used': get_count(60)
+                    'remaining': max(0, tier.requests_per_minute - used_minute),
+                    'used': used_minute
                 },
                 'hour': {
                     'limit': tier.requests_per_hour,
-                    'remaining': max(0, tier.requests_per_hour - get_count(3600)),
-                    'used': get_count(3600)
+                    'remaining': max(0, tier.requests_per_hour - used_hour),
+                    'used': used_hour
                 },
                 'day': {
                     'limit': tier.requests_per_day,
-                    'remaining': max(0, tier.requests_per_day - get_count(86400)),
-                    'used': get_count(86400)
+                    'remaining': max(0, tier.requests_per_day - used_day),
+                    'used': used_day
                 }
             }
         }
 
 
+def _copy_status(status: Dict) -> Dict:
+    """Copy a rate limit status down to the per-window dicts"""
+    return {
+        **status,
+        'limits': {window: dict(usage) for window, usage in status['limits'].items()}
+    }
+
+
 # Global rate limiter instance
 _rate_limiter_instance: Optional[RateLimiter] = None
 
 
-def get_rate_limiter(redis_client: Optional[redis.Redis] = None) -> RateLimiter:
+def get_rate_limiter(
+    redis_client: Optional[redis.Redis] = None,
+    redis_reader: Optional[redis.Redis] = None
+) -> RateLimiter:
     """
     Get or create global rate limiter instance
     
     Args:
         redis_client: Redis client (only used on first call)
+        redis_reader: Redis replica client for status reads (only used on first call)
     
     Returns:
         RateLimiter instance
     """
     global _rate_limiter_instance
     if _rate_limiter_instance is None:
-        _rate_limiter_instance = RateLimiter(redis_client)
+        _rate_limiter_instance = RateLimiter(redis_client, redis_reader)
     return _rate_limiter_instance
 
 
+def _with_rate_limit_headers(response):
+    """Attach RateLimit-Limit/-Remaining/-Reset from the last check in this request"""
+    state = g.get('rate_limit')
+    if state is not None:
+        limit, remaining, reset = state
+        response.headers['RateLimit-Limit'] = str(limit)
+        response.headers['RateLimit-Remaining'] = str(remaining)
+        response.headers['RateLimit-Reset'] = str(reset)
+    return response
+
+
 def rate_limit(f):
     """
     Decorator to apply rate limiting to Flask routes
@@ -419,9 +631,10 @@ def rate_limit(f):
             response = jsonify(error_response)
             response.status_code = 429
             response.headers['Retry-After'] = str(error_response.get('retry_after', 60))
-            return response
+            return _with_rate_limit_headers(response)
         
-        # Execute the route function
-        return f(*args, **kwargs)
+        # Execute the route function; the headers let an upstream gateway
+        # shed a requester's traffic itself once Remaining reaches 0
+        return _with_rate_limit_headers(make_response(f(*args, **kwargs)))
     
     return decorated_function
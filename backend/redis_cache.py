@@ -6,10 +6,15 @@ Enhanced with pattern invalidation, cache warming, and comprehensive stats
 
 import json
 import hashlib
-from typing import Optional, Any, List, Dict, Callable
-from functools import wraps
+import re
+import heapq
+import queue
+from typing import Optional, Any, List, Dict, Callable, Sequence, Tuple
+from functools import lru_cache, wraps
 import time
 import threading
+from collections import OrderedDict, deque
+from itertools import count, islice
 
 try:
     import redis
@@ -18,10 +23,362 @@ except ImportError:
     REDIS_AVAILABLE = False
     print("Warning: redis-py not installed. Using in-memory cache fallback.")
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
 from structured_logging import get_logger
 
 logger = get_logger(__name__)
 
+# SCAN page-size hint and number of keys per UNLINK in delete_pattern
+SCAN_BATCH_SIZE = 1000
+
+# Seconds to reuse the server-side INFO/DBSIZE snapshot in get_stats
+STATS_CACHE_TTL = 1
+
+# Serialized values larger than this are zstd-compressed before going to Redis
+COMPRESSION_THRESHOLD = 4096
+COMPRESSION_LEVEL = 3
+# Every zstd frame starts with this magic; JSON never does, so stored values
+# are self-describing and uncompressed entries keep working
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Time one in this many get/set calls (a power of two); totals are scaled back up
+LATENCY_SAMPLE_RATE = 64
+_LATENCY_SAMPLE_MASK = LATENCY_SAMPLE_RATE - 1
+
+# Most queued writes flushed in one pipeline by the background writer
+WRITE_BATCH_SIZE = 256
+
+# Methods cached_response serves from cache; anything else always runs the endpoint
+CACHEABLE_METHODS = frozenset({'GET', 'HEAD', 'POST'})
+
+
+def _dumps(value: Any) -> bytes:
+    """Serialize a cache value (orjson when installed)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value).encode()
+
+
+def _loads(payload: bytes) -> Any:
+    """Deserialize a cache value written by _dumps"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+# zstd contexts are not safe for concurrent use, so each thread keeps its own
+_zstd_local = threading.local()
+
+
+def _encode(value: Any) -> bytes:
+    """Serialize a value for Redis, compressing large payloads"""
+    payload = _dumps(value)
+    if ZSTD_AVAILABLE and len(payload) > COMPRESSION_THRESHOLD:
+        compressor = getattr(_zstd_local, 'compressor', None)
+        if compressor is None:
+            compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+        payload = compressor.compress(payload)
+    return payload
+
+
+def _decode(payload: bytes) -> Any:
+    """Deserialize a value written by _encode"""
+    if payload[:4] == _ZSTD_MAGIC:
+        decompressor = getattr(_zstd_local, 'decompressor', None)
+        if decompressor is None:
+            decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+        payload = decompressor.decompress(payload)
+    return _loads(payload)
+
+
+# Popular topics for cache warming (Top 100)
+_POPULAR_TOPICS: Tuple[str, ...] = (
+    # Programming Languages (20)
+    "Python Programming",
+    "JavaScript",
+    "Java Programming",
+    "C++ Programming",
+    "C Programming",
+    "C# Programming",
+    "Go Programming",
+    "Rust Programming",
+    "TypeScript",
+    "PHP Programming",
+    "Ruby Programming",
+    "Swift Programming",
+    "Kotlin Programming",
+    "R Programming",
+    "MATLAB",
+    "SQL Programming",
+    "Scala Programming",
+    "Perl Programming",
+    "Dart Programming",
+    "Assembly Language",
+    
+    # Web Development (15)
+    "Web Development",
+    "Frontend Development",
+    "Backend Development",
+    "Full Stack Development",
+    "React",
+    "Angular",
+    "Vue.js",
+    "Node.js",
+    "Django",
+    "Flask",
+    "Spring Boot",
+    "ASP.NET",
+    "REST API",
+    "GraphQL",
+    "Web Security",
+    
+    # Data Science & AI (15)
+    "Machine Learning",
+    "Artificial Intelligence",
+    "Deep Learning",
+    "Neural Networks",
+    "Natural Language Processing",
+    "Computer Vision",
+    "Data Science",
+    "Data Analytics",
+    "Big Data",
+    "TensorFlow",
+    "PyTorch",
+    "Keras",
+    "Scikit-learn",
+    "Pandas",
+    "NumPy",
+    
+    # Computer Science Fundamentals (15)
+    "Data Structures",
+    "Algorithms",
+    "Operating Systems",
+    "Computer Networks",
+    "Database Management",
+    "Computer Architecture",
+    "Compiler Design",
+    "Theory of Computation",
+    "Discrete Mathematics",
+    "Linear Algebra",
+    "Probability and Statistics",
+    "Calculus",
+    "Software Engineering",
+    "Design Patterns",
+    "Object Oriented Programming",
+    
+    # Mobile & Cloud (10)
+    "Android Development",
+    "iOS Development",
+    "React Native",
+    "Flutter",
+    "Cloud Computing",
+    "AWS",
+    "Azure",
+    "Google Cloud",
+    "Docker",
+    "Kubernetes",
+    
+    # DevOps & Tools (10)
+    "DevOps",
+    "Git Version Control",
+    "CI/CD",
+    "Jenkins",
+    "Linux Administration",
+    "Shell Scripting",
+    "Ansible",
+    "Terraform",
+    "Monitoring and Logging",
+    "Microservices",
+    
+    # Security & Blockchain (10)
+    "Cybersecurity",
+    "Ethical Hacking",
+    "Cryptography",
+    "Network Security",
+    "Blockchain",
+    "Smart Contracts",
+    "Penetration Testing",
+    "Security Testing",
+    "OAuth and Authentication",
+    "GDPR and Compliance",
+    
+    # Emerging Technologies (5)
+    "Internet of Things",
+    "Edge Computing",
+    "Quantum Computing",
+    "Augmented Reality",
+    "Virtual Reality",
+)
+
+
+def _hash_key(version: str, endpoint: str, data: dict) -> str:
+    """Versioned cache key for an endpoint and its request data"""
+    if ORJSON_AVAILABLE:
+        body = orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    else:
+        body = json.dumps(data, sort_keys=True).encode()
+    return _raw_key(version, endpoint, body)
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """
+    Translate a Redis MATCH glob into an anchored regex
+    
+    Follows Redis rather than fnmatch: classes negate with [^...], and a
+    backslash escapes the next character both inside and outside classes.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            out.append('.*')
+        elif c == '?':
+            out.append('.')
+        elif c == '\\' and i < n:
+            out.append(re.escape(pattern[i]))
+            i += 1
+        elif c == '[':
+            j = i
+            negate = j < n and pattern[j] == '^'
+            if negate:
+                j += 1
+            parts = []
+            while j < n and pattern[j] != ']':
+                if pattern[j] == '\\' and j + 1 < n:
+                    j += 1
+                    parts.append(re.escape(pattern[j]))
+                elif j + 2 < n and pattern[j + 1] == '-' and pattern[j + 2] != ']':
+                    low, high = sorted((pattern[j], pattern[j + 2]))
+                    parts.append(f"{re.escape(low)}-{re.escape(high)}")
+                    j += 2
+                else:
+                    parts.append(re.escape(pattern[j]))
+                j += 1
+            # Like Redis, an unclosed class runs to the end of the pattern
+            i = j + 1
+            body = ''.join(parts)
+            if not body:
+                # Empty class matches nothing ([^] matches any one character)
+                out.append('.' if negate else '(?!)')
+            else:
+                out.append(f"[{'^' if negate else ''}{body}]")
+        else:
+            out.append(re.escape(c))
+    return '(?s:' + ''.join(out) + r')\Z'
+
+
+def _raw_key(version: str, endpoint: str, raw: bytes) -> str:
+    """
+    Versioned cache key over raw request bytes, without any JSON work
+    
+    Version and endpoint stay readable in the key so version and
+    namespace patterns can find it; only the request data is hashed.
+    """
+    # Keys only need to be well distributed, not cryptographic
+    return f"{version}:{endpoint}:{hashlib.blake2b(raw, digest_size=16).hexdigest()}"
+
+
+@lru_cache(maxsize=4096)
+def _warming_key(version: str, namespace: str, topic: str) -> str:
+    """Cache key for a warmed topic; repeated warm-ups reuse the hash"""
+    return _hash_key(version, namespace, {'topic': topic})
+
+
+class _Counter:
+    """
+    Thread-safe counter whose increments are a single next() on an
+    itertools.count, atomic without a lock; only reads take a lock
+    """
+    
+    def __init__(self):
+        self._count = count()
+        self._reads = 0
+        self._read_lock = threading.Lock()
+    
+    def increment(self):
+        next(self._count)
+    
+    def add(self, amount: int):
+        # Advance the iterator `amount` times in C
+        deque(islice(self._count, amount), maxlen=0)
+    
+    @property
+    def value(self) -> int:
+        # Each read advances the iterator once, so subtract earlier reads
+        with self._read_lock:
+            value = next(self._count) - self._reads
+            self._reads += 1
+        return value
+
+
+class _Flight:
+    """One in-progress get_or_compute call that other callers wait on"""
+    
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _LatencyShards:
+    """
+    Latency totals sharded per thread: each thread adds to its own
+    [total_ns, operations] pair without locking, and reads sum the shards.
+    Shards of finished threads are folded into a base total so the
+    registry only grows with the number of live threads.
+    """
+    
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, list]] = []
+        self._base = [0, 0]
+        self._lock = threading.Lock()
+    
+    def record(self, latency_ns: int):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = [0, 0]
+            with self._lock:
+                self._fold_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+        shard[0] += latency_ns
+        shard[1] += 1
+    
+    def totals(self) -> Tuple[int, int]:
+        """(total_ns, operations) across all threads"""
+        with self._lock:
+            self._fold_dead_shards()
+            total_ns, operations = self._base
+            for _, shard in self._shards:
+                total_ns += shard[0]
+                operations += shard[1]
+        return total_ns, operations
+    
+    def _fold_dead_shards(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._base[0] += shard[0]
+                self._base[1] += shard[1]
+        self._shards = live
+
 
 class RedisCache:
     """Redis-based cache with fallback to in-memory cache
@@ -36,139 +393,39 @@ class RedisCache:
     def __init__(self, config):
         """Initialize Redis cache or fallback to in-memory"""
         self.config = config
+        # Cache settings read on every operation, bound once
+        self._ttl = config.cache.ttl
+        self._max_size = config.cache.max_size
         self.redis_client = None
-        self.memory_cache = {}  # Fallback in-memory cache
+        self._pool = None  # Shared with other Redis users in the process
+        self.memory_cache = OrderedDict()  # Fallback in-memory cache, least recently used first
+        self._memory_lock = threading.Lock()
+        # Min-heap of (expires_at, key) so cleanup only visits expired entries;
+        # entries left behind by re-sets and deletes are skipped when popped
+        self._expiry_heap: List[Tuple[float, str]] = []
         self.cache_version = "v1.0"  # Version for invalidation strategy
         
-        # Enhanced statistics
-        self.stats = {
-            'hits': 0,
-            'misses': 0,
-            'sets': 0,
-            'deletes': 0,
-            'invalidations': 0,
-            'total_latency_ms': 0.0,
-            'operations': 0
-        }
+        # Enhanced statistics; counters are bumped from every request thread
+        self._hits = _Counter()
+        self._misses = _Counter()
+        self._sets = _Counter()
+        self._deletes = _Counter()
+        self._invalidations = _Counter()
+        self._latency = _LatencyShards()
+        self._op_seq = count()  # Picks which operations are timed
+        self._server_stats = None  # (expires_at, (info, memory_info, dbsize))
+        
+        # Queued set(sync=False) writes, flushed in pipelines by one writer thread
+        self._set_queue = queue.SimpleQueue()
+        self._set_worker = None
+        self._set_worker_lock = threading.Lock()
+        
+        # In-progress get_or_compute calls by key; dropped when the call ends
+        self._inflight: Dict[str, _Flight] = {}
+        self._inflight_lock = threading.Lock()
         
         # Popular topics for cache warming (Top 100)
-        self.popular_topics = [
-            # Programming Languages (20)
-            "Python Programming",
-            "JavaScript",
-            "Java Programming",
-            "C++ Programming",
-            "C Programming",
-            "C# Programming",
-            "Go Programming",
-            "Rust Programming",
-            "TypeScript",
-            "PHP Programming",
-            "Ruby Programming",
-            "Swift Programming",
-            "Kotlin Programming",
-            "R Programming",
-            "MATLAB",
-            "SQL Programming",
-            "Scala Programming",
-            "Perl Programming",
-            "Dart Programming",
-            "Assembly Language",
-            
-            # Web Development (15)
-            "Web Development",
-            "Frontend Development",
-            "Backend Development",
-            "Full Stack Development",
-            "React",
-            "Angular",
-            "Vue.js",
-            "Node.js",
-            "Django",
-            "Flask",
-            "Spring Boot",
-            "ASP.NET",
-            "REST API",
-            "GraphQL",
-            "Web Security",
-            
-            # Data Science & AI (15)
-            "Machine Learning",
-            "Artificial Intelligence",
-            "Deep Learning",
-            "Neural Networks",
-            "Natural Language Processing",
-            "Computer Vision",
-            "Data Science",
-            "Data Analytics",
-            "Big Data",
-            "TensorFlow",
-            "PyTorch",
-            "Keras",
-            "Scikit-learn",
-            "Pandas",
-            "NumPy",
-            
-            # Computer Science Fundamentals (15)
-            "Data Structures",
-            "Algorithms",
-            "Operating Systems",
-            "Computer Networks",
-            "Database Management",
-            "Computer Architecture",
-            "Compiler Design",
-            "Theory of Computation",
-            "Discrete Mathematics",
-            "Linear Algebra",
-            "Probability and Statistics",
-            "Calculus",
-            "Software Engineering",
-            "Design Patterns",
-            "Object Oriented Programming",
-            
-            # Mobile & Cloud (10)
-            "Android Development",
-            "iOS Development",
-            "React Native",
-            "Flutter",
-            "Cloud Computing",
-            "AWS",
-            "Azure",
-            "Google Cloud",
-            "Docker",
-            "Kubernetes",
-            
-            # DevOps & Tools (10)
-            "DevOps",
-            "Git Version Control",
-            "CI/CD",
-            "Jenkins",
-            "Linux Administration",
-            "Shell Scripting",
-            "Ansible",
-            "Terraform",
-            "Monitoring and Logging",
-            "Microservices",
-            
-            # Security & Blockchain (10)
-            "Cybersecurity",
-            "Ethical Hacking",
-            "Cryptography",
-            "Network Security",
-            "Blockchain",
-            "Smart Contracts",
-            "Penetration Testing",
-            "Security Testing",
-            "OAuth and Authentication",
-            "GDPR and Compliance",
-            
-            # Emerging Technologies (5)
-            "Internet of Things",
-            "Edge Computing",
-            "Quantum Computing",
-            "Augmented Reality",
-            "Virtual Reality"
-        ]
+        self.popular_topics = _POPULAR_TOPICS
         
         # Start cleanup thread for memory cache
         self.cleanup_thread = None
@@ -176,16 +433,22 @@ class RedisCache:
         
         if config.redis.enabled and REDIS_AVAILABLE:
             try:
-                self.redis_client = redis.Redis(
+                # Blocking pool: under saturation callers wait for a free
+                # connection instead of failing with ConnectionError
+                self._pool = redis.BlockingConnectionPool(
                     host=config.redis.host,
                     port=config.redis.port,
                     db=config.redis.db,
                     password=config.redis.password,
                     socket_timeout=config.redis.socket_timeout,
                     socket_connect_timeout=config.redis.socket_connect_timeout,
+                    socket_keepalive=True,
+                    health_check_interval=config.redis.health_check_interval,
                     max_connections=config.redis.max_connections,
-                    decode_responses=True  # Return strings instead of bytes
+                    timeout=config.redis.pool_timeout,
+                    decode_responses=False  # Values are JSON bytes, parsed without decoding to str first
                 )
+                self.redis_client = redis.Redis(connection_pool=self._pool)
                 # Test connection
                 self.redis_client.ping()
                 logger.info("Redis cache initialized successfully", extra={
@@ -198,6 +461,9 @@ class RedisCache:
                     'error': str(e)
                 })
                 self.redis_client = None
+                if self._pool:
+                    self._pool.disconnect()
+                    self._pool = None
         else:
             logger.info("Using in-memory cache (Redis disabled or unavailable)")
         
@@ -222,83 +488,268 @@ class RedisCache:
     
     def _generate_key(self, endpoint: str, data: dict) -> str:
         """Generate versioned cache key from endpoint and data"""
-        cache_str = f"{self.cache_version}:{endpoint}:{json.dumps(data, sort_keys=True)}"
-        return hashlib.md5(cache_str.encode()).hexdigest()
+        return _hash_key(self.cache_version, endpoint, data)
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache with latency tracking"""
-        start_time = time.time()
+        start_ns = self._sample_start()
         
         try:
-            if self.redis_client:
-                # Get from Redis
-                value = self.redis_client.get(key)
-                if value:
-                    self.stats['hits'] += 1
-                    self._track_latency(start_time)
-                    return json.loads(value)
-                else:
-                    self.stats['misses'] += 1
-            else:
-                # Get from memory cache
-                if key in self.memory_cache:
-                    entry = self.memory_cache[key]
-                    if time.time() - entry['timestamp'] < self.config.cache.ttl:
-                        self.stats['hits'] += 1
-                        self._track_latency(start_time)
-                        return entry['data']
-                    else:
-                        # Expired, remove it
-                        del self.memory_cache[key]
-                        self.stats['misses'] += 1
-                else:
-                    self.stats['misses'] += 1
-            
-            return None
+            value = self._lookup(key)
         except Exception as e:
             logger.error("Cache get error", extra={'key': key, 'error': str(e)})
-            self.stats['misses'] += 1
+            self._misses.increment()
+            return None
+        
+        if value is None:
+            self._misses.increment()
             return None
+        self._hits.increment()
+        self._track_latency(start_ns)
+        return value
+    
+    def _lookup(self, key: str) -> Optional[Any]:
+        """Read a value without touching the statistics"""
+        if self.redis_client:
+            value = self.redis_client.get(key)
+            return _decode(value) if value else None
+        
+        with self._memory_lock:
+            entry = self.memory_cache.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['timestamp'] >= self._ttl:
+                # Expired, remove it
+                del self.memory_cache[key]
+                return None
+            self.memory_cache.move_to_end(key)
+        return entry['data']
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set value in cache with optional TTL and latency tracking"""
-        start_time = time.time()
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, sync: bool = True) -> bool:
+        """
+        Set value in cache with optional TTL and latency tracking
+        
+        With sync=False and Redis enabled the serialized value is queued and
+        written by a background thread in a pipelined batch; the call
+        returns without a round trip, so a get() right after may still miss.
+        """
+        start_ns = self._sample_start()
         
         try:
-            ttl = ttl or self.config.cache.ttl
+            ttl = ttl or self._ttl
+            
+            if self.redis_client and not sync:
+                # Serialize here so later changes to value can't leak into the write
+                self._set_queue.put((key, ttl, _encode(value)))
+                self._ensure_set_worker()
+                self._track_latency(start_ns)
+                return True
             
             if self.redis_client:
                 # Set in Redis with expiration
                 self.redis_client.setex(
                     key,
                     ttl,
-                    json.dumps(value)
+                    _encode(value)
                 )
             else:
-                # Set in memory cache
-                self.memory_cache[key] = {
-                    'data': value,
-                    'timestamp': time.time()
-                }
-                # Note: Cleanup is now handled by background thread
+                # Set in memory cache, evicting least recently used entries
+                # beyond max_size; expiry is handled by the background thread
+                timestamp = time.time()
+                with self._memory_lock:
+                    self.memory_cache[key] = {
+                        'data': value,
+                        'timestamp': timestamp
+                    }
+                    self.memory_cache.move_to_end(key)
+                    while len(self.memory_cache) > self._max_size:
+                        self.memory_cache.popitem(last=False)
+                    heapq.heappush(self._expiry_heap, (timestamp + self._ttl, key))
+                    # Rebuild once stale heap entries outnumber live ones
+                    if len(self._expiry_heap) > 2 * len(self.memory_cache) + 64:
+                        self._rebuild_expiry_heap()
             
-            self.stats['sets'] += 1
-            self._track_latency(start_time)
+            self._sets.increment()
+            self._track_latency(start_ns)
             return True
         except Exception as e:
             logger.error("Cache set error", extra={'key': key, 'error': str(e)})
             return False
     
+    def _ensure_set_worker(self):
+        """Start the background writer on first use"""
+        if self._set_worker is not None:
+            return
+        with self._set_worker_lock:
+            if self._set_worker is None:
+                self._set_worker = threading.Thread(
+                    target=self._drain_sets, name="cache-set-writer", daemon=True
+                )
+                self._set_worker.start()
+    
+    def _drain_sets(self):
+        """Flush queued writes, up to WRITE_BATCH_SIZE per pipeline"""
+        while True:
+            item = self._set_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    item = self._set_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            try:
+                with self.redis_client.pipeline(transaction=False) as pipe:
+                    for key, ttl, payload in batch:
+                        pipe.setex(key, ttl, payload)
+                    pipe.execute()
+                self._sets.add(len(batch))
+            except Exception as e:
+                logger.error("Cache set error", extra={'keys': len(batch), 'error': str(e)})
+            
+            if stop:
+                return
+    
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Get several values in one round trip
+        
+        Args:
+            keys: Cache keys
+        
+        Returns:
+            Values in key order, None for misses
+        """
+        if not keys:
+            return []
+        if not self.redis_client:
+            return [self.get(key) for key in keys]
+        
+        try:
+            raw = self.redis_client.mget(keys)
+        except Exception as e:
+            logger.error("Cache mget error", extra={'keys': len(keys), 'error': str(e)})
+            self._misses.add(len(keys))
+            return [None] * len(keys)
+        
+        values = []
+        for key, payload in zip(keys, raw):
+            value = None
+            if payload:
+                try:
+                    value = _decode(payload)
+                except Exception as e:
+                    logger.error("Cache get error", extra={'key': key, 'error': str(e)})
+            if value is None:
+                self._misses.increment()
+            else:
+                self._hits.increment()
+            values.append(value)
+        return values
+    
+    def mset(self, mapping: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """
+        Set several values in one round trip (pipelined SETEX; Redis has no MSETEX)
+        
+        Args:
+            mapping: Dict of {key: value}
+            ttl: Optional TTL applied to every key
+        
+        Returns:
+            True if all values were stored
+        """
+        if not mapping:
+            return True
+        if not self.redis_client:
+            return all([self.set(key, value, ttl) for key, value in mapping.items()])
+        
+        try:
+            ttl = ttl or self._ttl
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.setex(key, ttl, _encode(value))
+                pipe.execute()
+            self._sets.add(len(mapping))
+            return True
+        except Exception as e:
+            logger.error("Cache mset error", extra={'keys': len(mapping), 'error': str(e)})
+            return False
+    
+    def get_or_compute(self, key: str, factory: Callable[[], Any],
+                       ttl: Optional[int] = None,
+                       cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Get value from cache, computing and storing it on a miss
+        
+        Concurrent misses on the same key share one factory call: the first
+        caller runs it and the others wait for its result, whether or not
+        that result ends up cached. Waiters get the very same object, so
+        callers must treat it as read-only.
+        
+        Args:
+            key: Cache key
+            factory: Zero-argument callable producing the value
+            ttl: Optional TTL for the stored value
+            cacheable: Optional predicate; results it rejects are returned
+                but not stored
+        
+        Returns:
+            Cached or freshly computed value
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            # A call that finished just before ours may have filled the key;
+            # this re-check is not a new request, so it isn't counted
+            try:
+                value = self._lookup(key)
+            except Exception:
+                value = None
+            if value is None:
+                value = factory()
+                if cacheable is None or cacheable(value):
+                    self.set(key, value, ttl)
+            flight.result = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+    
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
         try:
             if self.redis_client:
                 self.redis_client.delete(key)
             else:
-                if key in self.memory_cache:
-                    del self.memory_cache[key]
+                with self._memory_lock:
+                    self.memory_cache.pop(key, None)
             
-            self.stats['deletes'] += 1
+            self._deletes.increment()
             return True
         except Exception as e:
             logger.error("Cache delete error", extra={'key': key, 'error': str(e)})
@@ -318,25 +769,27 @@ class RedisCache:
         
         try:
             if self.redis_client:
-                # Use SCAN for safe pattern matching in production
-                cursor = 0
-                while True:
-                    cursor, keys = self.redis_client.scan(cursor, match=pattern, count=100)
-                    if keys:
-                        deleted_count += self.redis_client.delete(*keys)
-                    if cursor == 0:
-                        break
+                # Use SCAN for safe pattern matching in production, and
+                # UNLINK so Redis frees the values off its main thread
+                batch = []
+                for key in self.redis_client.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+                    batch.append(key)
+                    if len(batch) >= SCAN_BATCH_SIZE:
+                        deleted_count += self.redis_client.unlink(*batch)
+                        batch = []
+                if batch:
+                    deleted_count += self.redis_client.unlink(*batch)
             else:
-                # Memory cache pattern matching
-                keys_to_delete = [
-                    k for k in self.memory_cache.keys()
-                    if self._matches_pattern(k, pattern)
-                ]
-                for key in keys_to_delete:
-                    del self.memory_cache[key]
+                # Memory cache pattern matching, compiled once with the same
+                # glob rules Redis applies to MATCH
+                matcher = re.compile(_glob_to_regex(pattern)).match
+                with self._memory_lock:
+                    keys_to_delete = [k for k in self.memory_cache if matcher(k)]
+                    for key in keys_to_delete:
+                        del self.memory_cache[key]
                 deleted_count = len(keys_to_delete)
             
-            self.stats['invalidations'] += deleted_count
+            self._invalidations.add(deleted_count)
             logger.info("Pattern-based deletion", extra={
                 'pattern': pattern,
                 'deleted': deleted_count
@@ -350,24 +803,6 @@ class RedisCache:
             })
             return 0
     
-    def _matches_pattern(self, key: str, pattern: str) -> bool:
-        """Simple wildcard pattern matching for memory cache"""
-        if '*' not in pattern:
-            return key == pattern
-        
-        # Convert wildcard pattern to regex-like matching
-        parts = pattern.split('*')
-        pos = 0
-        for part in parts:
-            if not part:
-                continue
-            idx = key.find(part, pos)
-            if idx == -1:
-                return False
-            pos = idx + len(part)
-        
-        return True
-    
     def invalidate_namespace(self, namespace: str) -> int:
         """
         Invalidate all entries in a namespace (HIGH priority fix)
@@ -398,29 +833,58 @@ class RedisCache:
         """
         Update cache version (invalidates all existing caches)
         
+        Old-version entries are not deleted: no lookup builds their keys any
+        more, so they just age out through their TTL (or Redis eviction).
+        Call purge_old_versions_async to reclaim the memory sooner.
+        
         Args:
             new_version: New version string
         """
         old_version = self.cache_version
         
-        # Delete old version entries
-        self.invalidate_version(old_version)
-        
-        # Update version
+        # Update version; warming keys for the old version are dead weight
         self.cache_version = new_version
+        _warming_key.cache_clear()
         
         logger.info("Cache version updated", extra={
             'old_version': old_version,
             'new_version': new_version
         })
     
+    def purge_old_versions_async(self, old_version: str) -> threading.Thread:
+        """
+        Delete entries of an old version in a background thread
+        
+        Meant for when memory is tight after a version bump; otherwise
+        letting the entries expire avoids the keyspace SCAN entirely.
+        
+        Args:
+            old_version: Version to purge
+        
+        Returns:
+            The started daemon thread
+        """
+        if old_version == self.cache_version:
+            raise ValueError("Cannot purge the current cache version")
+        
+        thread = threading.Thread(
+            target=self.invalidate_version,
+            args=(old_version,),
+            name=f"cache-purge-{old_version}",
+            daemon=True
+        )
+        thread.start()
+        return thread
+    
     def clear(self) -> bool:
         """Clear all cache entries"""
         try:
             if self.redis_client:
                 self.redis_client.flushdb()
             else:
-                self.memory_cache.clear()
+                with self._memory_lock:
+                    self.memory_cache.clear()
+                    self._expiry_heap.clear()
             logger.info("Cache cleared")
             return True
         except Exception as e:
@@ -432,26 +896,21 @@ class RedisCache:
         if not self.memory_cache:
             return
         
+        # Max size is enforced on set(); only expired entries are swept here
         current_time = time.time()
-        expired_keys = [
-            k for k, v in self.memory_cache.items()
-            if current_time - v['timestamp'] > self.config.cache.ttl
-        ]
-        
-        for key in expired_keys:
-            del self.memory_cache[key]
-        
-        # Also enforce max size by removing oldest entries
-        if len(self.memory_cache) > self.config.cache.max_size:
-            # Sort by timestamp and remove oldest
-            sorted_keys = sorted(
-                self.memory_cache.keys(),
-                key=lambda k: self.memory_cache[k]['timestamp']
-            )
-            
-            num_to_remove = len(self.memory_cache) - self.config.cache.max_size
-            for key in sorted_keys[:num_to_remove]:
-                del self.memory_cache[key]
+        ttl = self._ttl
+        expired_keys = []
+        with self._memory_lock:
+            heap = self._expiry_heap
+            memory_cache = self.memory_cache
+            heappop = heapq.heappop
+            while heap and heap[0][0] < current_time:
+                _, key = heappop(heap)
+                entry = memory_cache.get(key)
+                # Skip keys that were deleted or re-set since this heap entry
+                if entry is not None and current_time - entry['timestamp'] > ttl:
+                    del memory_cache[key]
+                    expired_keys.append(key)
         
         if expired_keys:
             logger.debug("Memory cache cleaned", extra={
@@ -459,6 +918,14 @@ class RedisCache:
                 'current_size': len(self.memory_cache)
             })
     
+    def _rebuild_expiry_heap(self):
+        """Rebuild the expiry heap from live entries (caller holds _memory_lock)"""
+        ttl = self._ttl
+        self._expiry_heap = [
+            (entry['timestamp'] + ttl, key) for key, entry in self.memory_cache.items()
+        ]
+        heapq.heapify(self._expiry_heap)
+    
     def warm_cache(self, warmup_functions: Dict[str, Callable]) -> int:
         """
         Warm cache with popular topics (MEDIUM priority fix)
@@ -477,31 +944,32 @@ class RedisCache:
         
         warmed_count = 0
         
-        for topic in self.popular_topics:
-            for namespace, warmup_func in warmup_functions.items():
-                try:
-                    # Generate cache data
-                    data = {'topic': topic}
-                    key = self._generate_key(namespace, data)
-                    
-                    # Skip if already cached
-                    if self.get(key):
-                        continue
-                    
-                    # Generate value
-                    value = warmup_func(topic)
+        if self.redis_client:
+            warmed_count = self._warm_redis(warmup_functions)
+        else:
+            for topic in self.popular_topics:
+                for namespace, warmup_func in warmup_functions.items():
+                    try:
+                        key = _warming_key(self.cache_version, namespace, topic)
+                        
+                        # Skip if already cached
+                        if self.get(key):
+                            continue
+                        
+                        # Generate value
+                        value = warmup_func(topic)
+                        
+                        if value:
+                            # Cache with default TTL
+                            self.set(key, value)
+                            warmed_count += 1
                     
-                    if value:
-                        # Cache with default TTL
-                        self.set(key, value)
-                        warmed_count += 1
-                
-                except Exception as e:
-                    logger.error("Cache warming error", extra={
-                        'topic': topic,
-                        'namespace': namespace,
-                        'error': str(e)
-                    })
+                    except Exception as e:
+                        logger.error("Cache warming error", extra={
+                            'topic': topic,
+                            'namespace': namespace,
+                            'error': str(e)
+                        })
         
         logger.info("Cache warming complete", extra={
             'warmed_entries': warmed_count,
@@ -510,42 +978,135 @@ class RedisCache:
         
         return warmed_count
     
-    def _track_latency(self, start_time: float):
+    def _pipeline_exists(self, keys: List[str]) -> List[bool]:
+        """Check which keys exist in Redis with a single round trip"""
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.exists(key)
+            return [bool(found) for found in pipe.execute()]
+    
+    def _warm_redis(self, warmup_functions: Dict[str, Callable]) -> int:
+        """
+        Warm Redis in two round trips: one pipeline of EXISTS checks for
+        every (topic, namespace) key, then one mset of the entries that
+        were missing
+        """
+        entries = [
+            (topic, namespace, warmup_func, _warming_key(self.cache_version, namespace, topic))
+            for topic in self.popular_topics
+            for namespace, warmup_func in warmup_functions.items()
+        ]
+        try:
+            cached = self._pipeline_exists([key for _, _, _, key in entries])
+        except Exception as e:
+            logger.error("Cache warming error", extra={'error': str(e)})
+            return 0
+        
+        warmed = {}
+        for (topic, namespace, warmup_func, key), exists in zip(entries, cached):
+            if exists:
+                continue
+            try:
+                value = warmup_func(topic)
+                if value:
+                    warmed[key] = value
+            except Exception as e:
+                logger.error("Cache warming error", extra={
+                    'topic': topic,
+                    'namespace': namespace,
+                    'error': str(e)
+                })
+        
+        if not warmed or not self.mset(warmed):
+            return 0
+        return len(warmed)
+    
+    def _sample_start(self) -> Optional[int]:
+        """Start time for one in LATENCY_SAMPLE_RATE operations, else None"""
+        if next(self._op_seq) & _LATENCY_SAMPLE_MASK:
+            return None
+        return time.monotonic_ns()
+    
+    def _track_latency(self, start_ns: Optional[int]):
         """Track operation latency (LOW priority fix)"""
-        latency_ms = (time.time() - start_time) * 1000
-        self.stats['total_latency_ms'] += latency_ms
-        self.stats['operations'] += 1
+        if start_ns is not None:
+            self._latency.record(time.monotonic_ns() - start_ns)
+    
+    @property
+    def stats(self) -> dict:
+        """
+        Snapshot of the operation counters
+        
+        Latency is timed for one in LATENCY_SAMPLE_RATE operations, so
+        total_latency_ns, total_latency_ms and operations are estimates
+        scaled up from the sample (flagged by latency_estimated).
+        """
+        total_latency_ns, operations = self._latency.totals()
+        total_latency_ns *= LATENCY_SAMPLE_RATE
+        operations *= LATENCY_SAMPLE_RATE
+        return {
+            'hits': self._hits.value,
+            'misses': self._misses.value,
+            'sets': self._sets.value,
+            'deletes': self._deletes.value,
+            'invalidations': self._invalidations.value,
+            'total_latency_ns': total_latency_ns,
+            'total_latency_ms': total_latency_ns / 1e6,
+            'operations': operations,
+            'latency_estimated': True,
+            'latency_sample_rate': LATENCY_SAMPLE_RATE
+        }
+    
+    def _redis_server_stats(self) -> tuple:
+        """
+        INFO stats, INFO memory and DBSIZE in one pipelined round trip,
+        reused for STATS_CACHE_TTL so frequent polling doesn't hit Redis
+        """
+        now = time.monotonic()
+        cached = self._server_stats
+        if cached and now < cached[0]:
+            return cached[1]
+        
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.info('stats')
+            pipe.info('memory')
+            pipe.dbsize()
+            result = tuple(pipe.execute())
+        self._server_stats = (now + STATS_CACHE_TTL, result)
+        return result
     
     def get_stats(self) -> dict:
         """Get comprehensive cache statistics (LOW priority fix)"""
         try:
-            total_requests = self.stats['hits'] + self.stats['misses']
+            stats = self.stats
+            total_requests = stats['hits'] + stats['misses']
             hit_rate = 0.0
             avg_latency_ms = 0.0
             
             if total_requests > 0:
-                hit_rate = (self.stats['hits'] / total_requests) * 100
+                hit_rate = (stats['hits'] / total_requests) * 100
             
-            if self.stats['operations'] > 0:
-                avg_latency_ms = self.stats['total_latency_ms'] / self.stats['operations']
+            if stats['operations'] > 0:
+                # Estimated from sampled operations (see stats)
+                avg_latency_ms = stats['total_latency_ms'] / stats['operations']
             
             if self.redis_client:
                 try:
-                    info = self.redis_client.info('stats')
-                    memory_info = self.redis_client.info('memory')
+                    info, memory_info, dbsize = self._redis_server_stats()
                     
                     return {
                         'type': 'redis',
                         'version': self.cache_version,
-                        'hits': self.stats['hits'],
-                        'misses': self.stats['misses'],
+                        'hits': stats['hits'],
+                        'misses': stats['misses'],
                         'hit_rate_percent': round(hit_rate, 2),
                         'total_requests': total_requests,
-                        'sets': self.stats['sets'],
-                        'deletes': self.stats['deletes'],
-                        'invalidations': self.stats['invalidations'],
+                        'sets': stats['sets'],
+                        'deletes': stats['deletes'],
+                        'invalidations': stats['invalidations'],
                         'avg_latency_ms': round(avg_latency_ms, 2),
-                        'keys': self.redis_client.dbsize(),
+                        'latency_sample_rate': LATENCY_SAMPLE_RATE,
+                        'keys': dbsize,
                         'memory_used_mb': round(memory_info.get('used_memory', 0) / 1024 / 1024, 2),
                         'redis_stats': {
                             'keyspace_hits': info.get('keyspace_hits', 0),
@@ -559,8 +1120,8 @@ class RedisCache:
                     return {
                         'type': 'redis',
                         'version': self.cache_version,
-                        'hits': self.stats['hits'],
-                        'misses': self.stats['misses'],
+                        'hits': stats['hits'],
+                        'misses': stats['misses'],
                         'hit_rate_percent': round(hit_rate, 2),
                         'error': str(e)
                     }
@@ -568,16 +1129,17 @@ class RedisCache:
                 return {
                     'type': 'memory',
                     'version': self.cache_version,
-                    'hits': self.stats['hits'],
-                    'misses': self.stats['misses'],
+                    'hits': stats['hits'],
+                    'misses': stats['misses'],
                     'hit_rate_percent': round(hit_rate, 2),
                     'total_requests': total_requests,
-                    'sets': self.stats['sets'],
-                    'deletes': self.stats['deletes'],
-                    'invalidations': self.stats['invalidations'],
+                    'sets': stats['sets'],
+                    'deletes': stats['deletes'],
+                    'invalidations': stats['invalidations'],
                     'avg_latency_ms': round(avg_latency_ms, 2),
+                    'latency_sample_rate': LATENCY_SAMPLE_RATE,
                     'keys': len(self.memory_cache),
-                    'max_size': self.config.cache.max_size,
+                    'max_size': self._max_size,
                     'cleanup_thread_alive': self.cleanup_thread.is_alive() if self.cleanup_thread else False
                 }
         except Exception as e:
@@ -617,14 +1179,50 @@ class RedisCache:
             self.cleanup_thread.join(timeout=2)
             logger.info("Cache cleanup thread stopped")
         
+        if self._set_worker:
+            # Flush queued writes before the connection goes away
+            self._set_queue.put(None)
+            self._set_worker.join(timeout=2)
+            self._set_worker = None
+        
         if self.redis_client:
             try:
                 self.redis_client.close()
+                if self._pool:
+                    self._pool.disconnect()
                 logger.info("Redis connection closed")
             except Exception as e:
                 logger.error("Error closing Redis", extra={'error': str(e)})
 
 
+def _is_cacheable_response(result: Any) -> bool:
+    """Only successful (body, 200, headers) snapshots are cached"""
+    return isinstance(result, tuple) and len(result) >= 2 and result[1] == 200
+
+
+def _snapshot_response(result: Any) -> Tuple[str, int, List[List[str]]]:
+    """
+    Reduce an endpoint's return value to plain (body, status, headers) data
+    
+    Callers sharing one computation each build their own Response from the
+    snapshot, so headers and cookies set per request never leak between
+    them. Set-Cookie is dropped because it belongs to the computing request.
+    """
+    from flask import make_response
+    
+    response = make_response(result)
+    headers = [[name, value] for name, value in response.headers.items() if name.lower() != 'set-cookie']
+    return response.get_data(as_text=True), response.status_code, headers
+
+
+def _build_response(snapshot: Sequence) -> Any:
+    """Build a fresh Response from a snapshot (a list once read back from Redis)"""
+    from flask import Response
+    
+    body, status, headers = snapshot
+    return Response(body, status=status, headers=[tuple(header) for header in headers])
+
+
 def cached_response(cache: RedisCache, ttl: Optional[int] = None):
     """Decorator for caching API responses using RedisCache"""
     def cached_response_decorator_redis(f):
@@ -632,27 +1230,36 @@ def cached_response(cache: RedisCache, ttl: Optional[int] = None):
         def wrapper(*args, **kwargs):
             from flask import request
             
-            # Generate cache key
-            request_data = request.get_json() or {}
-            cache_key = cache._generate_key(f.__name__, request_data)
+            if request.method not in CACHEABLE_METHODS:
+                return f(*args, **kwargs)
             
-            # Try to get from cache
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                logger.info("Cache hit", extra={'endpoint': f.__name__, 'key': cache_key[:16]})
-                return cached_data
+            # Generate cache key; a key failure must not fail the request
+            try:
+                if request.method != 'POST' and not request.content_length:
+                    # Bodyless GET/HEAD: the query string is the whole input
+                    cache_key = _raw_key(cache.cache_version, f.__name__, request.query_string)
+                else:
+                    body = request.get_data(cache=True)
+                    request_data = _loads(body) if body else {}
+                    cache_key = cache._generate_key(f.__name__, request_data or {})
+            except Exception as e:
+                logger.warning("Cache key error, skipping cache", extra={'endpoint': f.__name__, 'error': str(e)})
+                return f(*args, **kwargs)
+            
+            computed = False
             
-            # Cache miss - execute function
-            logger.info("Cache miss", extra={'endpoint': f.__name__, 'key': cache_key[:16]})
-            result = f(*args, **kwargs)
+            def compute():
+                nonlocal computed
+                computed = True
+                logger.info("Cache miss", extra={'endpoint': f.__name__, 'key': cache_key[:16]})
+                return _snapshot_response(f(*args, **kwargs))
             
-            # Cache successful responses
-            if isinstance(result, tuple):
-                response, status = result if len(result) == 2 else (result[0], result[1])
-                if status == 200:
-                    cache.set(cache_key, result, ttl)
+            # Only one request per key runs the endpoint; concurrent misses wait for it
+            snapshot = cache.get_or_compute(cache_key, compute, ttl, cacheable=_is_cacheable_response)
+            if not computed:
+                logger.info("Cache hit", extra={'endpoint': f.__name__, 'key': cache_key[:16]})
             
-            return result
+            return _build_response(snapshot)
         return wrapper
     return cached_response_decorator_redis
 
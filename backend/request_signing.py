@@ -25,6 +25,8 @@ Client-side signing (JavaScript example):
 import hmac
 import hashlib
 import time
+import threading
+from collections import OrderedDict
 from functools import wraps
 from flask import request, jsonify, current_app
 from typing import Optional, Tuple
@@ -35,6 +37,31 @@ logger = logging.getLogger(__name__)
 # Signature validity window (5 minutes)
 SIGNATURE_VALIDITY_WINDOW = 300
 
+# Keyed HMAC states kept for reuse, least recently used evicted first
+HMAC_KEY_CACHE_SIZE = 1024
+
+_hmac_key_cache: "OrderedDict[bytes, hmac.HMAC]" = OrderedDict()
+_hmac_key_lock = threading.Lock()
+
+
+def _keyed_hmac(key: bytes) -> hmac.HMAC:
+    """
+    Fresh HMAC-SHA256 for a key, copied from a cached keyed state so the
+    key padding and the two pad-block hashes run once per key
+    """
+    with _hmac_key_lock:
+        base = _hmac_key_cache.get(key)
+        if base is not None:
+            _hmac_key_cache.move_to_end(key)
+            return base.copy()
+    
+    base = hmac.new(key, digestmod=hashlib.sha256)
+    with _hmac_key_lock:
+        _hmac_key_cache[key] = base
+        if len(_hmac_key_cache) > HMAC_KEY_CACHE_SIZE:
+            _hmac_key_cache.popitem(last=False)
+        return base.copy()
+
 
 def generate_signature(api_key: str, method: str, path: str, timestamp: str, body: str = "") -> str:
     """
@@ -54,13 +81,10 @@ def generate_signature(api_key: str, method: str, path: str, timestamp: str, bod
     signing_string = f"{method}:{path}:{timestamp}:{body}"
     
     # Generate HMAC signature
-    signature = hmac.new(
-        api_key.encode('utf-8'),
-        signing_string.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
+    mac = _keyed_hmac(api_key.encode('utf-8'))
+    mac.update(signing_string.encode('utf-8'))
     
-    return signature
+    return mac.hexdigest()
 
 
 def verify_signature(api_key: str, signature: str, method: str, path: str, timestamp: str, body: str = "") -> Tuple[bool, Optional[str]]:
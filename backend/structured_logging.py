@@ -6,14 +6,19 @@ Task 3.3: Implement structured logging with JSON format, rotation, and context
 ✅ SECURITY FIX: Integrated log sanitization to prevent PII leakage
 """
 
+import atexit
 import logging
 import json
+import os
+import queue
 import sys
+import threading
 import time
 import inspect
+import weakref
 from datetime import datetime
-from typing import Any, Dict, Optional
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+from typing import Any, Dict, List, Optional, Tuple
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
 from flask import has_request_context, g, request
 
 # ✅ SECURITY: Import sanitization module
@@ -24,6 +29,16 @@ except ImportError:
     LOG_SANITIZATION_ENABLED = False
     print("WARNING: log_sanitizer not available, sensitive data may be logged")
 
+def _request_info() -> Dict[str, Any]:
+    """Request fields included in every log line"""
+    return {
+        'method': request.method,
+        'path': request.path,
+        'remote_addr': request.remote_addr,
+        'request_id': getattr(g, 'request_id', None),
+    }
+
+
 class StructuredFormatter(logging.Formatter):
     """
     Custom formatter that outputs logs in JSON format
@@ -42,14 +57,13 @@ class StructuredFormatter(logging.Formatter):
             'line': record.lineno,
         }
         
-        # Add request context if available
-        if has_request_context():
-            log_data['request'] = {
-                'method': request.method,
-                'path': request.path,
-                'remote_addr': request.remote_addr,
-                'request_id': getattr(g, 'request_id', None),
-            }
+        # Add request context if available (captured up front when the
+        # record was queued from a request thread)
+        request_info = getattr(record, 'request_info', None)
+        if request_info is None and has_request_context():
+            request_info = _request_info()
+        if request_info is not None:
+            log_data['request'] = request_info
         
         # Add exception info if present
         if record.exc_info:
@@ -69,6 +83,109 @@ class StructuredFormatter(logging.Formatter):
         
         return json.dumps(log_data)
 
+# Write log records from a background thread so request threads only enqueue.
+# Set STRUCTURED_LOG_ASYNC=false to write synchronously (e.g. when debugging).
+ASYNC_LOGGING = os.getenv('STRUCTURED_LOG_ASYNC', 'true').lower() == 'true'
+
+# One listener per distinct set of output handlers, shared by all loggers,
+# plus the queue handlers feeding it (re-pointed at a fresh queue after fork)
+_listeners: Dict[Tuple[Optional[str], int, int], Tuple[QueueListener, 'weakref.WeakSet[QueueHandler]']] = {}
+_listeners_lock = threading.Lock()
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps records intact for the listener to format
+    
+    Flask request details are only available on the request thread, so
+    they are captured onto the record here; formatting and I/O then
+    happen on the listener thread.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if has_request_context():
+            record.request_info = _request_info()
+        # Render the message now so the record carries no live objects
+        # across to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _stop_listeners():
+    """Drain and stop every listener (interpreter shutdown)"""
+    for listener, _ in list(_listeners.values()):
+        listener.stop()
+
+
+def _restart_listeners_after_fork():
+    """
+    Give a forked child its own queues and listener threads
+    
+    fork() copies the queues but not the listener threads, so without this
+    a worker forked from a preloaded app (gunicorn preload_app) would
+    enqueue records that are never written.
+    """
+    global _listeners_lock
+    _listeners_lock = threading.Lock()
+    for key, (old_listener, queue_handlers) in list(_listeners.items()):
+        log_queue = queue.Queue(-1)
+        listener = QueueListener(log_queue, *old_listener.handlers)
+        for handler in list(queue_handlers):
+            handler.queue = log_queue
+        listener.start()
+        _listeners[key] = (listener, queue_handlers)
+
+
+atexit.register(_stop_listeners)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listeners_after_fork)
+
+
+def _build_handlers(log_file: Optional[str], max_bytes: int, backup_count: int) -> List[logging.Handler]:
+    """Create the console (and optional rotating file) output handlers"""
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(StructuredFormatter())
+    handlers = [console_handler]
+    
+    if log_file:
+        file_handler = RotatingFileHandler(
+            log_file,
+            maxBytes=max_bytes,
+            backupCount=backup_count
+        )
+        file_handler.setFormatter(StructuredFormatter())
+        handlers.append(file_handler)
+    
+    return handlers
+
+
+def _attach_handlers(logger: logging.Logger, log_file: Optional[str],
+                     max_bytes: int, backup_count: int):
+    """
+    Attach output handlers to logger
+    
+    With ASYNC_LOGGING the logger gets a ContextQueueHandler feeding a
+    shared QueueListener that owns the real handlers.
+    """
+    if not ASYNC_LOGGING:
+        for handler in _build_handlers(log_file, max_bytes, backup_count):
+            logger.addHandler(handler)
+        return
+    
+    key = (log_file, max_bytes, backup_count)
+    with _listeners_lock:
+        if key not in _listeners:
+            listener = QueueListener(queue.Queue(-1), *_build_handlers(log_file, max_bytes, backup_count))
+            listener.start()
+            _listeners[key] = (listener, weakref.WeakSet())
+        listener, queue_handlers = _listeners[key]
+        handler = ContextQueueHandler(listener.queue)
+        queue_handlers.add(handler)
+    
+    logger.addHandler(handler)
+
+
 class StructuredLogger:
     """
     Enhanced wrapper around Python's logging module for structured logging
@@ -85,20 +202,8 @@ class StructuredLogger:
         # Remove existing handlers
         self.logger.handlers = []
         
-        # Add console handler with structured formatter
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(StructuredFormatter())
-        self.logger.addHandler(console_handler)
-        
-        # Add file handler with rotation if log_file specified
-        if log_file:
-            file_handler = RotatingFileHandler(
-                log_file,
-                maxBytes=max_bytes,
-                backupCount=backup_count
-            )
-            file_handler.setFormatter(StructuredFormatter())
-            self.logger.addHandler(file_handler)
+        # Console handler (plus rotating file handler if log_file specified)
+        _attach_handlers(self.logger, log_file, max_bytes, backup_count)
         
         # Context storage for thread-local context
         self._context = {}
@@ -227,17 +332,27 @@ class StructuredLogger:
         
         return {'extra_fields': context}
     
+    def isEnabledFor(self, level: int) -> bool:
+        """Whether a message at level would be logged, to skip building costly extras"""
+        return self.logger.isEnabledFor(level)
+    
+    # Context (caller frame, request info) is only collected for messages
+    # that will actually be logged
+    
     def debug(self, message: str, extra: Optional[Dict[str, Any]] = None):
         """Log debug message"""
-        self.logger.debug(message, extra=self._add_context(extra))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(message, extra=self._add_context(extra))
     
     def info(self, message: str, extra: Optional[Dict[str, Any]] = None):
         """Log info message"""
-        self.logger.info(message, extra=self._add_context(extra))
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(message, extra=self._add_context(extra))
     
     def warning(self, message: str, extra: Optional[Dict[str, Any]] = None):
         """Log warning message"""
-        self.logger.warning(message, extra=self._add_context(extra))
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(message, extra=self._add_context(extra))
     
     def error(self, message: str, extra: Optional[Dict[str, Any]] = None, exc_info: bool = False):
         """Log error message"""
@@ -288,17 +403,5 @@ def configure_root_logger(level: str = 'INFO', log_file: Optional[str] = None):
     # Remove existing handlers
     root_logger.handlers = []
     
-    # Add console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(StructuredFormatter())
-    root_logger.addHandler(console_handler)
-    
-    # Add file handler if specified
-    if log_file:
-        file_handler = RotatingFileHandler(
-            log_file,
-            maxBytes=10 * 1024 * 1024,  # 10MB
-            backupCount=5
-        )
-        file_handler.setFormatter(StructuredFormatter())
-        root_logger.addHandler(file_handler)
+    # Add console handler (and file handler if specified)
+    _attach_handlers(root_logger, log_file, 10 * 1024 * 1024, 5)
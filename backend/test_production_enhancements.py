@@ -42,7 +42,7 @@ class TestQuotaTracker:
         assert tracker.config.requests_per_day == 1500
         assert tracker.config.get_safe_rpm() == 12  # 15 * 0.8
         assert tracker.config.get_safe_rpd() == 1200  # 1500 * 0.8
-        assert len(tracker.queues) == 4  # One queue per priority
+        assert len(tracker.get_stats()['queue']) == 4  # One count per priority
         print("✅ Quota tracker initialization")
     
     def test_can_make_request_success(self):
@@ -86,29 +86,54 @@ class TestQuotaTracker:
         assert "TPM limit" in reason
         print("✅ TPM limit enforcement")
     
+    def test_disabled_limits(self):
+        """Test limits set to None are not enforced"""
+        config = QuotaConfig(requests_per_minute=2, rpm_safety_margin=1.0, tokens_per_minute=None, tokens_per_day=None)
+        tracker = QuotaTracker(config)
+        
+        tracker.record_request(10_000_000)
+        can_proceed, reason = tracker.can_make_request(estimated_tokens=10_000_000)
+        assert can_proceed == True
+        
+        # Enabled limits still apply
+        tracker.record_request(1)
+        can_proceed, reason = tracker.can_make_request(estimated_tokens=1)
+        assert can_proceed == False
+        assert "RPM limit" in reason
+        assert tracker.get_stats()['tokens']['per_minute']['percentage'] is None
+        print("✅ Disabled limits")
+    
     def test_request_recording(self):
         """Test accurate request recording"""
         tracker = QuotaTracker()
         
-        assert len(tracker.requests_minute) == 0
+        assert tracker.get_stats()['requests']['per_minute']['current'] == 0
         tracker.record_request(1500)
-        assert len(tracker.requests_minute) == 1
+        assert tracker.get_stats()['requests']['per_minute']['current'] == 1
+        assert tracker.get_stats()['tokens']['per_day']['current'] == 1500
         assert tracker.total_requests == 1
         print("✅ Request recording")
     
     def test_sliding_window_cleanup(self):
-        """Test old records are cleaned from sliding windows"""
+        """Test the minute window weights the previous minute by its overlap"""
         tracker = QuotaTracker()
-        
-        # Add old request (70 seconds ago)
-        old_time = time.time() - 70
-        tracker.requests_minute.append(old_time)
-        
-        # Clean old records
-        tracker._clean_old_records()
-        
-        # Old request should be removed (outside 60s window)
-        assert len(tracker.requests_minute) == 0
+        minute_start = (time.monotonic() // 60 + 1) * 60
+        
+        with patch('quota_tracker._now', return_value=minute_start + 10):
+            tracker.record_request(100)
+        
+        # Halfway through the next minute, half of the previous one counts
+        with patch('quota_tracker._now', return_value=minute_start + 90):
+            stats = tracker.get_stats()
+        assert stats['requests']['per_minute']['current'] == 1
+        assert stats['tokens']['per_minute']['current'] == 50
+        
+        # Two minutes on the request is outside the minute window, still in the day
+        with patch('quota_tracker._now', return_value=minute_start + 121):
+            stats = tracker.get_stats()
+        assert stats['requests']['per_minute']['current'] == 0
+        assert stats['tokens']['per_minute']['current'] == 0
+        assert stats['tokens']['per_day']['current'] == 100
         print("✅ Sliding window cleanup")
     
     def test_fallback_cache(self):
@@ -141,6 +166,20 @@ class TestQuotaTracker:
         assert cached is None
         print("✅ Fallback cache expiration")
     
+    def test_fallback_cache_lru_bound(self):
+        """Test fallback cache evicts least recently used entries"""
+        config = QuotaConfig(fallback_cache_max_entries=2)
+        tracker = QuotaTracker(config)
+        
+        tracker.cache_response("a", 1)
+        tracker.cache_response("b", 2)
+        assert tracker.get_fallback_response("a") == 1  # "a" is now most recent
+        tracker.cache_response("c", 3)
+        
+        assert list(tracker.fallback_cache) == ["a", "c"]
+        assert tracker.get_fallback_response("b") is None
+        print("✅ Fallback cache LRU bound")
+    
     def test_request_queuing(self):
         """Test request queuing when quota exceeded"""
         tracker = QuotaTracker()
@@ -153,7 +192,7 @@ class TestQuotaTracker:
         )
         
         assert queued == True
-        assert len(tracker.queues[RequestPriority.HIGH]) == 1
+        assert tracker.get_stats()['queue']['HIGH'] == 1
         assert tracker.queued_requests == 1
         print("✅ Request queuing")
     
@@ -170,6 +209,13 @@ class TestQuotaTracker:
         next_req = tracker.get_next_request()
         assert next_req.priority == RequestPriority.CRITICAL
         assert next_req.endpoint == "critical"
+        
+        # Same priority is first in, first out
+        tracker.queue_request(RequestPriority.HIGH, "high2", 1000)
+        assert tracker.get_next_request().endpoint == "high"
+        assert tracker.get_next_request().endpoint == "high2"
+        assert tracker.get_next_request().endpoint == "low"
+        assert tracker.get_next_request() is None
         print("✅ Queue priority ordering")
     
     def test_queue_full(self):
@@ -198,6 +244,41 @@ class TestQuotaTracker:
         assert stats['tokens']['per_minute']['current'] == 3000
         assert stats['statistics']['total_requests'] == 2
         print("✅ Quota statistics reporting")
+
+    def test_token_running_totals(self):
+        """Test counters are not capped by the number of requests"""
+        tracker = QuotaTracker()
+        now = time.monotonic()
+        with patch('quota_tracker._now', return_value=now):
+            for tokens in range(1, 251):
+                tracker.record_request(tokens)
+            stats = tracker.get_stats()
+
+        assert stats['requests']['per_minute']['current'] == 250
+        assert stats['tokens']['per_minute']['current'] == sum(range(1, 251))
+        assert stats['tokens']['per_day']['current'] == sum(range(1, 251))
+        print("✅ Running token totals")
+
+    def test_day_window_buckets(self):
+        """Test day buckets expire minute by minute"""
+        tracker = QuotaTracker()
+        now = time.monotonic()
+        with patch('quota_tracker._now', return_value=now):
+            tracker.record_request(100)
+        with patch('quota_tracker._now', return_value=now + 600):
+            tracker.record_request(200)
+
+        # First minute drops out after 24 hours, the second 10 minutes later
+        with patch('quota_tracker._now', return_value=now + 86400 + 60):
+            stats = tracker.get_stats()
+        assert stats['requests']['per_day']['current'] == 1
+        assert stats['tokens']['per_day']['current'] == 200
+
+        with patch('quota_tracker._now', return_value=now + 2 * 86400):
+            stats = tracker.get_stats()
+        assert stats['requests']['per_day']['current'] == 0
+        assert stats['tokens']['per_day']['current'] == 0
+        print("✅ Day window buckets")
     
     def test_singleton_pattern(self):
         """Test quota tracker singleton pattern"""
@@ -0,0 +1,248 @@
+"""
+Tests for Redis-buffered quota counters against an in-memory Redis (fakeredis)
+Covers track -> flush, failed flushes and the Redis enforcement read
+"""
+
+import time
+
+import fakeredis
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import quota_management
+from quota_management import (
+    QuotaTracker,
+    QuotaUsage,
+    QuotaEndpointUsage,
+    UsageEvent,
+    Base,
+    QUOTA_LIMITS,
+    PENDING_SET_KEY,
+    FLUSH_LOCK_PREFIX,
+    get_quota_tracker
+)
+
+
+@pytest.fixture
+def engine():
+    """In-memory database shared by every session (the flush writer has its own)"""
+    engine = create_engine(
+        'sqlite://',
+        poolclass=StaticPool,
+        connect_args={'check_same_thread': False}
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db_session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.rollback()
+    session.close()
+
+
+@pytest.fixture
+def tracker(db_session):
+    tracker = QuotaTracker(db_session, redis_client=fakeredis.FakeRedis())
+    # Exercise the Redis read rather than the process-local fast path
+    tracker._totals_cache = None
+    return tracker
+
+
+@pytest.fixture
+def queries(engine):
+    """Statements executed against the database"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def db_totals(db_session, user_id):
+    db_session.expire_all()
+    return {
+        usage.period_type: (usage.total_requests, usage.total_tokens)
+        for usage in db_session.query(QuotaUsage).filter_by(user_id=user_id)
+    }
+
+
+class TestTrackAndFlush:
+    """track_usage buffers in Redis; flush_pending moves counters to the database"""
+
+    def test_track_writes_only_to_redis(self, tracker, db_session, queries):
+        result = tracker.track_usage(100, 50, 'subtopics', user_id='user-1')
+
+        assert result['tracked'] is True
+        assert result['daily_total'] == 150
+        assert db_totals(db_session, 'user-1') == {}
+        assert tracker.redis_client.scard(PENDING_SET_KEY) == 2
+        assert not any(statement.lstrip().upper().startswith(('INSERT', 'UPDATE')) for statement in queries)
+
+    def test_flush_moves_counters_to_database(self, tracker, db_session):
+        tracker.track_usage(100, 50, 'subtopics', user_id='user-1')
+        tracker.track_usage(10, 5, 'explain', user_id='user-1')
+
+        assert tracker.flush_pending() == 2
+
+        assert db_totals(db_session, 'user-1') == {'daily': (2, 165), 'monthly': (2, 165)}
+        endpoints = {
+            row.endpoint: row.total_tokens
+            for row in db_session.query(QuotaEndpointUsage).filter_by(period_type='daily')
+        }
+        assert endpoints == {'subtopics': 150, 'explain': 15}
+        assert tracker.redis_client.scard(PENDING_SET_KEY) == 0
+        assert tracker.redis_client.keys('quota:pending:*') == []
+        assert tracker.get_usage('user-1', 'daily')['total_tokens'] == 165
+
+    def test_usage_tracked_while_flushing_is_kept(self, tracker, db_session, monkeypatch):
+        tracker.track_usage(100, 0, 'subtopics', user_id='user-1')
+        tracker.flush_pending()  # creates the flush writer
+        tracker.track_usage(100, 0, 'subtopics', user_id='user-1')
+
+        writer = tracker._flush_writer
+        increment = writer._increment_usage
+
+        def increment_then_track(*args, **kwargs):
+            tracker.track_usage(7, 0, 'subtopics', user_id='user-1')
+            monkeypatch.setattr(writer, '_increment_usage', increment)
+            return increment(*args, **kwargs)
+
+        monkeypatch.setattr(writer, '_increment_usage', increment_then_track)
+        tracker.flush_pending()
+
+        # The hash being written keeps the new tokens; the other period
+        # was read afterwards and flushed them already
+        assert tracker.redis_client.scard(PENDING_SET_KEY) == 1
+        tracker.flush_pending()
+        assert db_totals(db_session, 'user-1') == {'daily': (3, 207), 'monthly': (3, 207)}
+
+    def test_locked_hash_is_skipped(self, tracker):
+        tracker.track_usage(100, 0, 'subtopics', user_id='user-1')
+        for key in tracker.redis_client.smembers(PENDING_SET_KEY):
+            tracker.redis_client.set(f"{FLUSH_LOCK_PREFIX}:{key.decode()}", 1)
+
+        assert tracker.flush_pending() == 0
+        assert tracker.redis_client.scard(PENDING_SET_KEY) == 2
+
+
+class TestFailedFlush:
+    """Counters stay in Redis when the database write fails"""
+
+    def test_counters_kept_and_flushed_later(self, tracker, db_session, monkeypatch):
+        tracker.track_usage(100, 50, 'subtopics', user_id='user-1')
+        tracker.flush_pending()
+        tracker.track_usage(200, 0, 'explain', user_id='user-1')
+        pending_before = {
+            key: tracker.redis_client.hgetall(key)
+            for key in tracker.redis_client.smembers(PENDING_SET_KEY)
+        }
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("database unavailable")
+
+        monkeypatch.setattr(tracker._flush_writer, '_increment_usage', fail)
+        assert tracker.flush_pending() == 0
+
+        pending_after = {
+            key: tracker.redis_client.hgetall(key)
+            for key in tracker.redis_client.smembers(PENDING_SET_KEY)
+        }
+        assert pending_after == pending_before
+        assert db_totals(db_session, 'user-1') == {'daily': (1, 150), 'monthly': (1, 150)}
+        assert tracker.redis_client.keys(f"{FLUSH_LOCK_PREFIX}:*") == []
+
+        monkeypatch.undo()
+        assert tracker.flush_pending() == 2
+        assert db_totals(db_session, 'user-1') == {'daily': (2, 350), 'monthly': (2, 350)}
+
+
+class TestRedisEnforcement:
+    """Quota checks read Redis totals instead of querying the database"""
+
+    def test_check_reads_baseline_plus_pending(self, tracker, queries):
+        limits = QUOTA_LIMITS['limited']
+        tracker.track_usage(4000, 0, 'subtopics', user_id='user-1')
+        tracker.flush_pending()
+        tracker.track_usage(3000, 0, 'subtopics', user_id='user-1')  # reloads the baseline
+
+        queries.clear()
+        assert tracker._check_limits('user-1', 2000, limits) == (7000, 7000, False, False)
+        tracker.track_usage(2000, 0, 'subtopics', user_id='user-1')
+        assert tracker._check_limits('user-1', 2000, limits) == (9000, 9000, True, False)
+        allowed, error = tracker.check_quota_enforcement(2000, user_id='user-1', tier='limited')
+        assert not allowed
+        assert error['usage'] == 9000
+        assert queries == []
+
+    def test_flush_invalidates_baseline(self, tracker, queries):
+        limits = QUOTA_LIMITS['limited']
+        tracker.track_usage(4000, 0, 'subtopics', user_id='user-1')
+        tracker._check_limits('user-1', 0, limits)
+        tracker.flush_pending()
+
+        queries.clear()
+        assert tracker._check_limits('user-1', 0, limits)[:2] == (4000, 4000)
+        assert len(queries) == 1
+        queries.clear()
+        assert tracker._check_limits('user-1', 0, limits)[:2] == (4000, 4000)
+        assert queries == []
+
+    def test_batch_writes_invalidate_baseline(self, tracker):
+        limits = QUOTA_LIMITS['limited']
+        tracker._check_limits('user-1', 0, limits)
+
+        tracker.track_usage_batch([UsageEvent('user-1', 'subtopics', 500, 0)])
+
+        assert tracker._check_limits('user-1', 0, limits)[:2] == (500, 500)
+
+    def test_falls_back_to_database_without_redis(self, tracker, monkeypatch):
+        limits = QUOTA_LIMITS['limited']
+        tracker.track_usage(4000, 0, 'subtopics', user_id='user-1')
+        tracker.flush_pending()
+
+        def unavailable(*args, **kwargs):
+            raise ConnectionError("redis down")
+
+        monkeypatch.setattr(tracker.redis_client, 'pipeline', unavailable)
+        assert tracker._check_limits('user-1', 0, limits)[:2] == (4000, 4000)
+
+
+class TestFlushThread:
+    """A tracker given a Redis client keeps flushing in the background"""
+
+    def test_get_quota_tracker_starts_flushing(self, db_session, monkeypatch):
+        monkeypatch.setattr(quota_management, '_quota_tracker_instance', None)
+        tracker = get_quota_tracker(db_session, redis_client=fakeredis.FakeRedis())
+        try:
+            assert tracker._flush_thread is not None
+            tracker.track_usage(100, 0, 'subtopics', user_id='user-1')
+        finally:
+            tracker.stop_flush_thread()
+
+        assert tracker._flush_thread is None
+        assert db_totals(db_session, 'user-1') == {'daily': (1, 100), 'monthly': (1, 100)}
+
+    def test_thread_flushes_on_interval(self, tracker, db_session):
+        tracker.start_flush_thread(interval=0.05)
+        try:
+            tracker.track_usage(100, 0, 'subtopics', user_id='user-1')
+            deadline = time.monotonic() + 5
+            while tracker.redis_client.scard(PENDING_SET_KEY) and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            tracker.stop_flush_thread()
+
+        assert db_totals(db_session, 'user-1') == {'daily': (1, 100), 'monthly': (1, 100)}
+
+    def test_no_thread_without_redis(self, db_session, monkeypatch):
+        monkeypatch.setattr(quota_management, '_quota_tracker_instance', None)
+        assert get_quota_tracker(db_session)._flush_thread is None
@@ -16,6 +16,7 @@ from quota_management import (
     QuotaTracker,
     QuotaUsage,
     CostConfig,
+    UsageEvent,
     Base,
     init_quota_database
 )
@@ -224,8 +225,7 @@ class TestQuotaTrackingProperties:
                 f"Monthly cost should include current request cost, got {updated_monthly['total_cost']}"
             
             # Verify per-endpoint cost tracking
-            import json
-            endpoint_data = json.loads(updated_daily['endpoint_usage'])
+            endpoint_data = quota_tracker.get_endpoint_usage(user_id, 'daily')
             assert endpoint in endpoint_data, \
                 f"Endpoint {endpoint} should be in usage breakdown"
             
@@ -405,6 +405,75 @@ class TestQuotaTrackingProperties:
             assert float(daily_usage['total_cost']) <= float(monthly_usage['total_cost']), \
                 "Daily cost should be <= monthly cost"
 
+    
+    def test_stream_all_usage(self, quota_tracker):
+        """
+        Test that streaming usage returns every user's row
+        """
+        user_ids = [f'stream-user-{i}' for i in range(5)]
+        for user_id in user_ids:
+            quota_tracker.track_usage(
+                input_tokens=100,
+                output_tokens=50,
+                endpoint='/api/test',
+                user_id=user_id
+            )
+        
+        streamed = list(quota_tracker.stream_all_usage('daily', batch_size=2))
+        
+        assert sorted(usage['user_id'] for usage in streamed) == user_ids
+        assert all(usage['total_tokens'] == 150 for usage in streamed)
+
+    
+    def test_track_usage_batch_matches_individual_tracking(self, quota_tracker):
+        """
+        Test that a batch records the same totals as tracking each event
+        """
+        events = [
+            UsageEvent('batch-user-1', '/api/quiz', 100, 50),
+            UsageEvent('batch-user-1', '/api/summary', 200, 25),
+            UsageEvent('batch-user-1', '/api/quiz', 10, 5),
+            UsageEvent('batch-user-2', '/api/quiz', 300, 0)
+        ]
+        
+        result = quota_tracker.track_usage_batch(events)
+        
+        assert result['tracked'] is True
+        assert result['events'] == len(events)
+        
+        for period_type in ('daily', 'monthly'):
+            usage = quota_tracker.get_usage('batch-user-1', period_type, include_endpoints=True)
+            assert usage['total_requests'] == 3
+            assert usage['total_tokens'] == 390
+            assert usage['endpoint_usage']['/api/quiz']['requests'] == 2
+            assert usage['endpoint_usage']['/api/quiz']['total_tokens'] == 165
+            
+            expected_cost = sum(
+                CostConfig().calculate_cost(event.input_tokens, event.output_tokens)
+                for event in events[:3]
+            )
+            assert abs(usage['total_cost'] - expected_cost) < 1e-9
+        
+        assert quota_tracker.get_usage('batch-user-2', 'daily')['total_tokens'] == 300
+
+    def test_reads_use_read_session(self, db_session):
+        """
+        Test that usage reads go to the read session while writes stay on the primary
+        """
+        replica_engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(replica_engine)
+        replica_session = sessionmaker(bind=replica_engine)()
+        tracker = QuotaTracker(db_session, read_session=replica_session)
+
+        tracker.track_usage(500, 500, '/api/quiz', user_id='replica-user')
+
+        # Primary has the row; the (unreplicated) replica does not
+        assert QuotaTracker(db_session).get_usage('replica-user', 'daily')['total_tokens'] == 1000
+        assert tracker.get_usage('replica-user', 'daily') is None
+        assert tracker.check_quota_warnings('replica-user', tier='free')['warnings'] == []
+
+        replica_session.close()
+
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v', '--tb=short'])
@@ -265,6 +265,26 @@ class TestRateLimitingProperties:
                 assert retry_after == '60', \
                     f"Retry-After should be '60', got '{retry_after}'"
     
+    def test_rate_limit_headers_on_allowed_response(self, app):
+        """
+        Test that allowed responses carry RateLimit-* headers for the
+        tightest window
+        """
+        @app.route('/headers')
+        @rate_limit
+        def headers_route():
+            return {'success': True}
+        
+        with app.test_client() as client:
+            with patch('rate_limiter.get_rate_limiter', return_value=RateLimiter(redis_client=None)):
+                response = client.get('/headers', environ_base={'REMOTE_ADDR': '10.1.2.3'})
+        
+        # Anonymous tier: the minute window (5 per minute) is tightest
+        assert response.status_code == 200
+        assert response.headers['RateLimit-Limit'] == '5'
+        assert response.headers['RateLimit-Remaining'] == '4'
+        assert response.headers['RateLimit-Reset'] == '12'
+    
     @given(
         tier=tier_strategy
     )
@@ -301,6 +321,123 @@ class TestRateLimitingProperties:
                 assert minute_info['used'] >= 0
                 assert minute_info['remaining'] + minute_info['used'] == tier_config.requests_per_minute
 
+    
+    def test_redis_bucket_check_uses_function(self):
+        """
+        Test that the Redis path checks every window in one function call
+        and reloads the function when Redis has lost it
+        """
+        import redis
+        
+        mock_redis = MagicMock()
+        limiter = RateLimiter(redis_client=mock_redis)
+        assert limiter._use_function
+        
+        mock_redis.fcall.side_effect = [
+            redis.exceptions.ResponseError('ERR Function not found'),
+            [1, 1, b'7']
+        ]
+        windows = ((60, 10), (3600, 100))
+        assert limiter._token_bucket_check('user:1', windows) == (True, 0, 3, 0)
+        assert mock_redis.function_load.call_count == 2
+        assert mock_redis.fcall.call_args[0][1] == 2
+        
+        # Hour bucket empty: 1 token refills in 36s at 100 per hour
+        mock_redis.fcall.side_effect = None
+        mock_redis.fcall.return_value = [0, 2, b'0.5']
+        allowed, index, count, retry_after = limiter._token_bucket_check('user:1', windows)
+        assert not allowed and index == 1 and count == 100
+        assert retry_after == 18
+    
+    def test_redis_bucket_check_script_fallback(self):
+        """
+        Test that Redis without functions uses EVALSHA and reloads the
+        script when Redis has dropped its cache
+        """
+        import redis
+        
+        mock_redis = MagicMock()
+        mock_redis.function_load.side_effect = redis.exceptions.ResponseError("ERR unknown command 'FUNCTION'")
+        mock_redis.script_load.return_value = 'sha1'
+        limiter = RateLimiter(redis_client=mock_redis)
+        assert not limiter._use_function and limiter._script_sha == 'sha1'
+        
+        mock_redis.evalsha.side_effect = [
+            redis.exceptions.NoScriptError('NOSCRIPT'),
+            [1, 1, b'7']
+        ]
+        mock_redis.script_load.return_value = 'sha2'
+        assert limiter._token_bucket_check('user:1', ((60, 10),)) == (True, 0, 3, 0)
+        assert limiter._script_sha == 'sha2'
+        mock_redis.fcall.assert_not_called()
+    
+    def test_status_reads_use_replica(self, app, mock_request):
+        """
+        Test that status queries read buckets from the replica client and
+        that repeat polls are cached
+        """
+        primary = MagicMock()
+        replica = MagicMock()
+        replica.pipeline.return_value.execute.return_value = [
+            [b'7', str(time.time()).encode()], [None, None], [None, None]
+        ]
+        limiter = RateLimiter(redis_client=primary, redis_reader=replica)
+        
+        with app.test_request_context():
+            with patch('rate_limiter.request', mock_request):
+                g.current_user = {'user_id': 'replica_user', 'quota_tier': 'free'}
+                status = limiter.get_rate_limit_status()
+                # A repeat poll within the TTL is served from the status cache
+                assert limiter.get_rate_limit_status() == status
+                # Callers get copies, so changing one can't corrupt the cache
+                changed = limiter.get_rate_limit_status()
+                changed['limits']['minute']['used'] = 99
+                changed['tier'] = 'changed'
+                assert limiter.get_rate_limit_status() == status
+        
+        primary.pipeline.assert_not_called()
+        assert replica.pipeline.call_count == 1
+        assert status['limits']['minute']['used'] == 3
+        assert status['limits']['hour']['used'] == 0
+    
+    def test_token_bucket_refills(self):
+        """
+        Test that an exhausted in-memory bucket refills at limit / window
+        """
+        limiter = RateLimiter(redis_client=None)
+        windows = ((60, 5),)
+        
+        with patch('rate_limiter._now', return_value=1000.0):
+            results = [limiter._token_bucket_check('ip:1', windows)[0] for _ in range(6)]
+        assert results == [True] * 5 + [False]
+        
+        # 5 per minute refills one token every 12 seconds
+        with patch('rate_limiter._now', return_value=1006.0):
+            allowed, index, count, retry_after = limiter._token_bucket_check('ip:1', windows)
+            assert not allowed and count == 5 and retry_after == 6
+        with patch('rate_limiter._now', return_value=1012.0):
+            assert limiter._token_bucket_check('ip:1', windows)[0]
+            assert not limiter._token_bucket_check('ip:1', windows)[0]
+        
+        # Once refilled the bucket is swept from the store
+        limiter._sweep_memory_store(1100.0)
+        assert len(limiter.memory_store) == 0
+    
+    def test_memory_store_is_bounded(self):
+        """
+        Test that the in-memory store evicts the least recently used bucket
+        """
+        limiter = RateLimiter(redis_client=None)
+        windows = ((60, 5),)
+        
+        with patch('rate_limiter.MEMORY_STORE_MAX_KEYS', 2):
+            limiter._token_bucket_check('ip:1', windows)
+            limiter._token_bucket_check('ip:2', windows)
+            limiter._token_bucket_check('ip:1', windows)
+            limiter._token_bucket_check('ip:3', windows)
+        
+        assert list(limiter.memory_store) == ['ip:1:60s', 'ip:3:60s']
+
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v', '--tb=short'])
@@ -0,0 +1,282 @@
+"""
+Tests for RedisCache against an in-memory Redis (fakeredis)
+Covers batched writes, batch reads, compression framing and invalidation
+"""
+
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from flask import Flask, jsonify, request
+
+import redis_cache
+from redis_cache import RedisCache, LATENCY_SAMPLE_RATE, WRITE_BATCH_SIZE, ZSTD_AVAILABLE, _glob_to_regex, cached_response
+
+
+def make_cache(ttl=3600, max_size=1000):
+    """RedisCache backed by fakeredis (config keeps the real client disabled)"""
+    config = SimpleNamespace(
+        redis=SimpleNamespace(enabled=False),
+        cache=SimpleNamespace(ttl=ttl, max_size=max_size)
+    )
+    cache = RedisCache(config)
+    # Stop the memory-cache sweeper; this cache talks to Redis
+    cache._stop_cleanup.set()
+    cache.cleanup_thread.join(timeout=2)
+    cache.cleanup_thread = None
+    cache.redis_client = fakeredis.FakeRedis()
+    return cache
+
+
+@pytest.fixture
+def cache():
+    cache = make_cache()
+    yield cache
+    cache.shutdown()
+
+
+class CountingPipelines:
+    """Wrap a client so each pipeline's queued command count is recorded"""
+
+    def __init__(self, client):
+        self.client = client
+        self.batches = []
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def pipeline(self, *args, **kwargs):
+        pipe = self.client.pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def counted_execute(*a, **kw):
+            self.batches.append(len(pipe.command_stack))
+            return execute(*a, **kw)
+
+        pipe.execute = counted_execute
+        return pipe
+
+
+class TestBackgroundWriter:
+    """set(sync=False) queues writes for the pipelined writer thread"""
+
+    def test_queued_writes_flushed_on_shutdown(self, cache):
+        for i in range(50):
+            assert cache.set(f"k{i}", {'n': i}, sync=False) is True
+
+        cache.shutdown()
+
+        assert cache._set_worker is None
+        assert cache.redis_client.dbsize() == 50
+        assert cache.get("k7") == {'n': 7}
+        assert cache.stats['sets'] == 50
+
+    def test_batches_are_capped(self, cache, monkeypatch):
+        client = CountingPipelines(cache.redis_client)
+        cache.redis_client = client
+        total = 2 * WRITE_BATCH_SIZE + 10
+
+        # Queue everything before the writer starts so it drains full batches
+        monkeypatch.setattr(cache, '_ensure_set_worker', lambda: None)
+        for i in range(total):
+            cache.set(f"k{i}", i, sync=False)
+        monkeypatch.undo()
+        cache._ensure_set_worker()
+        cache.shutdown()
+
+        assert client.batches == [WRITE_BATCH_SIZE, WRITE_BATCH_SIZE, 10]
+        assert client.client.dbsize() == total
+
+    def test_sync_set_is_readable_immediately(self, cache):
+        cache.set("k", [1, 2, 3])
+        assert cache.get("k") == [1, 2, 3]
+        assert cache._set_worker is None
+
+
+class TestBatchOperations:
+    """mget/mset round trips"""
+
+    def test_mget_returns_none_for_misses(self, cache):
+        assert cache.mset({'a': 1, 'b': {'x': [1]}}) is True
+
+        assert cache.mget(['a', 'missing', 'b']) == [1, None, {'x': [1]}]
+        stats = cache.stats
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+        assert stats['sets'] == 2
+
+    def test_mset_applies_ttl(self, cache):
+        cache.mset({'a': 1}, ttl=30)
+        assert 0 < cache.redis_client.ttl('a') <= 30
+
+    def test_latency_stats_keep_millisecond_total(self, cache):
+        for i in range(LATENCY_SAMPLE_RATE * 2):
+            cache.set(f"k{i}", i)
+
+        stats = cache.stats
+        assert stats['operations'] == LATENCY_SAMPLE_RATE * 2
+        assert stats['total_latency_ms'] == stats['total_latency_ns'] / 1e6
+        assert stats['latency_estimated'] is True
+
+    def test_empty_batches(self, cache):
+        assert cache.mget([]) == []
+        assert cache.mset({}) is True
+
+
+class TestCompression:
+    """Large values are zstd-framed; anything else is plain JSON"""
+
+    @pytest.mark.skipif(not ZSTD_AVAILABLE, reason="zstandard not installed")
+    def test_large_value_is_compressed(self, cache):
+        value = {'items': [f"subtopic {i} explanation" for i in range(1000)]}
+        cache.set("big", value)
+
+        raw = cache.redis_client.get("big")
+        assert raw[:4] == redis_cache._ZSTD_MAGIC
+        assert len(raw) < len(redis_cache._dumps(value))
+        assert cache.get("big") == value
+
+    def test_small_value_is_plain_json(self, cache):
+        cache.set("small", {'a': 1})
+        assert cache.redis_client.get("small") == redis_cache._dumps({'a': 1})
+
+    def test_legacy_uncompressed_value_reads(self, cache):
+        cache.redis_client.set("old", b'{"legacy": true}')
+        assert cache.get("old") == {'legacy': True}
+
+
+class TestInvalidation:
+    """Version bumps and pattern deletes"""
+
+    def test_update_version_keeps_old_entries_until_purged(self, cache):
+        old_key = cache._generate_key('subtopics', {'topic': 'Python'})
+        cache.set(old_key, ['Variables'])
+        old_version = cache.cache_version
+
+        cache.update_version('v2.0')
+
+        assert cache.redis_client.exists(old_key)
+        assert cache._generate_key('subtopics', {'topic': 'Python'}) != old_key
+
+        cache.purge_old_versions_async(old_version).join(timeout=5)
+        assert not cache.redis_client.exists(old_key)
+
+    def test_cannot_purge_current_version(self, cache):
+        with pytest.raises(ValueError):
+            cache.purge_old_versions_async(cache.cache_version)
+
+    def test_namespace_invalidation_matches_generated_keys(self, cache):
+        cache.set(cache._generate_key('subtopics', {'topic': 'Go'}), 1)
+        cache.set(cache._generate_key('explanations', {'topic': 'Go'}), 1)
+
+        assert cache.invalidate_namespace('subtopics') == 1
+        assert cache.redis_client.dbsize() == 1
+
+    @pytest.mark.parametrize('pattern', [
+        'v1:*', 'v1:[^a]:*', 'v1:[b-a]:*', 'h\\?llo', 'h?llo', 'a[b', 'x\\\\y', '[!a]*', 'h[^e]llo'
+    ])
+    def test_memory_glob_matches_redis(self, cache, pattern):
+        keys = ['v1:a:1', 'v1:b:1', 'v1:c:1', 'h?llo', 'hello', 'ab', 'a[b', 'x\\y', '!x', 'Z']
+        for key in keys:
+            cache.redis_client.set(key, 1)
+
+        expected = sorted(k.decode() for k in cache.redis_client.scan_iter(match=pattern))
+        matcher = re.compile(_glob_to_regex(pattern)).match
+        assert sorted(k for k in keys if matcher(k)) == expected
+
+
+class TestGetOrCompute:
+    """Concurrent misses share one factory call"""
+
+    def test_uncacheable_result_is_shared(self, cache):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            time.sleep(0.2)
+            return ('unavailable', 503)
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                cache.get_or_compute('k', factory, cacheable=lambda r: r[1] == 200)
+            ))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [('unavailable', 503)] * 4
+        assert cache.stats['misses'] == 4
+        assert not cache._inflight
+
+    def test_miss_counted_once(self, cache):
+        assert cache.get_or_compute('k', lambda: {'v': 1}) == {'v': 1}
+        assert cache.get_or_compute('k', lambda: {'v': 2}) == {'v': 1}
+        stats = cache.stats
+        assert (stats['misses'], stats['hits']) == (1, 1)
+
+
+class TestCachedResponse:
+    """Requests sharing one computation each get their own Response"""
+
+    def make_app(self, cache, status=200):
+        app = Flask(__name__)
+        calls = []
+        responses = []
+
+        @app.route('/topics', methods=['POST'])
+        @cached_response(cache)
+        def topics():
+            calls.append(1)
+            time.sleep(0.3)
+            return jsonify({'topics': ['Variables']}), status
+
+        @app.after_request
+        def tag(response):
+            responses.append(response)
+            response.headers.add('X-Caller', request.headers['X-Caller'])
+            response.set_cookie('caller', request.headers['X-Caller'])
+            return response
+
+        return app, calls, responses
+
+    @pytest.mark.parametrize('status', [200, 503])
+    def test_concurrent_requests_get_separate_responses(self, cache, status):
+        app, calls, responses = self.make_app(cache, status)
+        results = {}
+
+        def call(name):
+            with app.test_client() as client:
+                results[name] = client.post('/topics', json={'topic': 'Python'}, headers={'X-Caller': name})
+
+        threads = [threading.Thread(target=call, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert responses[0] is not responses[1]
+        for name, response in results.items():
+            assert response.status_code == status
+            assert response.get_json() == {'topics': ['Variables']}
+            assert response.headers.getlist('X-Caller') == [name]
+            assert response.headers.getlist('Set-Cookie') == [f'caller={name}; Path=/']
+
+    def test_cached_response_is_rebuilt(self, cache):
+        app, calls, _ = self.make_app(cache)
+        with app.test_client() as client:
+            first = client.post('/topics', json={'topic': 'Go'}, headers={'X-Caller': 'a'})
+            second = client.post('/topics', json={'topic': 'Go'}, headers={'X-Caller': 'b'})
+
+        assert len(calls) == 1
+        assert first.get_json() == second.get_json()
+        assert second.headers.getlist('X-Caller') == ['b']
+        assert second.mimetype == 'application/json'